@@ -0,0 +1,33 @@
+from demoparser2 import DemoParser
+import time
+import glob
+import os
+import sys
+
+# python pipelined.py /path/to/demos
+# The pipelined mode only helps when there are spare cores while the file is scanned,
+# so run it on a machine with 8+ cores and compare the per demo times.
+demo_dir = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("DEMO_DIR")
+if demo_dir is None:
+    sys.exit("usage: python pipelined.py <demo dir> (or set DEMO_DIR)")
+files = sorted(glob.glob(os.path.join(demo_dir, "*.dem")))
+if not files:
+    sys.exit(f"no .dem files in {demo_dir}")
+
+print(f"{len(files)} demos, {os.cpu_count()} cpus")
+modes = ["normal", "pipelined"]
+times = {mode: [] for mode in modes}
+for file in files:
+    for mode in modes:
+        before = time.time()
+        parser = DemoParser(file, parsing_mode=mode)
+        df = parser.parse_ticks(["X", "Y", "health"])
+        events = parser.parse_event("player_death", player=["X", "Y"])
+        times[mode].append(time.time() - before)
+    size_mb = os.path.getsize(file) / 1e6
+    per_mode = " ".join(f"{mode} {times[mode][-1]:.2f}s" for mode in modes)
+    print(f"{os.path.basename(file)} ({size_mb:.0f} MB): {per_mode}")
+
+for mode in modes:
+    print(mode, f"total {sum(times[mode]):.2f}s")
+print("speedup", f"{sum(times['normal']) / sum(times['pipelined']):.2f}x")
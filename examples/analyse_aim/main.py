@@ -3,13 +3,10 @@ from demoparser2 import DemoParser
 
 parser = DemoParser("path/to/demo.dem")
 player_hurt_events = parser.parse_event("player_hurt")
-df = parser.parse_ticks(["pitch", "yaw"])
+# pitch and yaw of the attacker for the 300 ticks before every hit.
+# Events where the attacker is none (player hurt by c4 etc.) have no rows
+df = parser.parse_event_windows("player_hurt", ["pitch", "yaw"], before=300, players="attacker")
 
-for (idx, event) in player_hurt_events.iterrows():
-    start_tick = event["tick"] - 300
-    end_tick = event["tick"]
-    attacker = event["attacker_steamid"]
-    # attacker can be none when player gets hurt by c4 etc.
-    if attacker != None:
-        subdf = df[(df["tick"].between(start_tick, end_tick)) & (df["steamid"] == int(attacker))]
-        print(subdf)
\ No newline at end of file
+for (idx, subdf) in df.groupby("event_index"):
+    print(player_hurt_events.iloc[idx]["attacker_name"])
+    print(subdf)
@@ -10,7 +10,9 @@ event_names = [
     "player_blind"
 ]
 
-all_events = parser.parse_events(event_names, other=["game_time", "team_num"])
+wanted_props = ["equipment_value_this_round", "cash_spent_this_round", "is_alive", "team_num", "player_name", "score", "player_steamid"]
+# The props of every player at each event are collected in the same pass as the events
+all_events, snapshots = parser.parse_events(event_names, other=["game_time", "team_num"], snapshot_props=wanted_props)
 
 # Find match start tick
 begin_new_match_df = next((df for event_name, df in all_events if event_name == 'begin_new_match'), None)
@@ -19,23 +21,13 @@ match_start_tick = begin_new_match_df['tick'].iloc[0] if begin_new_match_df is n
 # Filter out events before the match start
 filtered_events = [(event_name, df[df['tick'] >= match_start_tick]) for event_name, df in all_events]
 
-wanted_props = ["equipment_value_this_round", "cash_spent_this_round", "is_alive", "team_num", "player_name", "score", "player_steamid"]
-tick_values = set()
-for _, df in filtered_events:
-    tick_values.update(df['tick'].unique())
-all_ticks = parser.parse_ticks(wanted_props, ticks=list(tick_values))
-
-# Convert ticks to a map
-all_ticks_map = {}
-for tick in all_ticks.itertuples():
-    if tick.tick not in all_ticks_map:
-        all_ticks_map[tick.tick] = []
-    all_ticks_map[tick.tick].append(tick)
-
-# Access ticks
+# Access the players at an event
 game_end_events = next((df for event_name, df in filtered_events if event_name == 'round_end'), None)
-game_end_tick = max(game_end_events['tick']) if game_end_events is not None else 0
-scoreboard = all_ticks_map.get(game_end_tick, [])
+if game_end_events is not None and len(game_end_events) > 0:
+    last_round_end = game_end_events.loc[game_end_events['tick'].idxmax()]
+    scoreboard = snapshots[snapshots['event_index'] == last_round_end['event_index']]
+else:
+    scoreboard = snapshots.iloc[:0]
 
 # Additional processing for other events
 shot_events = next((df for event_name, df in filtered_events if event_name == 'weapon_fire'), None)
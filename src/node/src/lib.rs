@@ -15,6 +15,7 @@ use parser::first_pass::parser_settings::FirstPassParser;
 use parser::first_pass::parser_settings::ParserInputs;
 use parser::parse_demo::DemoOutput;
 use parser::parse_demo::Parser;
+use parser::parse_demo::TickOutputMode;
 use parser::second_pass::parser_settings::create_huffman_lookup_table;
 use parser::second_pass::variants::soa_to_aos;
 use parser::second_pass::variants::BytesVariant;
@@ -160,6 +161,14 @@ pub fn parse_voice(path_or_buf: Either<String, Buffer>) -> napi::Result<HashMap<
     huffman_lookup_table: &vec![],
     order_by_steamid: false,
     fallback_bytes: None,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: false,
   };
   let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
@@ -196,6 +205,14 @@ pub fn list_game_events(path_or_buf: Either<String, Buffer>) -> napi::Result<Val
     huffman_lookup_table: &huf,
     order_by_steamid: false,
     fallback_bytes: None,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: false,
   };
   let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
@@ -244,6 +261,14 @@ pub fn parse_grenades(
     huffman_lookup_table: &huf,
     order_by_steamid: false,
     fallback_bytes: None,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: grenades,
   };
   let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
@@ -293,6 +318,14 @@ pub fn parse_header(path_or_buf: Either<String, Buffer>) -> napi::Result<Value>
     huffman_lookup_table: &huf,
     order_by_steamid: false,
     fallback_bytes: None,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: false,
   };
   let mut parser = FirstPassParser::new(&settings);
@@ -375,6 +408,14 @@ pub fn parse_event(
     huffman_lookup_table: &huf,
     order_by_steamid: false,
     fallback_bytes: game_event_list_bytes,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: false,
   };
   let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
@@ -447,6 +488,14 @@ pub fn parse_events(
     huffman_lookup_table: &huf,
     order_by_steamid: false,
     fallback_bytes: game_event_list_bytes,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: false,
   };
   let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
@@ -527,6 +576,14 @@ pub fn parse_ticks(
     huffman_lookup_table: &huf,
     order_by_steamid: order_by_steamid,
     fallback_bytes: None,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: false,
   };
 
@@ -602,6 +659,14 @@ pub fn parse_player_info(path_or_buf: Either<String, Buffer>) -> napi::Result<Va
     huffman_lookup_table: &huf,
     order_by_steamid: false,
     fallback_bytes: None,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: false,
   };
   let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
@@ -634,6 +699,14 @@ pub fn parse_player_skins(path_or_buf: Either<String, Buffer>) -> napi::Result<V
     huffman_lookup_table: &huf,
     order_by_steamid: false,
     fallback_bytes: None,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: false,
   };
   let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
@@ -665,6 +738,14 @@ pub fn list_updated_fields(path_or_buf: Either<String, Buffer>) -> napi::Result<
     huffman_lookup_table: &huf,
     order_by_steamid: false,
     fallback_bytes: None,
+    event_snapshot_props: vec![],
+    predicate: None,
+    every_n_ticks: None,
+    wanted_event_columns: None,
+    tick_output_mode: TickOutputMode::Full,
+    normalize_ticks: false,
+    event_window: None,
+    tensor: None,
     parse_grenades: false,
   };
   let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
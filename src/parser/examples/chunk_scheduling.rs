@@ -0,0 +1,70 @@
+// Compares chunk sizes for the multithreaded second pass and prints how long each chunk took.
+//
+// cargo run --release --example chunk_scheduling -- mm.dem faceit.dem hltv.dem
+use ahash::AHashMap;
+use memmap2::MmapOptions;
+use parser::first_pass::parser_settings::ParserInputs;
+use parser::parse_demo::{Parser, ParsingMode, TickOutputMode};
+use parser::second_pass::parser_settings::create_huffman_lookup_table;
+use std::fs::File;
+use std::time::Instant;
+
+const TARGET_CHUNK_BYTES: [Option<usize>; 5] = [None, Some(1_000_000), Some(2_000_000), Some(4_000_000), Some(8_000_000)];
+
+fn main() {
+    let paths: Vec<String> = std::env::args().skip(1).collect();
+    let huf = create_huffman_lookup_table();
+
+    for path in &paths {
+        let file = File::open(path).unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+
+        for target_chunk_bytes in TARGET_CHUNK_BYTES {
+            let settings = ParserInputs {
+                real_name_to_og_name: AHashMap::default(),
+                wanted_players: vec![],
+                wanted_player_props: vec!["X".to_string(), "Y".to_string(), "health".to_string()],
+                wanted_other_props: vec![],
+                wanted_prop_states: AHashMap::default(),
+                wanted_events: vec![],
+                parse_ents: true,
+                wanted_ticks: vec![],
+                parse_projectiles: false,
+                parse_grenades: false,
+                only_header: false,
+                list_props: false,
+                only_convars: false,
+                huffman_lookup_table: &huf,
+                order_by_steamid: false,
+                fallback_bytes: None,
+                event_snapshot_props: vec![],
+                predicate: None,
+                every_n_ticks: None,
+                wanted_event_columns: None,
+                tick_output_mode: TickOutputMode::Full,
+                normalize_ticks: false,
+                event_window: None,
+                tensor: None,
+            };
+            let mut parser = Parser::new(settings, ParsingMode::ForceMultiThreaded);
+            parser.target_chunk_bytes = target_chunk_bytes;
+
+            let before = Instant::now();
+            let output = parser.parse_demo(&mmap).unwrap();
+            let wall_time = before.elapsed();
+
+            let slowest = output.chunk_timings.iter().map(|t| t.duration).max().unwrap_or_default();
+            println!(
+                "{} target_chunk_bytes={:?} chunks={} total={:?} slowest_chunk={:?}",
+                path,
+                target_chunk_bytes,
+                output.chunk_timings.len(),
+                wall_time,
+                slowest
+            );
+            for timing in &output.chunk_timings {
+                println!("    {}..{} ({} bytes) {:?}", timing.start, timing.end, timing.end - timing.start, timing.duration);
+            }
+        }
+    }
+}
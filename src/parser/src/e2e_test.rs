@@ -316,6 +316,14 @@ pub fn _create_ge_tests() {
         order_by_steamid: false,
         wanted_prop_states: AHashMap::default(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
     };
 
     let mut ds = Parser::new(settings, crate::parse_demo::ParsingMode::ForceSingleThreaded);
@@ -692,6 +700,14 @@ pub fn _create_tests() {
         order_by_steamid: false,
         wanted_prop_states: AHashMap::default(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
     };
 
     let mut ds = Parser::new(settings, crate::parse_demo::ParsingMode::ForceSingleThreaded);
@@ -1049,6 +1065,14 @@ fn create_data() -> (DemoOutput, PropController, BTreeMap<String, Vec<GameEvent>
 
     let settings = ParserInputs {
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
         wanted_player_props: wanted_props.clone(),
         wanted_events: wanted_events,
         real_name_to_og_name: AHashMap::default(),
@@ -1091,6 +1115,14 @@ fn create_data() -> (DemoOutput, PropController, BTreeMap<String, Vec<GameEvent>
         order_by_steamid: false,
         wanted_prop_states: AHashMap::default(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
     };
     let mut ds = Parser::new(settings, crate::parse_demo::ParsingMode::ForceSingleThreaded);
     let file = File::open("test_demo.dem".to_string()).unwrap();
@@ -1164,17 +1196,27 @@ mod tests {
     use crate::first_pass::prop_controller::WEAPON_ORIGINGAL_OWNER_ID;
     use crate::first_pass::prop_controller::YAW_ID;
     use crate::first_pass::prop_controller::*;
+    use crate::first_pass::parser_settings::FirstPassParser;
+    use crate::first_pass::probe::probe_demo;
+    use crate::first_pass::probe::probe_demo_files;
+    use crate::first_pass::read_bits::DemoParserError;
     use crate::parse_demo::DemoOutput;
     use crate::parse_demo::Parser;
+    use crate::second_pass::cursor::Cursor;
     use crate::second_pass::game_events::EventField;
     use crate::second_pass::game_events::GameEvent;
     use crate::second_pass::parser_settings::create_huffman_lookup_table;
+    use crate::second_pass::parser_settings::EconItem;
+    use crate::second_pass::parser_settings::PlayerEndMetaData;
+    use crate::second_pass::tail_scan::scan_end_of_match;
     use crate::second_pass::variants::PropColumn;
     use crate::second_pass::variants::Sticker;
+    use crate::second_pass::variants::Variant;
     use crate::second_pass::variants::VarVec;
     use crate::second_pass::variants::VarVec::String;
     use crate::second_pass::variants::VarVec::*;
     use ahash::AHashMap;
+    use itertools::Itertools;
     use lazy_static::lazy_static;
     use memmap2::MmapOptions;
     use std::collections::BTreeMap;
@@ -1203,6 +1245,14 @@ mod tests {
             order_by_steamid: false,
             wanted_prop_states: AHashMap::default(),
             fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
         };
         let mut ds = Parser::new(settings, crate::parse_demo::ParsingMode::ForceSingleThreaded);
         let file = File::open("test_demo.dem").unwrap();
@@ -1214,6 +1264,769 @@ mod tests {
         assert_eq!(steamids.data, Some(VarVec::U64(vec![Some(76561198244754626), Some(76561198244754626)])));
     }
 
+    #[test]
+    fn test_tensor_matches_long_format() {
+        use crate::second_pass::tensor::{to_tensor, TensorDtype, TensorSettings};
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let props = vec!["X".to_string(), "health".to_string()];
+        let parse = |tensor: Option<TensorSettings>| {
+            let settings = ParserInputs {
+                wanted_players: vec![],
+                real_name_to_og_name: AHashMap::default(),
+                wanted_player_props: props.clone(),
+                wanted_events: vec![],
+                wanted_other_props: vec![],
+                parse_ents: true,
+                wanted_ticks: vec![10000, 20000],
+                parse_projectiles: false,
+                parse_grenades: false,
+                only_header: false,
+                list_props: false,
+                only_convars: false,
+                huffman_lookup_table: &huf,
+                order_by_steamid: false,
+                wanted_prop_states: AHashMap::default(),
+                fallback_bytes: None,
+                event_snapshot_props: vec![],
+                predicate: None,
+                every_n_ticks: None,
+                wanted_event_columns: None,
+                tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+                normalize_ticks: false,
+                event_window: None,
+                tensor,
+            };
+            Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded).parse_demo(&mmap).unwrap()
+        };
+        let long = parse(None);
+        let mut output = parse(Some(TensorSettings {
+            props: props.clone(),
+            dtype: TensorDtype::F64,
+        }));
+        // The rows only went to the tensor
+        assert!(!output.df.contains_key(&TICK_ID));
+        let tensor = to_tensor(std::mem::take(&mut output.tensor_rows), &props, &output.players, &[10000, 20000], TensorDtype::F64);
+
+        let column = |id: u32| long.df.get(&id).and_then(|col| col.data.clone());
+        let (ticks, steamids, xs) = match (column(TICK_ID), column(STEAMID_ID), column(PLAYER_X_ID)) {
+            (Some(I32(ticks)), Some(U64(steamids)), Some(F32(xs))) => (ticks, steamids, xs),
+            _ => panic!("long format columns are missing"),
+        };
+        assert_eq!(tensor.mask.iter().filter(|has_row| **has_row).count(), ticks.len());
+        let n_slots = tensor.steamids.len();
+        // Bots share steamid 0 so only players are compared
+        for ((tick, steamid), x) in ticks.iter().zip(&steamids).zip(&xs).filter(|((_, steamid), _)| **steamid != Some(0)) {
+            let tick_idx = tensor.ticks.iter().position(|t| Some(*t) == *tick).unwrap();
+            let slot_idx = tensor.steamids.iter().position(|s| Some(*s) == *steamid).unwrap();
+            let start = (tick_idx * n_slots + slot_idx) * props.len() * 8;
+            let value = f64::from_ne_bytes(tensor.data[start..start + 8].try_into().unwrap());
+            match x {
+                Some(x) => assert_eq!(value, *x as f64),
+                None => assert!(value.is_nan()),
+            }
+        }
+    }
+
+    #[test]
+    fn test_pipelined_matches_single_threaded() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+
+        let mut outputs = vec![];
+        for mode in [crate::parse_demo::ParsingMode::ForceSingleThreaded, crate::parse_demo::ParsingMode::Pipelined] {
+            let settings = ParserInputs {
+                wanted_players: vec![],
+                real_name_to_og_name: AHashMap::default(),
+                wanted_player_props: vec!["X".to_string(), "health".to_string()],
+                wanted_events: vec!["player_death".to_string()],
+                wanted_other_props: vec![],
+                parse_ents: true,
+                wanted_ticks: vec![10000, 20000, 30000],
+                parse_projectiles: false,
+                parse_grenades: false,
+                only_header: false,
+                list_props: false,
+                only_convars: false,
+                huffman_lookup_table: &huf,
+                order_by_steamid: false,
+                wanted_prop_states: AHashMap::default(),
+                fallback_bytes: None,
+                event_snapshot_props: vec![],
+                predicate: None,
+                every_n_ticks: None,
+                wanted_event_columns: None,
+                tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+                normalize_ticks: false,
+                event_window: None,
+                tensor: None,
+            };
+            let mut ds = Parser::new(settings, mode);
+            outputs.push(ds.parse_demo(&mmap).unwrap());
+        }
+        for id in [TICK_ID, STEAMID_ID] {
+            assert_eq!(outputs[0].df.get(&id).unwrap().data, outputs[1].df.get(&id).unwrap().data);
+        }
+        assert_eq!(outputs[0].game_events.len(), outputs[1].game_events.len());
+    }
+
+    #[test]
+    fn test_chunks_spanning_fullpackets_match_single_threaded() {
+        // Pipelined chunks and chunks merged by target_chunk_bytes can contain more than one fullpacket,
+        // only the first one may create entities.
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+
+        let mut outputs = vec![];
+        for (mode, target_chunk_bytes) in [
+            (crate::parse_demo::ParsingMode::ForceSingleThreaded, None),
+            (crate::parse_demo::ParsingMode::Pipelined, None),
+            (crate::parse_demo::ParsingMode::ForceMultiThreaded, Some(4_000_000)),
+            (crate::parse_demo::ParsingMode::ForceMultiThreaded, Some(usize::MAX)),
+        ] {
+            let settings = ParserInputs {
+                wanted_players: vec![],
+                real_name_to_og_name: AHashMap::default(),
+                wanted_player_props: vec!["X".to_string(), "health".to_string(), "weapon_name".to_string(), "inventory".to_string()],
+                wanted_events: vec![],
+                wanted_other_props: vec![],
+                parse_ents: true,
+                wanted_ticks: vec![],
+                parse_projectiles: false,
+                parse_grenades: false,
+                only_header: false,
+                list_props: false,
+                only_convars: false,
+                huffman_lookup_table: &huf,
+                order_by_steamid: false,
+                wanted_prop_states: AHashMap::default(),
+                fallback_bytes: None,
+                event_snapshot_props: vec![],
+                predicate: None,
+                every_n_ticks: None,
+                wanted_event_columns: None,
+                tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+                normalize_ticks: false,
+                event_window: None,
+                tensor: None,
+            };
+            let mut ds = Parser::new(settings, mode);
+            ds.target_chunk_bytes = target_chunk_bytes;
+            outputs.push(ds.parse_demo(&mmap).unwrap());
+        }
+        for output in &outputs[1..] {
+            for (id, column) in &outputs[0].df {
+                assert_eq!(column.data, output.df.get(id).unwrap().data);
+            }
+        }
+    }
+
+    #[test]
+    fn test_bounded_inflight_chunks_matches_unbounded() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+
+        let mut outputs = vec![];
+        for max_inflight_chunks in [None, Some(1), Some(3)] {
+            let settings = ParserInputs {
+                wanted_players: vec![],
+                real_name_to_og_name: AHashMap::default(),
+                wanted_player_props: vec!["X".to_string(), "health".to_string()],
+                wanted_events: vec!["player_death".to_string()],
+                wanted_other_props: vec![],
+                parse_ents: true,
+                wanted_ticks: vec![],
+                parse_projectiles: false,
+                parse_grenades: false,
+                only_header: false,
+                list_props: false,
+                only_convars: false,
+                huffman_lookup_table: &huf,
+                order_by_steamid: false,
+                wanted_prop_states: AHashMap::default(),
+                fallback_bytes: None,
+                event_snapshot_props: vec![],
+                predicate: None,
+                every_n_ticks: None,
+                wanted_event_columns: None,
+                tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+                normalize_ticks: false,
+                event_window: None,
+                tensor: None,
+            };
+            let mut ds = Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded);
+            ds.max_inflight_chunks = max_inflight_chunks;
+            outputs.push(ds.parse_demo(&mmap).unwrap());
+        }
+        for output in &outputs[1..] {
+            for id in [TICK_ID, STEAMID_ID] {
+                assert_eq!(outputs[0].df.get(&id).unwrap().data, output.df.get(&id).unwrap().data);
+            }
+            assert_eq!(outputs[0].game_events.len(), output.game_events.len());
+        }
+    }
+
+    #[test]
+    fn test_sink_matches_purchases_across_windows() {
+        // One chunk per window, so purchases and their sales end up in different windows
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let settings = ParserInputs {
+            wanted_players: vec![],
+            real_name_to_og_name: AHashMap::default(),
+            wanted_player_props: vec!["X".to_string()],
+            wanted_events: vec!["item_purchase".to_string(), "item_sold".to_string()],
+            wanted_other_props: vec![],
+            parse_ents: true,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: false,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &huf,
+            order_by_steamid: false,
+            wanted_prop_states: AHashMap::default(),
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        };
+        let expected = Parser::new(settings.clone(), crate::parse_demo::ParsingMode::ForceMultiThreaded).parse_demo(&mmap).unwrap();
+        let mut windows = vec![];
+        Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded)
+            .parse_demo_to_sink(&mmap, 1, |output| {
+                windows.push(output);
+                Ok(())
+            })
+            .unwrap();
+        assert!(windows.len() > 1);
+        // Every event comes with the last window
+        assert!(windows[..windows.len() - 1].iter().all(|w| w.game_events.is_empty()));
+        let events = &windows.last().unwrap().game_events;
+        assert_eq!(events, &expected.game_events);
+        let n_rows = |output: &DemoOutput| output.df.get(&TICK_ID).map(|c| c.len()).unwrap_or(0);
+        assert_eq!(windows.iter().map(n_rows).sum::<usize>(), n_rows(&expected));
+    }
+
+    #[test]
+    fn test_memory_limit() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let new_parser = |memory_limit| {
+            let settings = ParserInputs {
+                wanted_players: vec![],
+                real_name_to_og_name: AHashMap::default(),
+                wanted_player_props: vec!["X".to_string(), "health".to_string()],
+                wanted_events: vec![],
+                wanted_other_props: vec![],
+                parse_ents: true,
+                wanted_ticks: vec![],
+                parse_projectiles: false,
+                parse_grenades: false,
+                only_header: false,
+                list_props: false,
+                only_convars: false,
+                huffman_lookup_table: &huf,
+                order_by_steamid: false,
+                wanted_prop_states: AHashMap::default(),
+                fallback_bytes: None,
+                event_snapshot_props: vec![],
+                predicate: None,
+                every_n_ticks: None,
+                wanted_event_columns: None,
+                tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+                normalize_ticks: false,
+                event_window: None,
+                tensor: None,
+            };
+            let mut ds = Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded);
+            ds.memory_limit = memory_limit;
+            ds
+        };
+        let estimate = new_parser(None).estimate(&mmap).unwrap();
+        assert!(estimate.rows > 0 && estimate.bytes > 0);
+
+        let too_small = new_parser(Some(estimate.bytes / 2)).parse_demo(&mmap);
+        assert!(matches!(too_small, Err(DemoParserError::MemoryLimitExceeded(_))));
+
+        let unlimited = new_parser(None).parse_demo(&mmap).unwrap();
+        let limited = new_parser(Some(estimate.bytes + estimate.bytes / 10)).parse_demo(&mmap).unwrap();
+        assert_eq!(unlimited.df.get(&TICK_ID).unwrap().data, limited.df.get(&TICK_ID).unwrap().data);
+    }
+
+    #[test]
+    fn test_tail_scan_matches_full_parse() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let settings = ParserInputs {
+            wanted_players: vec![],
+            real_name_to_og_name: AHashMap::default(),
+            wanted_player_props: vec![],
+            wanted_events: vec![],
+            wanted_other_props: vec![],
+            parse_ents: false,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &huf,
+            order_by_steamid: false,
+            wanted_prop_states: AHashMap::default(),
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        };
+        let full = Parser::new(settings, crate::parse_demo::ParsingMode::Normal).parse_demo(&mmap).unwrap();
+        let tail = scan_end_of_match(&mmap).unwrap().unwrap();
+
+        let players = |md: &[PlayerEndMetaData]| md.iter().map(|p| (p.steamid, p.name.clone(), p.team_number)).collect_vec();
+        let items = |items: &[EconItem]| items.iter().map(|i| (i.steamid, i.item_id, i.def_index, i.paint_index)).collect_vec();
+        assert!(!full.player_md.is_empty());
+        assert_eq!(players(&tail.player_md), players(&full.player_md));
+        assert_eq!(items(&tail.skins), items(&full.skins));
+        assert_eq!(items(&tail.item_drops), items(&full.item_drops));
+    }
+
+    #[test]
+    fn test_snapshot_has_player_state() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let settings = ParserInputs {
+            wanted_players: vec![],
+            real_name_to_og_name: AHashMap::default(),
+            wanted_player_props: vec![],
+            wanted_events: vec![],
+            wanted_other_props: vec![],
+            parse_ents: true,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &huf,
+            order_by_steamid: false,
+            wanted_prop_states: AHashMap::default(),
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        };
+        let snapshot = Parser::new(settings, crate::parse_demo::ParsingMode::Normal).snapshot(&mmap, 10000).unwrap();
+        assert_eq!(snapshot.tick, 10000);
+        let controllers = snapshot.entities.iter().filter(|e| e.class_name == "CCSPlayerController").collect_vec();
+        assert!(!controllers.is_empty());
+        for controller in controllers {
+            assert!(controller.props.iter().any(|(name, _)| name == "CCSPlayerController.m_iszPlayerName"));
+        }
+        assert!(snapshot.entities.iter().any(|e| e.class_name == "CCSGameRulesProxy"));
+    }
+
+    #[test]
+    fn test_event_snapshots_point_at_events() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let settings = ParserInputs {
+            wanted_players: vec![],
+            real_name_to_og_name: AHashMap::default(),
+            wanted_player_props: vec![],
+            wanted_events: vec!["player_death".to_string()],
+            wanted_other_props: vec![],
+            parse_ents: true,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &huf,
+            order_by_steamid: false,
+            wanted_prop_states: AHashMap::default(),
+            fallback_bytes: None,
+            event_snapshot_props: vec!["CCSPlayerPawn.m_iHealth".to_string()],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        };
+        let output = Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded).parse_demo(&mmap).unwrap();
+        assert!(!output.game_events.is_empty());
+        for (idx, event) in output.game_events.iter().enumerate() {
+            let event_index = event.fields.iter().find(|f| f.name == "event_index").unwrap();
+            assert_eq!(event_index.data, Some(Variant::U32(idx as u32)));
+            // Snapshot props are not added to the events
+            assert!(!event.fields.iter().any(|f| f.name.contains("m_iHealth")));
+        }
+        let health = output.prop_controller.prop_infos.iter().find(|p| p.prop_name == "CCSPlayerPawn.m_iHealth").unwrap();
+        let indicies = match &output.event_snapshots[&EVENT_INDEX_ID].data {
+            Some(VarVec::U32(indicies)) => indicies.clone(),
+            _ => panic!("event_index should be u32"),
+        };
+        assert_eq!(output.event_snapshots[&health.id].len(), indicies.len());
+        assert!(indicies.windows(2).all(|w| w[0] <= w[1]));
+        assert_eq!(indicies.last().unwrap().unwrap() as usize, output.game_events.len() - 1);
+    }
+
+    #[test]
+    fn test_every_n_ticks_only_collects_sampled_ticks() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let settings = ParserInputs {
+            wanted_players: vec![],
+            real_name_to_og_name: AHashMap::default(),
+            wanted_player_props: vec!["X".to_string()],
+            wanted_events: vec![],
+            wanted_other_props: vec![],
+            parse_ents: true,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &huf,
+            order_by_steamid: false,
+            wanted_prop_states: AHashMap::default(),
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: Some(16),
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        };
+        let output = Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded).parse_demo(&mmap).unwrap();
+        let ticks = match &output.df[&TICK_ID].data {
+            Some(VarVec::I32(ticks)) => ticks.clone(),
+            _ => panic!("tick should be i32"),
+        };
+        assert!(!ticks.is_empty());
+        assert!(ticks.iter().all(|tick| tick.unwrap() % 16 == 0));
+    }
+
+    #[test]
+    fn test_every_n_ticks_velocity_is_per_tick() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let settings = ParserInputs {
+            wanted_players: vec![],
+            real_name_to_og_name: AHashMap::default(),
+            wanted_player_props: vec!["X".to_string(), "velocity_X".to_string()],
+            wanted_events: vec![],
+            wanted_other_props: vec![],
+            parse_ents: true,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &huf,
+            order_by_steamid: false,
+            wanted_prop_states: AHashMap::default(),
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: Some(16),
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        };
+        let output = Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded).parse_demo(&mmap).unwrap();
+        let (steamids, ticks, xs, velocities) = match (
+            &output.df[&STEAMID_ID].data,
+            &output.df[&TICK_ID].data,
+            &output.df[&PLAYER_X_ID].data,
+            &output.df[&VELOCITY_X_ID].data,
+        ) {
+            (Some(VarVec::U64(s)), Some(VarVec::I32(t)), Some(VarVec::F32(x)), Some(VarVec::F32(v))) => (s, t, x, v),
+            _ => panic!("unexpected column types"),
+        };
+        // Velocity of a row comes from the player's two previous rows, which are 16 ticks apart
+        let mut checked = 0;
+        for row in 0..steamids.len() {
+            let previous = (0..row).rev().filter(|r| steamids[*r] == steamids[row]).take(2).collect_vec();
+            if let [r1, r2] = previous[..] {
+                if let (Some(velocity), Some(x1), Some(x2)) = (velocities[row], xs[r1], xs[r2]) {
+                    assert_eq!(ticks[r1].unwrap() - ticks[r2].unwrap(), 16);
+                    let expected = (x1 * 64.0 - x2 * 64.0) / 16.0;
+                    assert!((velocity - expected).abs() <= 1e-3 * expected.abs().max(1.0), "{velocity} != {expected}");
+                    checked += 1;
+                }
+            }
+        }
+        assert!(checked > 0);
+    }
+
+    #[test]
+    fn test_every_n_ticks_zero_is_rejected() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let settings = ParserInputs {
+            wanted_players: vec![],
+            real_name_to_og_name: AHashMap::default(),
+            wanted_player_props: vec!["X".to_string()],
+            wanted_events: vec![],
+            wanted_other_props: vec![],
+            parse_ents: true,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &huf,
+            order_by_steamid: false,
+            wanted_prop_states: AHashMap::default(),
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: Some(0),
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        };
+        let output = Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded).parse_demo(&mmap);
+        assert!(matches!(output, Err(DemoParserError::InvalidTickStep(0))));
+    }
+
+    #[test]
+    fn test_event_windows_follow_the_attacker() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let settings = ParserInputs {
+            wanted_players: vec![],
+            real_name_to_og_name: AHashMap::default(),
+            wanted_player_props: vec![],
+            wanted_events: vec!["player_death".to_string()],
+            wanted_other_props: vec![],
+            parse_ents: true,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &huf,
+            order_by_steamid: false,
+            wanted_prop_states: AHashMap::default(),
+            fallback_bytes: None,
+            event_snapshot_props: vec!["X".to_string()],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: Some(crate::second_pass::event_windows::EventWindowSettings {
+                player_prefixes: vec!["attacker".to_string()],
+                before: 5,
+                after: 2,
+            }),
+            tensor: None,
+        };
+        // Forced multithreaded still runs in one pass, a window can start in an earlier chunk
+        let output = Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded).parse_demo(&mmap).unwrap();
+        let column = |id: u32| output.event_snapshots.get(&id).and_then(|col| col.data.clone());
+        let (ticks, steamids, indicies) = match (column(TICK_ID), column(STEAMID_ID), column(EVENT_INDEX_ID)) {
+            (Some(I32(ticks)), Some(U64(steamids)), Some(U32(indicies))) => (ticks, steamids, indicies),
+            _ => panic!("event windows are missing"),
+        };
+        assert!(!ticks.is_empty());
+        for ((tick, steamid), event_index) in ticks.iter().zip(&steamids).zip(&indicies) {
+            let event = &output.game_events[event_index.unwrap() as usize];
+            let attacker = event.fields.iter().find(|field| field.name == "attacker_steamid").and_then(|field| match &field.data {
+                Some(Variant::String(steamid)) => steamid.parse::<u64>().ok(),
+                Some(Variant::U64(steamid)) => Some(*steamid),
+                _ => None,
+            });
+            assert_eq!(attacker, *steamid);
+            assert!(tick.unwrap() >= event.tick - 5 && tick.unwrap() <= event.tick + 2);
+        }
+        // Ordered by event
+        assert!(indicies.windows(2).all(|pair| pair[0] <= pair[1]));
+    }
+
+    #[test]
+    fn test_event_columns_empty_and_unknown() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let parse = |columns: Option<Vec<std::string::String>>| {
+            let settings = ParserInputs {
+                wanted_players: vec![],
+                real_name_to_og_name: AHashMap::default(),
+                wanted_player_props: vec!["X".to_string()],
+                wanted_events: vec!["player_death".to_string()],
+                wanted_other_props: vec![],
+                parse_ents: true,
+                wanted_ticks: vec![],
+                parse_projectiles: false,
+                parse_grenades: false,
+                only_header: true,
+                list_props: false,
+                only_convars: false,
+                huffman_lookup_table: &huf,
+                order_by_steamid: false,
+                wanted_prop_states: AHashMap::default(),
+                fallback_bytes: None,
+                event_snapshot_props: vec![],
+                predicate: None,
+                every_n_ticks: None,
+                wanted_event_columns: columns,
+                tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+                normalize_ticks: false,
+                event_window: None,
+                tensor: None,
+            };
+            Parser::new(settings, crate::parse_demo::ParsingMode::ForceMultiThreaded).parse_demo(&mmap)
+        };
+        // An empty list keeps only tick, it does not mean all columns
+        let output = parse(Some(vec![])).unwrap();
+        assert!(!output.game_events.is_empty());
+        for event in &output.game_events {
+            assert_eq!(event.fields.iter().map(|field| field.name.as_str()).collect::<Vec<_>>(), vec!["tick"]);
+        }
+        // Columns of players that are never looked up are still known
+        assert!(parse(Some(vec!["weapon".to_string(), "assister_X".to_string()])).is_ok());
+        let unknown = parse(Some(vec!["weapon".to_string(), "not_a_column".to_string()]));
+        assert!(matches!(unknown, Err(DemoParserError::UnknownEventColumn(column)) if column == "not_a_column"));
+    }
+
+    #[test]
+    fn test_cursor_seek_matches_fresh_cursor() {
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = std::sync::Arc::new(unsafe { MmapOptions::new().map(&file).unwrap() });
+        let props = vec!["X".to_string(), "health".to_string()];
+        let new_cursor = || Cursor::new(mmap.clone(), props.clone(), AHashMap::default(), vec![]).unwrap();
+
+        let mut fresh = new_cursor();
+        assert_eq!(fresh.seek(10000).unwrap(), 10000);
+        let expected = fresh.read(vec![]).unwrap();
+        assert!(expected.df.contains_key(&PLAYER_X_ID));
+
+        // Forward in small steps, then far forward and back again
+        let mut cursor = new_cursor();
+        cursor.seek(9900).unwrap();
+        for _ in 0..100 {
+            cursor.step(1).unwrap();
+        }
+        assert_eq!(cursor.read(vec![]).unwrap().df, expected.df);
+        cursor.seek(50000).unwrap();
+        assert_eq!(cursor.seek(10000).unwrap(), 10000);
+        assert_eq!(cursor.read(vec![]).unwrap().df, expected.df);
+
+        let only_x = cursor.read(vec!["X".to_string()]).unwrap();
+        assert!(only_x.prop_infos.iter().all(|info| info.prop_friendly_name != "health"));
+    }
+
+    #[test]
+    fn test_cursor_seek_past_end_of_cut_off_demo() {
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = std::sync::Arc::new(unsafe { MmapOptions::new().map(&file).unwrap() });
+        let full_end = Cursor::new(mmap.clone(), vec!["X".to_string()], AHashMap::default(), vec![]).unwrap().seek(i32::MAX).unwrap();
+        let demo: &[u8] = &mmap;
+        // Cut off without a DemStop, at a few offsets so the cut lands in different parts of a frame
+        let cut_at = demo.len() / 100 * 95;
+        for extra in 0..3 {
+            let path = std::env::temp_dir().join(format!("demoparser_cut_off_{}_{}.dem", std::process::id(), extra));
+            std::fs::write(&path, &demo[..cut_at + extra]).unwrap();
+            let mmap = std::sync::Arc::new(unsafe { MmapOptions::new().map(&File::open(&path).unwrap()).unwrap() });
+            let mut cursor = Cursor::new(mmap, vec!["X".to_string()], AHashMap::default(), vec![]).unwrap();
+            let end = cursor.seek(i32::MAX).unwrap();
+            assert!(end > 0 && end < full_end);
+            assert!(cursor.read(vec![]).unwrap().df.contains_key(&PLAYER_X_ID));
+            assert_eq!(cursor.step(100).unwrap(), end);
+            assert_eq!(cursor.seek(end - 1000).unwrap(), end - 1000);
+            std::fs::remove_file(&path).unwrap();
+        }
+    }
+
+    #[test]
+    fn test_probe_matches_header() {
+        let huf = create_huffman_lookup_table();
+        let file = File::open("test_demo.dem").unwrap();
+        let mmap = unsafe { MmapOptions::new().map(&file).unwrap() };
+        let settings = ParserInputs {
+            wanted_players: vec![],
+            real_name_to_og_name: AHashMap::default(),
+            wanted_player_props: vec![],
+            wanted_events: vec![],
+            wanted_other_props: vec![],
+            parse_ents: false,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &huf,
+            order_by_steamid: false,
+            wanted_prop_states: AHashMap::default(),
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        };
+        let header = FirstPassParser::new(&settings).parse_header_only(&mmap).unwrap();
+        let probe = probe_demo(&mmap).unwrap();
+        assert_eq!(&probe.map_name, header.get("map_name").unwrap());
+        assert_eq!(&probe.server_name, header.get("server_name").unwrap());
+        assert_eq!(probe.network_protocol.to_string(), header["network_protocol"]);
+        assert!(probe.playback_ticks.unwrap() > 0);
+        assert!(probe.playback_time.unwrap() > 0.0);
+
+        let probes = probe_demo_files(&["test_demo.dem".to_string(), "does_not_exist.dem".to_string()]);
+        assert_eq!(probes[0].as_ref().unwrap(), &probe);
+        assert!(matches!(probes[1], Err(DemoParserError::FileNotFound(_))));
+        assert!(matches!(probe_demo(&[0; 100]), Err(DemoParserError::UnknownFile)));
+    }
+
     #[test]
     fn CEconItemAttribute_m_nRefundableCurrency() {
         let prop = (
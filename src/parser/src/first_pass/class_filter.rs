@@ -0,0 +1,99 @@
+use crate::first_pass::parser_settings::ParserInputs;
+use crate::first_pass::prop_controller::is_grenade_or_weapon;
+use crate::first_pass::prop_controller::PropController;
+use crate::second_pass::collect_data::PropType;
+use crate::second_pass::other_netmessages::Class;
+
+/*
+Figures out which entity classes the second pass actually has to decode for the query.
+
+Entity updates are not length prefixed so we can't jump over an entity we don't care about,
+its field paths and values still have to be read. What we can avoid is building the values,
+applying baselines and storing props for entities whose props are never looked at.
+Entities of skipped classes are still created and deleted like normal so ids stay correct.
+
+Returned vec is indexed by class id (same as cls_by_id). None means decode every class.
+*/
+pub fn classes_to_decode(cls_by_id: &[Class], settings: &ParserInputs, prop_controller: &PropController) -> Option<Vec<bool>> {
+    if settings.list_props {
+        return None;
+    }
+    let needs_weapons = needs_weapon_entities(settings, prop_controller);
+    let should_decode = |name: &str| {
+        if settings.parse_projectiles || settings.parse_grenades {
+            // Props are read from the projectile, steamid and name from the thrower
+            is_player_class(name) || is_projectile_class(name)
+        } else if !settings.wanted_events.is_empty() {
+            // Events read players for names, steamids and extra props and projectiles
+            // for the "entityid" field of grenade events that points to the thrower.
+            is_player_class(name) || is_shared_class(name) || is_projectile_class(name) || (needs_weapons && is_grenade_or_weapon(name))
+        } else {
+            is_player_class(name) || is_shared_class(name) || (needs_weapons && is_grenade_or_weapon(name))
+        }
+    };
+    Some(cls_by_id.iter().map(|cls| should_decode(&cls.name)).collect())
+}
+
+// Classes that make up the game state: players, teams, rules, C4 and projectiles
+pub fn is_state_class(name: &str) -> bool {
+    is_player_class(name) || is_shared_class(name) || is_projectile_class(name)
+}
+
+fn is_player_class(name: &str) -> bool {
+    name == "CCSPlayerController" || name.contains("Pawn")
+}
+// Team/rules props can be asked for in any query and C4 is needed for inventory
+fn is_shared_class(name: &str) -> bool {
+    match name {
+        "CCSGameRulesProxy" | "CCSTeam" | "CC4" | "CPlantedC4" => true,
+        _ => false,
+    }
+}
+// Same as EntityType::Projectile
+fn is_projectile_class(name: &str) -> bool {
+    (name.contains("Projectile") || name.contains("Grenade") || name.contains("Flash")) && !name.contains("Player")
+}
+
+fn needs_weapon_entities(settings: &ParserInputs, prop_controller: &PropController) -> bool {
+    // item_purchase reads skins, stickers etc. from the bought weapon
+    if settings.wanted_events.iter().any(|e| e == "item_purchase" || e == "all") {
+        return true;
+    }
+    prop_controller
+        .prop_infos
+        .iter()
+        .chain(prop_controller.wanted_prop_state_infos.iter().map(|x| &x.base))
+        .any(|p| p.prop_type == PropType::Weapon || p.prop_type == PropType::Custom && is_weapon_custom_prop(&p.prop_name))
+}
+// Custom props that follow handles into weapon entities
+fn is_weapon_custom_prop(prop_name: &str) -> bool {
+    prop_name.starts_with("weapon_") || prop_name.starts_with("inventory") || prop_name == "active_weapon_original_owner"
+}
+
+#[cfg(test)]
+mod tests {
+    use super::is_player_class;
+    use super::is_projectile_class;
+    use super::is_shared_class;
+    use super::is_weapon_custom_prop;
+
+    #[test]
+    fn test_class_groups() {
+        assert!(is_player_class("CCSPlayerController"));
+        assert!(is_player_class("CCSPlayerPawn"));
+        assert!(is_player_class("CCSObserverPawn"));
+        assert!(is_shared_class("CCSGameRulesProxy"));
+        assert!(is_projectile_class("CSmokeGrenadeProjectile"));
+        assert!(!is_projectile_class("CCSPlayerPawn"));
+        for name in ["CChicken", "CDynamicProp", "CAK47"] {
+            assert!(!is_player_class(name) && !is_shared_class(name) && !is_projectile_class(name));
+        }
+    }
+    #[test]
+    fn test_weapon_custom_props() {
+        assert!(is_weapon_custom_prop("weapon_name"));
+        assert!(is_weapon_custom_prop("inventory_as_ids"));
+        assert!(!is_weapon_custom_prop("X"));
+        assert!(!is_weapon_custom_prop("velocity"));
+    }
+}
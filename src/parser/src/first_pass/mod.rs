@@ -1,8 +1,12 @@
+pub mod class_filter;
 pub mod fallbackbytes;
 pub mod frameparser;
 pub mod parser;
 pub mod parser_settings;
+pub mod probe;
 pub mod prop_controller;
 pub mod read_bits;
 pub mod sendtables;
+pub mod serializer_cache;
 pub mod stringtables;
+pub mod wire;
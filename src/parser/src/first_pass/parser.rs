@@ -1,3 +1,4 @@
+use crate::first_pass::class_filter::classes_to_decode;
 use crate::first_pass::parser_settings::FirstPassParser;
 use crate::first_pass::parser_settings::ParserInputs;
 use crate::first_pass::prop_controller::PropController;
@@ -8,6 +9,8 @@ use crate::first_pass::sendtables::Serializer;
 use crate::first_pass::stringtables::parse_userinfo;
 use crate::first_pass::stringtables::StringTable;
 use crate::first_pass::stringtables::UserInfo;
+use crate::first_pass::wire::demo_packet_data;
+use crate::first_pass::wire::full_packet_view;
 use crate::maps::demo_cmd_type_from_int;
 
 use crate::second_pass::decoder::QfMapper;
@@ -18,9 +21,8 @@ use csgoproto::csvc_msg_game_event_list::DescriptorT;
 use csgoproto::message_type::NetMessageType::{self, *};
 use csgoproto::CDemoClassInfo;
 use csgoproto::CDemoFileHeader;
-use csgoproto::CDemoFullPacket;
-use csgoproto::CDemoPacket;
 use csgoproto::CDemoSendTables;
+use csgoproto::CDemoStringTables;
 use csgoproto::CsvcMsgGameEventList;
 use csgoproto::EDemoCommands;
 use prost::Message;
@@ -54,19 +56,23 @@ pub struct ClassInfoThreadResult {
 pub struct FirstPassOutput<'a> {
     pub fullpacket_offsets: Vec<usize>,
     pub settings: &'a ParserInputs<'a>,
-    pub baselines: AHashMap<u32, Vec<u8>>,
+    // Shared between all second pass chunks. Chunks only copy these if they change them.
+    pub baselines: Arc<AHashMap<u32, Vec<u8>>>,
     pub prop_controller: &'a PropController,
     pub cls_by_id: &'a Vec<Class>,
+    // Indexed by class id, classes set to false are read but not decoded. None means decode all.
+    pub classes_to_decode: Option<Arc<Vec<bool>>>,
     pub qfmap: &'a QfMapper,
     pub ge_list: &'a AHashMap<i32, DescriptorT>,
-    pub wanted_ticks: AHashSet<i32>,
-    pub string_tables: Vec<StringTable>,
-    pub stringtable_players: BTreeMap<i32, UserInfo>,
+    pub wanted_ticks: Arc<AHashSet<i32>>,
+    pub string_tables: Arc<Vec<StringTable>>,
+    pub stringtable_players: Arc<BTreeMap<i32, UserInfo>>,
     pub added_temp_props: Vec<String>,
-    pub wanted_players: AHashSet<u64>,
+    pub wanted_players: Arc<AHashSet<u64>>,
     pub header: AHashMap<String, String>,
     pub order_by_steamid: bool,
     pub list_props: bool,
+    pub last_tick: i32,
 }
 #[derive(Debug)]
 pub struct Frame {
@@ -89,6 +95,10 @@ impl<'a> FirstPassParser<'a> {
         Ok(self.header.clone())
     }
     pub fn parse_demo(&mut self, demo_bytes: &'a [u8], exit_early: bool) -> Result<FirstPassOutput, DemoParserError> {
+        // Every query goes through here first, collect_entities would divide by zero
+        if let Some(n) = self.settings.every_n_ticks.filter(|n| *n < 1) {
+            return Err(DemoParserError::InvalidTickStep(n));
+        }
         self.handle_short_header(demo_bytes.len(), &demo_bytes[..HEADER_ENDS_AT_BYTE])?;
         let mut reuseable_buffer = vec![0_u8; 100_000];
         // Loop that goes trough the entire file
@@ -97,7 +107,12 @@ impl<'a> FirstPassParser<'a> {
             if exit_early && self.cls_by_id.is_some() && !self.ge_list.is_empty() {
                 break;
             }
-            let frame = self.read_frame(demo_bytes)?;
+            let frame = match self.read_frame(demo_bytes) {
+                Ok(frame) => frame,
+                // Demos that were cut off have no DemStop and can end in the middle of a frame header
+                Err(DemoParserError::OutOfBytesError) => break,
+                Err(e) => return Err(e),
+            };
             if self.is_packet_we_skip_on_first_pass(frame.demo_cmd) {
                 self.ptr += frame.size;
                 continue;
@@ -138,6 +153,7 @@ impl<'a> FirstPassParser<'a> {
         let tick = read_varint(demo_bytes, &mut self.ptr)?;
         let size = read_varint(demo_bytes, &mut self.ptr)?;
         self.tick = tick as i32;
+        self.last_tick = self.last_tick.max(self.tick);
 
         let msg_type = cmd & !64;
         let is_compressed = (cmd & 64) == 64;
@@ -207,18 +223,19 @@ impl<'a> FirstPassParser<'a> {
             header: self.header.clone(),
             fullpacket_offsets: self.fullpacket_offsets.clone(),
             settings: &self.settings,
-            baselines: self.baselines.clone(),
+            baselines: Arc::new(self.baselines.clone()),
             prop_controller: &self.prop_controller,
             cls_by_id: &cls_by_id,
+            classes_to_decode: classes_to_decode(cls_by_id, self.settings, &self.prop_controller).map(Arc::new),
             qfmap: &self.qf_mapper,
             ge_list: &self.ge_list,
-            // arc?
-            wanted_players: self.wanted_players.clone(),
-            wanted_ticks: self.wanted_ticks.clone(),
-            string_tables: self.string_tables.clone(),
-            stringtable_players: self.stringtable_players.clone(),
+            wanted_players: Arc::new(self.wanted_players.clone()),
+            wanted_ticks: Arc::new(self.wanted_ticks.clone()),
+            string_tables: Arc::new(self.string_tables.clone()),
+            stringtable_players: Arc::new(self.stringtable_players.clone()),
             added_temp_props: self.added_temp_props.clone(),
             list_props: self.list_props,
+            last_tick: self.last_tick,
         })
     }
     fn fallback_if_first_pass_missing_data(&mut self) -> Result<(), DemoParserError> {
@@ -246,11 +263,12 @@ impl<'a> FirstPassParser<'a> {
     pub fn parse_full_packet(&mut self, bytes: &[u8], frame: &Frame) -> Result<(), DemoParserError> {
         self.fullpacket_offsets.push(frame.frame_starts_at);
 
-        let full_packet = match CDemoFullPacket::decode(bytes) {
-            Ok(list) => list,
-            Err(_) => return Err(DemoParserError::MalformedMessage),
-        };
-        if let Some(string_table) = full_packet.string_table {
+        let full_packet = full_packet_view(bytes)?;
+        if let Some(string_table_bytes) = full_packet.string_table {
+            let string_table = match CDemoStringTables::decode(string_table_bytes) {
+                Ok(st) => st,
+                Err(_) => return Err(DemoParserError::MalformedMessage),
+            };
             for item in &string_table.tables {
                 if item.table_name() == "instancebaseline" {
                     for i in &item.items {
@@ -275,11 +293,7 @@ impl<'a> FirstPassParser<'a> {
 
 impl<'a> FirstPassParser<'a> {
     pub fn parse_packet(&mut self, bytes: &[u8]) -> Result<(), DemoParserError> {
-        let msg = match CDemoPacket::decode(bytes) {
-            Err(_) => return Err(DemoParserError::MalformedMessage),
-            Ok(msg) => msg,
-        };
-        let mut bitreader = Bitreader::new(msg.data());
+        let mut bitreader = Bitreader::new(demo_packet_data(bytes)?);
 
         while bitreader.bits_remaining().unwrap_or(0) > 8 {
             let msg_type = bitreader.read_u_bit_var()?;
@@ -5,11 +5,15 @@ use crate::first_pass::prop_controller::PropInfo;
 use crate::first_pass::read_bits::DemoParserError;
 use crate::first_pass::stringtables::UserInfo;
 use crate::maps::FRIENDLY_NAMES_MAPPING;
+use crate::parse_demo::TickOutputMode;
 use crate::maps::NON_MULTITHREADABLE_PROPS;
 use crate::second_pass::decoder::QfMapper;
+use crate::second_pass::event_windows::EventWindowSettings;
 use crate::second_pass::other_netmessages::Class;
+use crate::second_pass::tensor::TensorSettings;
 use crate::second_pass::parser_settings::PlayerEndMetaData;
 use crate::second_pass::parser_settings::SpecialIDs;
+use crate::second_pass::predicate::PredicateFilter;
 use crate::second_pass::variants::Variant;
 use ahash::AHashMap;
 use ahash::AHashSet;
@@ -40,6 +44,23 @@ pub struct ParserInputs<'a> {
     pub order_by_steamid: bool,
     pub list_props: bool,
     pub fallback_bytes: Option<Vec<u8>>,
+    // Player props collected for every player each time one of wanted_events fires.
+    // They are not added to the events unless they are also in wanted_player_props.
+    pub event_snapshot_props: Vec<String>,
+    // Only rows matching the predicate are collected, see second_pass/predicate.rs
+    pub predicate: Option<PredicateFilter>,
+    // Only collect ticks divisible by this, None means every tick. Has to be at least 1.
+    pub every_n_ticks: Option<i32>,
+    // Output columns of the events, None means all. Unwanted fields are not computed.
+    pub wanted_event_columns: Option<Vec<String>>,
+    // Which rows of a player tick queries keep, unchanged rows are dropped while collecting
+    pub tick_output_mode: TickOutputMode,
+    // Rules and team props are collected once per tick (team) instead of on every player row, see normalize.rs
+    pub normalize_ticks: bool,
+    // Collect the ticks around every wanted event instead of every tick, see event_windows.rs
+    pub event_window: Option<EventWindowSettings>,
+    // Write the rows as tensor rows instead of into the df, see tensor.rs
+    pub tensor: Option<TensorSettings>,
 }
 
 pub struct FirstPassParser<'a> {
@@ -48,6 +69,8 @@ pub struct FirstPassParser<'a> {
     pub fullpacket_offsets: Vec<usize>,
     pub ptr: usize,
     pub tick: i32,
+    // Highest tick seen in a frame header. Signon frames have tick -1.
+    pub last_tick: i32,
     pub huf: &'a Vec<(u8, u8)>,
     pub settings: &'a ParserInputs<'a>,
     pub serializers: AHashMap<String, Serializer>,
@@ -102,7 +125,7 @@ impl<'a> FirstPassParser<'a> {
             order_by_steamid: inputs.order_by_steamid,
             sendtable_message: None,
             needs_velocity: needs_velocity(&inputs.wanted_player_props),
-            added_temp_props: vec![],
+            added_temp_props: predicate_only_props(inputs),
             is_multithreadable: check_multithreadability(&inputs.wanted_player_props),
             stringtable_players: BTreeMap::default(),
             only_header: inputs.only_header,
@@ -128,6 +151,7 @@ impl<'a> FirstPassParser<'a> {
             ptr: 0,
             baselines: AHashMap::default(),
             tick: 0,
+            last_tick: 0,
             huf: &inputs.huffman_lookup_table,
             qf_mapper: QfMapper {
                 idx: 0,
@@ -138,7 +162,7 @@ impl<'a> FirstPassParser<'a> {
             serializers: AHashMap::default(),
             parse_projectiles: inputs.parse_projectiles,
             parse_grenades: inputs.parse_grenades,
-            wanted_player_props: inputs.wanted_player_props.clone(),
+            wanted_player_props: with_extra_player_props(inputs),
             wanted_events: inputs.wanted_events.clone(),
             wanted_players: AHashSet::from_iter(inputs.wanted_players.iter().cloned()),
             wanted_ticks: AHashSet::from_iter(inputs.wanted_ticks.iter().cloned()),
@@ -154,6 +178,33 @@ impl<'a> FirstPassParser<'a> {
         }
     }
 }
+// Snapshot and predicate props have to be decoded like any other wanted prop
+fn with_extra_player_props(inputs: &ParserInputs) -> Vec<String> {
+    let mut props = inputs.wanted_player_props.clone();
+    let predicate_props = inputs.predicate.as_ref().map(|filter| filter.predicate.props()).unwrap_or_default();
+    for prop in inputs.event_snapshot_props.iter().chain(predicate_props.iter()) {
+        if !props.contains(prop) {
+            props.push(prop.clone());
+        }
+    }
+    props
+}
+// Props only needed for the predicate are removed from the output like the velocity helpers.
+// The id columns (tick, steamid, name) are always in the output so they are never temporary.
+fn predicate_only_props(inputs: &ParserInputs) -> Vec<String> {
+    match &inputs.predicate {
+        Some(filter) => filter
+            .predicate
+            .props()
+            .into_iter()
+            .filter(|prop| !["tick", "steamid", "name"].contains(&prop.as_str()))
+            .filter(|prop| {
+                !inputs.wanted_player_props.contains(prop) && !inputs.wanted_other_props.contains(prop) && !inputs.event_snapshot_props.contains(prop)
+            })
+            .collect(),
+        None => vec![],
+    }
+}
 pub fn check_multithreadability(player_props: &[String]) -> bool {
     for name in player_props {
         if NON_MULTITHREADABLE_PROPS.contains(name) {
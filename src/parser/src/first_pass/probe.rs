@@ -0,0 +1,102 @@
+use crate::first_pass::parser::HEADER_ENDS_AT_BYTE;
+use crate::first_pass::parser_settings::create_mmap;
+use crate::first_pass::read_bits::read_varint;
+use crate::first_pass::read_bits::DemoParserError;
+use crate::maps::demo_cmd_type_from_int;
+use csgoproto::CDemoFileHeader;
+use csgoproto::CDemoFileInfo;
+use csgoproto::EDemoCommands;
+use prost::Message;
+use rayon::iter::IntoParallelRefIterator;
+use rayon::iter::ParallelIterator;
+use snap::raw::Decoder as SnapDecoder;
+use std::borrow::Cow;
+
+/*
+Reads the metadata of a demo without running any passes over it.
+
+The first frame after the 16 byte file header is DemFileHeader (map, server, build...) and
+bytes 8..12 of the file header hold the offset of the DemFileInfo frame written at the end of
+the demo (duration, ticks, frames). Only those two frames are touched, so with a mmap only the
+first and last pages of the file are ever read.
+DemFileInfo is missing from demos that were cut short, then those fields are None.
+*/
+#[derive(Debug, Clone, PartialEq, Default)]
+pub struct DemoProbe {
+    pub map_name: String,
+    pub server_name: String,
+    pub client_name: String,
+    pub demo_version_name: String,
+    pub network_protocol: i32,
+    pub build_num: i32,
+    pub file_size: usize,
+    pub playback_time: Option<f32>,
+    pub playback_ticks: Option<i32>,
+    pub playback_frames: Option<i32>,
+}
+
+pub fn probe_demo(demo_bytes: &[u8]) -> Result<DemoProbe, DemoParserError> {
+    if demo_bytes.len() < HEADER_ENDS_AT_BYTE {
+        return Err(DemoParserError::OutOfBytesError);
+    }
+    match &demo_bytes[..8] {
+        b"PBDEMS2\0" => {}
+        b"HL2DEMO\0" => return Err(DemoParserError::Source1DemoError),
+        _ => return Err(DemoParserError::UnknownFile),
+    }
+    let header = match read_frame_at(demo_bytes, HEADER_ENDS_AT_BYTE)? {
+        (EDemoCommands::DemFileHeader, bytes) => match CDemoFileHeader::decode(bytes.as_ref()) {
+            Ok(header) => header,
+            Err(_) => return Err(DemoParserError::MalformedMessage),
+        },
+        _ => return Err(DemoParserError::MalformedMessage),
+    };
+    let mut probe = DemoProbe {
+        map_name: header.map_name().to_string(),
+        server_name: header.server_name().to_string(),
+        client_name: header.client_name().to_string(),
+        demo_version_name: header.demo_version_name().to_string(),
+        network_protocol: header.network_protocol(),
+        build_num: header.build_num(),
+        file_size: demo_bytes.len(),
+        ..Default::default()
+    };
+    if let Some(file_info) = read_file_info(demo_bytes) {
+        probe.playback_time = file_info.playback_time;
+        probe.playback_ticks = file_info.playback_ticks;
+        probe.playback_frames = file_info.playback_frames;
+    }
+    Ok(probe)
+}
+
+// Probes many files at once. Results are in the same order as the paths.
+pub fn probe_demo_files(paths: &[String]) -> Vec<Result<DemoProbe, DemoParserError>> {
+    paths.par_iter().map(|path| probe_demo(&create_mmap(path.clone())?)).collect()
+}
+
+fn read_file_info(demo_bytes: &[u8]) -> Option<CDemoFileInfo> {
+    let offset = u32::from_le_bytes(demo_bytes[8..12].try_into().ok()?) as usize;
+    match read_frame_at(demo_bytes, offset) {
+        Ok((EDemoCommands::DemFileInfo, bytes)) => CDemoFileInfo::decode(bytes.as_ref()).ok(),
+        _ => None,
+    }
+}
+
+fn read_frame_at(demo_bytes: &[u8], offset: usize) -> Result<(EDemoCommands, Cow<[u8]>), DemoParserError> {
+    let mut ptr = offset;
+    let cmd = read_varint(demo_bytes, &mut ptr)?;
+    let _tick = read_varint(demo_bytes, &mut ptr)?;
+    let size = read_varint(demo_bytes, &mut ptr)? as usize;
+    let demo_cmd = demo_cmd_type_from_int((cmd & !64) as i32)?;
+    let bytes = match demo_bytes.get(ptr..ptr + size) {
+        Some(bytes) => bytes,
+        None => return Err(DemoParserError::OutOfBytesError),
+    };
+    match (cmd & 64) == 64 {
+        true => match SnapDecoder::new().decompress_vec(bytes) {
+            Ok(decompressed) => Ok((demo_cmd, Cow::Owned(decompressed))),
+            Err(e) => Err(DemoParserError::DecompressionFailure(format!("{}", e))),
+        },
+        false => Ok((demo_cmd, Cow::Borrowed(bytes))),
+    }
+}
@@ -91,6 +91,9 @@ pub const GRENADE_X: u32 = 100100023;
 pub const GRENADE_Y: u32 = 100100024;
 pub const GRENADE_Z: u32 = 100100025;
 pub const INVENTORY_AS_IDS_BITMASK: u32 = 100100026;
+pub const END_TICK_ID: u32 = 100100027;
+pub const PLAYER_KEY_ID: u32 = 100100028;
+pub const EVENT_INDEX_ID: u32 = 100100029;
 
 #[derive(Clone, Debug)]
 pub struct PropController {
@@ -249,6 +249,13 @@ pub enum DemoParserError {
     ImpossibleCmd,
     UnkVoiceFormat,
     MalformedVoicePacket,
+    MemoryLimitExceeded(String),
+    SinkFailed(String),
+    CursorClosed,
+    NonNumericProp(String),
+    IncorrectTeamNum(String),
+    InvalidTickStep(i32),
+    UnknownEventColumn(String),
 }
 
 impl std::error::Error for DemoParserError {}
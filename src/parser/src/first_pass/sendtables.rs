@@ -12,6 +12,9 @@ use crate::first_pass::prop_controller::ITEM_PURCHASE_HANDLE;
 use crate::first_pass::prop_controller::ITEM_PURCHASE_NEW_DEF_IDX;
 use crate::first_pass::prop_controller::MY_WEAPONS_OFFSET;
 use crate::first_pass::prop_controller::WEAPON_SKIN_ID;
+use crate::first_pass::serializer_cache;
+use crate::first_pass::serializer_cache::SendtableKey;
+use crate::first_pass::serializer_cache::SendtableOutput;
 use crate::maps::BASETYPE_DECODERS;
 use crate::second_pass::decoder::Decoder;
 use crate::second_pass::decoder::Decoder::*;
@@ -73,19 +76,13 @@ pub struct ConstructorField {
     pub child_decoder: Option<Decoder>,
 }
 impl<'a> FirstPassParser<'a> {
-    pub fn parse_sendtable(&mut self) -> Result<(AHashMap<String, Serializer>, QfMapper, PropController), DemoParserError> {
+    // Serializers only depend on the sendtables and the wanted props, reuse them from earlier demos when possible
+    pub fn parse_sendtable(&mut self) -> Result<SendtableOutput, DemoParserError> {
+        // Cheap clone, the data is refcounted
         let tables = match &self.sendtable_message {
-            Some(table) => table,
+            Some(table) => table.clone(),
             None => return Err(DemoParserError::NoSendTableMessage),
         };
-
-        let mut bitreader = Bitreader::new(tables.data());
-        let n_bytes = bitreader.read_varint()?;
-        let bytes = bitreader.read_n_bytes(n_bytes as usize)?;
-        let serializer_msg = match CsvcMsgFlattenedSerializer::decode(bytes.as_slice()) {
-            Ok(msg) => msg,
-            Err(_) => return Err(DemoParserError::MalformedMessage),
-        };
         // TODO MOVE
         if needs_velocity(&self.wanted_player_props) {
             let new_props = vec!["X".to_string(), "Y".to_string(), "Z".to_string()];
@@ -96,6 +93,32 @@ impl<'a> FirstPassParser<'a> {
                 }
             }
         }
+        let key = SendtableKey::new(tables.data())
+            .list(&self.wanted_player_props)
+            .list(&self.wanted_other_props)
+            .list(&self.wanted_events)
+            .map(&self.wanted_prop_states)
+            .map(&self.real_name_to_og_name)
+            .flag(self.parse_projectiles)
+            .finish();
+        let output = match serializer_cache::get(key) {
+            Some(output) => output,
+            None => {
+                let output = self.create_sendtable_output(tables.data())?;
+                serializer_cache::insert(key, &output);
+                output
+            }
+        };
+        Ok(output)
+    }
+    fn create_sendtable_output(&mut self, sendtable_bytes: &[u8]) -> Result<SendtableOutput, DemoParserError> {
+        let mut bitreader = Bitreader::new(sendtable_bytes);
+        let n_bytes = bitreader.read_varint()?;
+        let bytes = bitreader.read_n_bytes(n_bytes as usize)?;
+        let serializer_msg = match CsvcMsgFlattenedSerializer::decode(bytes.as_slice()) {
+            Ok(msg) => msg,
+            Err(_) => return Err(DemoParserError::MalformedMessage),
+        };
         let mut prop_controller = PropController::new(
             self.wanted_player_props.clone(),
             self.wanted_other_props.clone(),
@@ -0,0 +1,99 @@
+use crate::first_pass::prop_controller::PropController;
+use crate::first_pass::sendtables::Serializer;
+use crate::second_pass::decoder::QfMapper;
+use ahash::AHashMap;
+use lazy_static::lazy_static;
+use std::collections::hash_map::DefaultHasher;
+use std::hash::Hash;
+use std::hash::Hasher;
+use std::sync::Arc;
+use std::sync::Mutex;
+
+/*
+Process wide cache of what parse_sendtable produces.
+
+Every demo from the same game build has the same sendtables, so when parsing many demos in the
+same process the serializers, quantized float decoders and prop ids can be reused. The prop ids
+depend on the wanted props, so the key is a hash of the sendtable bytes together with everything
+from the query that goes into the PropController.
+Entries are never modified after insertion, users get their own clone.
+*/
+
+pub type SendtableOutput = (AHashMap<String, Serializer>, QfMapper, PropController);
+
+// Different builds x different queries. Small because one entry can be tens of MB.
+const MAX_ENTRIES: usize = 8;
+
+lazy_static! {
+    static ref SERIALIZER_CACHE: Mutex<Vec<(u64, Arc<SendtableOutput>)>> = Mutex::new(vec![]);
+}
+
+pub struct SendtableKey {
+    hasher: DefaultHasher,
+}
+
+impl SendtableKey {
+    pub fn new(sendtable_bytes: &[u8]) -> Self {
+        let mut hasher = DefaultHasher::new();
+        sendtable_bytes.hash(&mut hasher);
+        SendtableKey { hasher }
+    }
+    // Order matters, prop ids are handed out in this order
+    pub fn list(mut self, values: &[String]) -> Self {
+        values.hash(&mut self.hasher);
+        self
+    }
+    pub fn map<V: std::fmt::Debug>(mut self, map: &AHashMap<String, V>) -> Self {
+        let mut entries: Vec<String> = map.iter().map(|(k, v)| format!("{}={:?}", k, v)).collect();
+        entries.sort();
+        entries.hash(&mut self.hasher);
+        self
+    }
+    pub fn flag(mut self, value: bool) -> Self {
+        value.hash(&mut self.hasher);
+        self
+    }
+    pub fn finish(self) -> u64 {
+        self.hasher.finish()
+    }
+}
+
+pub fn get(key: u64) -> Option<SendtableOutput> {
+    let entry = match SERIALIZER_CACHE.lock() {
+        Ok(cache) => cache.iter().find(|e| e.0 == key).map(|e| e.1.clone()),
+        Err(_) => None,
+    };
+    // Clone outside the lock so other threads aren't blocked on it
+    entry.map(|e| e.as_ref().clone())
+}
+
+pub fn insert(key: u64, output: &SendtableOutput) {
+    if let Ok(mut cache) = SERIALIZER_CACHE.lock() {
+        if cache.iter().any(|e| e.0 == key) {
+            return;
+        }
+        if cache.len() >= MAX_ENTRIES {
+            cache.remove(0);
+        }
+        cache.push((key, Arc::new(output.clone())));
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::SendtableKey;
+    use ahash::AHashMap;
+
+    #[test]
+    fn test_sendtable_key() {
+        let props = vec!["X".to_string(), "Y".to_string()];
+        let mut map = AHashMap::default();
+        map.insert("a".to_string(), "b".to_string());
+        map.insert("c".to_string(), "d".to_string());
+        let key = |bytes: &[u8], props: &[String]| SendtableKey::new(bytes).list(props).map(&map).flag(false).finish();
+
+        assert_eq!(key(&[1, 2, 3], &props), key(&[1, 2, 3], &props));
+        assert_ne!(key(&[1, 2, 3], &props), key(&[1, 2, 4], &props));
+        assert_ne!(key(&[1, 2, 3], &props), key(&[1, 2, 3], &props[..1]));
+    }
+}
@@ -6,6 +6,7 @@ use csgoproto::CsvcMsgCreateStringTable;
 use csgoproto::CsvcMsgUpdateStringTable;
 use prost::Message;
 use snap::raw::Decoder;
+use std::sync::Arc;
 
 #[derive(Clone, Debug)]
 pub struct StringTable {
@@ -312,20 +313,19 @@ impl<'a> SecondPassParser<'a> {
                 if name == "userinfo" {
                     if let Ok(player) = parse_userinfo(&value) {
                         if player.steamid != 0 {
-                            self.stringtable_players.insert(player.userid, player);
+                            Arc::make_mut(&mut self.stringtable_players).insert(player.userid, player);
                         }
                     }
                 }
                 if name == "instancebaseline" {
-                    match key.parse::<u32>() {
-                        Ok(cls_id) => self.baselines.insert(cls_id, value.clone()),
-                        Err(_e) => None,
-                    };
+                    if let Ok(cls_id) = key.parse::<u32>() {
+                        self.insert_baseline(cls_id, &value);
+                    }
                 }
                 items.push(StringTableEntry { idx, key, value });
             }
         }
-        self.string_tables.push(StringTable {
+        Arc::make_mut(&mut self.string_tables).push(StringTable {
             data: items,
             name,
             user_data_size,
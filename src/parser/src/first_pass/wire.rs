@@ -0,0 +1,186 @@
+use crate::first_pass::read_bits::DemoParserError;
+
+/*
+Minimal protobuf wire format reader for the few outer messages that are decoded for every frame.
+
+Decoding CDemoPacket, CDemoFullPacket and CSVCMsg_PacketEntities with prost from a &[u8] copies
+their byte fields into new buffers, even though the bytes already live in our own (decompressed) buffer.
+These views only pick out the fields the parser reads and hand out slices pointing into the input.
+Unknown fields are skipped and like in prost the last occurrence of a field wins.
+*/
+
+const WIRE_VARINT: u64 = 0;
+const WIRE_FIXED64: u64 = 1;
+const WIRE_LEN: u64 = 2;
+const WIRE_FIXED32: u64 = 5;
+
+#[derive(Debug, Clone, Copy, PartialEq)]
+enum WireValue<'b> {
+    Varint(u64),
+    Bytes(&'b [u8]),
+    Fixed,
+}
+
+#[derive(Debug, Clone, Copy, PartialEq, Default)]
+pub struct FullPacketView<'b> {
+    // Encoded CDemoStringTables
+    pub string_table: Option<&'b [u8]>,
+    // Encoded CDemoPacket
+    pub packet: Option<&'b [u8]>,
+}
+
+#[derive(Debug, Clone, Copy, PartialEq, Default)]
+pub struct PacketEntitiesView<'b> {
+    pub updated_entries: i32,
+    pub has_pvs_vis_bits: u32,
+    pub entity_data: &'b [u8],
+}
+
+// CDemoPacket.data
+pub fn demo_packet_data(bytes: &[u8]) -> Result<&[u8], DemoParserError> {
+    let mut data: &[u8] = &[];
+    let mut ptr = 0;
+    while ptr < bytes.len() {
+        if let (3, WireValue::Bytes(b)) = read_field(bytes, &mut ptr)? {
+            data = b;
+        }
+    }
+    Ok(data)
+}
+
+pub fn full_packet_view(bytes: &[u8]) -> Result<FullPacketView, DemoParserError> {
+    let mut view = FullPacketView::default();
+    let mut ptr = 0;
+    while ptr < bytes.len() {
+        match read_field(bytes, &mut ptr)? {
+            (1, WireValue::Bytes(b)) => view.string_table = Some(b),
+            (2, WireValue::Bytes(b)) => view.packet = Some(b),
+            _ => {}
+        }
+    }
+    Ok(view)
+}
+
+pub fn packet_entities_view(bytes: &[u8]) -> Result<PacketEntitiesView, DemoParserError> {
+    let mut view = PacketEntitiesView::default();
+    let mut ptr = 0;
+    while ptr < bytes.len() {
+        match read_field(bytes, &mut ptr)? {
+            (2, WireValue::Varint(v)) => view.updated_entries = v as i32,
+            (7, WireValue::Bytes(b)) => view.entity_data = b,
+            (16, WireValue::Varint(v)) => view.has_pvs_vis_bits = v as u32,
+            _ => {}
+        }
+    }
+    Ok(view)
+}
+
+#[inline(always)]
+fn read_field<'b>(bytes: &'b [u8], ptr: &mut usize) -> Result<(u64, WireValue<'b>), DemoParserError> {
+    let key = read_varint_u64(bytes, ptr)?;
+    let value = match key & 0b111 {
+        WIRE_VARINT => WireValue::Varint(read_varint_u64(bytes, ptr)?),
+        WIRE_LEN => {
+            let len = read_varint_u64(bytes, ptr)? as usize;
+            let end = match ptr.checked_add(len) {
+                Some(end) if end <= bytes.len() => end,
+                _ => return Err(DemoParserError::MalformedMessage),
+            };
+            let b = &bytes[*ptr..end];
+            *ptr = end;
+            WireValue::Bytes(b)
+        }
+        WIRE_FIXED64 => skip_n(bytes, ptr, 8)?,
+        WIRE_FIXED32 => skip_n(bytes, ptr, 4)?,
+        // Groups are deprecated and not used by any of these messages
+        _ => return Err(DemoParserError::MalformedMessage),
+    };
+    Ok((key >> 3, value))
+}
+
+#[inline(always)]
+fn skip_n<'b>(bytes: &'b [u8], ptr: &mut usize, n: usize) -> Result<WireValue<'b>, DemoParserError> {
+    if *ptr + n > bytes.len() {
+        return Err(DemoParserError::MalformedMessage);
+    }
+    *ptr += n;
+    Ok(WireValue::Fixed)
+}
+
+#[inline(always)]
+fn read_varint_u64(bytes: &[u8], ptr: &mut usize) -> Result<u64, DemoParserError> {
+    let mut result: u64 = 0;
+    for shift in (0..64).step_by(7) {
+        let b = match bytes.get(*ptr) {
+            Some(b) => *b,
+            None => return Err(DemoParserError::MalformedMessage),
+        };
+        *ptr += 1;
+        result |= ((b & 0x7f) as u64) << shift;
+        if b & 0x80 == 0 {
+            return Ok(result);
+        }
+    }
+    Err(DemoParserError::MalformedMessage)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use bytes::Bytes;
+    use csgoproto::CDemoFullPacket;
+    use csgoproto::CDemoPacket;
+    use csgoproto::CDemoStringTables;
+    use csgoproto::CsvcMsgPacketEntities;
+    use prost::Message;
+
+    #[test]
+    fn test_demo_packet_data() {
+        let msg = CDemoPacket {
+            data: Some(Bytes::from(vec![1, 2, 3, 4])),
+        };
+        let bytes = msg.encode_to_vec();
+        assert_eq!(demo_packet_data(&bytes).unwrap(), &[1, 2, 3, 4]);
+        assert_eq!(demo_packet_data(&[]).unwrap(), &[] as &[u8]);
+    }
+    #[test]
+    fn test_full_packet_view() {
+        let packet = CDemoPacket {
+            data: Some(Bytes::from(vec![9; 300])),
+        };
+        let msg = CDemoFullPacket {
+            string_table: Some(CDemoStringTables::default()),
+            packet: Some(packet.clone()),
+        };
+        let bytes = msg.encode_to_vec();
+        let view = full_packet_view(&bytes).unwrap();
+        assert_eq!(view.string_table, Some(&[] as &[u8]));
+        assert_eq!(view.packet, Some(packet.encode_to_vec().as_slice()));
+        assert_eq!(demo_packet_data(view.packet.unwrap()).unwrap(), &[9; 300]);
+    }
+    #[test]
+    fn test_packet_entities_view() {
+        let msg = CsvcMsgPacketEntities {
+            max_entries: Some(-1),
+            updated_entries: Some(130),
+            has_pvs_vis_bits: Some(1),
+            server_tick: Some(12345),
+            entity_data: Some(Bytes::from(vec![7, 8, 9])),
+            serialized_entities: Some(Bytes::from(vec![1; 20])),
+            ..Default::default()
+        };
+        let bytes = msg.encode_to_vec();
+        let view = packet_entities_view(&bytes).unwrap();
+        assert_eq!(view.updated_entries, msg.updated_entries());
+        assert_eq!(view.has_pvs_vis_bits, msg.has_pvs_vis_bits());
+        assert_eq!(view.entity_data, msg.entity_data());
+    }
+    #[test]
+    fn test_truncated_message() {
+        let msg = CDemoPacket {
+            data: Some(Bytes::from(vec![1, 2, 3, 4])),
+        };
+        let bytes = msg.encode_to_vec();
+        assert!(demo_packet_data(&bytes[..bytes.len() - 1]).is_err());
+    }
+}
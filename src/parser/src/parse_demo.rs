@@ -2,23 +2,37 @@ use crate::first_pass::frameparser::{FrameParser, StartEndOffset, StartEndType};
 use crate::first_pass::parser::FirstPassOutput;
 use crate::first_pass::parser_settings::check_multithreadability;
 use crate::first_pass::parser_settings::{FirstPassParser, ParserInputs};
-use crate::first_pass::prop_controller::{PropController, NAME_ID, STEAMID_ID, TICK_ID};
+use crate::first_pass::prop_controller::{PropController, PropInfo, END_TICK_ID, EVENT_INDEX_ID, NAME_ID, STEAMID_ID, TICK_ID};
+use crate::first_pass::prop_controller::{
+    FLATTENED_VEC_MAX_LEN, ITEM_PURCHASE_COST, ITEM_PURCHASE_COUNT, ITEM_PURCHASE_DEF_IDX, ITEM_PURCHASE_HANDLE, ITEM_PURCHASE_NEW_DEF_IDX, MY_WEAPONS_OFFSET,
+};
+use crate::first_pass::class_filter::is_state_class;
+use crate::first_pass::read_bits::read_varint;
 use crate::first_pass::read_bits::DemoParserError;
+use crate::first_pass::stringtables::UserInfo;
 use crate::second_pass::collect_data::ProjectileRecord;
-use crate::second_pass::game_events::{EventField, GameEvent};
+use crate::second_pass::collect_data::PropType;
+use crate::second_pass::event_windows::order_by_event_index;
+use crate::second_pass::game_events::{possible_event_columns, wants_event_field, EventField, GameEvent};
 use crate::second_pass::parser::SecondPassOutput;
 use crate::second_pass::parser_settings::*;
+use crate::second_pass::tensor::TensorRows;
 use crate::second_pass::variants::VarVec;
 use crate::second_pass::variants::{PropColumn, Variant};
 use ahash::AHashMap;
 use ahash::AHashSet;
 use csgoproto::CsvcMsgVoiceData;
 use itertools::Itertools;
-use rayon::iter::IntoParallelRefIterator;
+use rayon::iter::IntoParallelIterator;
 use rayon::prelude::ParallelIterator;
+use std::cmp::Reverse;
+use std::collections::BTreeMap;
+use std::sync::atomic::{AtomicUsize, Ordering};
 use std::sync::mpsc::{channel, Receiver};
+use std::sync::Arc;
+use std::sync::Mutex;
 use std::thread;
-use std::time::Duration;
+use std::time::{Duration, Instant};
 
 pub const HEADER_ENDS_AT_BYTE: usize = 16;
 
@@ -38,16 +52,81 @@ pub struct DemoOutput {
     pub voice_data: Vec<CsvcMsgVoiceData>,
     pub prop_controller: PropController,
     pub df_per_player: AHashMap<u64, AHashMap<u32, PropColumn>>,
+    pub chunk_timings: Vec<ChunkTiming>,
+    // Props of every player when each event fired, EVENT_INDEX_ID is the index in game_events
+    pub event_snapshots: AHashMap<u32, PropColumn>,
+    // Rules props (one row per tick) and team props (one row per team per tick) of normalized
+    // tick queries, these props are then not in df. See second_pass/normalize.rs
+    pub rules_df: AHashMap<u32, PropColumn>,
+    pub teams_df: AHashMap<u32, PropColumn>,
+    // Players in the userinfo table of any fullpacket, one per steamid with the latest name
+    pub players: Vec<UserInfo>,
+    // Columns the wanted events can have, only filled when wanted_event_columns is set
+    pub event_columns: AHashSet<String>,
+    // Rows of tensor queries, one part per chunk in file order. See second_pass/tensor.rs
+    pub tensor_rows: Vec<TensorRows>,
+}
+
+#[derive(Debug, Clone)]
+pub struct Snapshot {
+    pub tick: i32,
+    pub entities: Vec<EntitySnapshot>,
+}
+#[derive(Debug, Clone)]
+pub struct EntitySnapshot {
+    pub entity_id: i32,
+    pub class_name: String,
+    // Sorted by prop name
+    pub props: Vec<(String, Variant)>,
+}
+
+#[derive(Debug, Clone)]
+pub struct ChunkTiming {
+    pub start: usize,
+    pub end: usize,
+    pub duration: Duration,
+}
+
+// Rough size of a tick query's output, made from first pass info before any ticks are parsed.
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub struct OutputEstimate {
+    pub rows: usize,
+    pub bytes: usize,
 }
 
 pub struct Parser<'a> {
     input: ParserInputs<'a>,
     pub parsing_mode: ParsingMode,
+    // Glue neighbouring fullpacket intervals together until a chunk is about this many bytes.
+    // None means one chunk per fullpacket.
+    pub target_chunk_bytes: Option<usize>,
+    // Limits how many chunk outputs are kept in memory at once in multithreaded mode.
+    // Chunks are then parsed a window at a time and merged in file order. None means no limit.
+    // parse_demo still merges every window into the one output it returns, so this only bounds the
+    // chunk outputs next to it. parse_demo_to_sink hands the windows over one by one instead.
+    pub max_inflight_chunks: Option<usize>,
+    // Upper limit in bytes for the output of tick queries. If the estimate is above it the parse fails
+    // before the second pass, otherwise max_inflight_chunks is picked so chunk outputs fit in what is left.
+    // The whole output still has to fit, nothing is streamed or spilled.
+    pub memory_limit: Option<usize>,
+}
+// Which rows parse_ticks keeps for each player
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub enum TickOutputMode {
+    // Every tick
+    Full,
+    // Only ticks where any wanted prop differs from the player's previous row
+    Changes,
+    // One row per run of unchanged values, with the first (tick) and last (end_tick) tick of the run
+    Rle,
 }
-#[derive(PartialEq)]
+#[derive(Debug, Clone, Copy, PartialEq)]
 pub enum ParsingMode {
     ForceSingleThreaded,
     ForceMultiThreaded,
+    // Finds fullpackets and runs the first pass at the same time and starts second pass
+    // chunks as soon as their offsets are known. Falls back to Normal if props need single thread.
+    Pipelined,
     Normal,
 }
 
@@ -56,59 +135,275 @@ impl<'a> Parser<'a> {
         Parser {
             input: input,
             parsing_mode: parsing_mode,
+            target_chunk_bytes: None,
+            max_inflight_chunks: None,
+            memory_limit: None,
         }
     }
     pub fn parse_demo(&mut self, demo_bytes: &[u8]) -> Result<DemoOutput, DemoParserError> {
+        // Pipelined mode spawns a thread per chunk so it can't respect max_inflight_chunks
+        // The memory limit needs the full first pass (tick count) before starting the second pass
+        if self.parsing_mode == ParsingMode::Pipelined
+            && self.max_inflight_chunks.is_none()
+            && self.memory_limit.is_none()
+            && self.is_multithreaded()
+        {
+            return self.parse_demo_pipelined(demo_bytes);
+        }
         let mut first_pass_parser = FirstPassParser::new(&self.input);
         let first_pass_output = first_pass_parser.parse_demo(&demo_bytes, false)?;
-        if self.parsing_mode == ParsingMode::Normal
-            && check_multithreadability(&self.input.wanted_player_props)
-            && !(self.parsing_mode == ParsingMode::ForceSingleThreaded)
-            || self.parsing_mode == ParsingMode::ForceMultiThreaded
-        {
+        let max_inflight_chunks = self.max_inflight_chunks_within_memory_limit(&first_pass_output)?;
+        if self.is_multithreaded() {
+            if let Some(max_inflight_chunks) = max_inflight_chunks {
+                return self.second_pass_multi_threaded_bounded(demo_bytes, first_pass_output, max_inflight_chunks);
+            }
             return self.second_pass_multi_threaded(demo_bytes, first_pass_output);
         } else {
             self.second_pass_single_threaded(demo_bytes, first_pass_output)
         }
     }
 
-    fn second_pass_multi_threaded(&self, outer_bytes: &[u8], first_pass_output: FirstPassOutput) -> Result<DemoOutput, DemoParserError> {
-        let second_pass_outputs: Vec<Result<SecondPassOutput, DemoParserError>> = first_pass_output
-            .fullpacket_offsets
-            .par_iter()
-            .map(|offset| {
-                let mut parser = SecondPassParser::new(first_pass_output.clone(), *offset, false, None)?;
-                parser.start(outer_bytes)?;
-                Ok(parser.create_output())
+    pub fn parse_demo_to_sink<F>(&mut self, demo_bytes: &[u8], max_inflight_chunks: usize, mut sink: F) -> Result<(), DemoParserError>
+    where
+        F: FnMut(DemoOutput) -> Result<(), DemoParserError>,
+    {
+        // Same as parse_demo but the output is handed to the sink in file order, a window of chunks at a time,
+        // instead of being collected into one big output. Ticks are post-processed per window. Events are
+        // small compared to ticks so they are held back and handed over with the last window, post-processed
+        // once over the whole demo (a purchase and its sale can be in different windows).
+        let mut first_pass_parser = FirstPassParser::new(&self.input);
+        let first_pass_output = first_pass_parser.parse_demo(&demo_bytes, false)?;
+        if !self.is_multithreaded() {
+            return sink(self.second_pass_single_threaded(demo_bytes, first_pass_output)?);
+        }
+        let mut pending: Option<DemoOutput> = None;
+        let mut game_events = vec![];
+        let mut event_snapshots = AHashMap::default();
+        self.second_pass_in_windows(demo_bytes, &first_pass_output, max_inflight_chunks, |mut output| {
+            self.post_process_ticks(&mut output);
+            offset_event_indicies(&mut output.event_snapshots, game_events.len());
+            Parser::merge_dfs(&mut event_snapshots, std::mem::take(&mut output.event_snapshots));
+            game_events.extend(std::mem::take(&mut output.game_events));
+            match pending.replace(output) {
+                Some(previous) => sink(previous),
+                None => Ok(()),
+            }
+        })?;
+        match pending {
+            Some(mut last) => {
+                last.game_events = game_events;
+                last.event_snapshots = event_snapshots;
+                self.post_process_events(&mut last)?;
+                sink(last)
+            }
+            None => Ok(()),
+        }
+    }
+    pub fn estimate(&mut self, demo_bytes: &[u8]) -> Result<OutputEstimate, DemoParserError> {
+        let mut first_pass_parser = FirstPassParser::new(&self.input);
+        let first_pass_output = first_pass_parser.parse_demo(&demo_bytes, false)?;
+        Ok(estimate_output(&first_pass_output))
+    }
+    // State of players, teams, rules, C4 and projectiles after the given tick.
+    // Only replays from the last fullpacket at or before the tick instead of parsing the whole demo.
+    // Flattened vectors are included with the index after the name, see snapshot_prop_name. The econ
+    // attributes of gloves (CEconItemAttribute.m_iRawValue32 on the pawn) have no name and are left out.
+    pub fn snapshot(&mut self, demo_bytes: &[u8], tick: i32) -> Result<Snapshot, DemoParserError> {
+        let mut first_pass_parser = FirstPassParser::new(&self.input);
+        let mut first_pass_output = first_pass_parser.parse_demo(&demo_bytes, false)?;
+        let classes_to_decode = first_pass_output.cls_by_id.iter().map(|cls| is_state_class(&cls.name)).collect();
+        first_pass_output.classes_to_decode = Some(Arc::new(classes_to_decode));
+
+        let start = fullpacket_at_or_before_tick(demo_bytes, &first_pass_output.fullpacket_offsets, tick)?;
+        let mut parser = SecondPassParser::new(first_pass_output.clone(), start, false, None)?;
+        parser.stop_after_tick = Some(tick);
+        parser.start(demo_bytes)?;
+
+        let id_to_name = &first_pass_output.prop_controller.id_to_name;
+        let entities = parser
+            .entities
+            .iter()
+            .flatten()
+            .filter_map(|entity| {
+                let cls = first_pass_output.cls_by_id.get(entity.cls_id as usize)?;
+                if !is_state_class(&cls.name) {
+                    return None;
+                }
+                let props = entity
+                    .props
+                    .iter()
+                    .filter_map(|(id, value)| Some((snapshot_prop_name(*id, id_to_name)?, value.clone())))
+                    .sorted_by(|a, b| a.0.cmp(&b.0))
+                    .collect();
+                Some(EntitySnapshot {
+                    entity_id: entity.entity_id,
+                    class_name: cls.name.clone(),
+                    props,
+                })
             })
             .collect();
+        Ok(Snapshot { tick, entities })
+    }
+    fn max_inflight_chunks_within_memory_limit(&self, first_pass_output: &FirstPassOutput) -> Result<Option<usize>, DemoParserError> {
+        let memory_limit = match self.memory_limit {
+            Some(limit) => limit,
+            None => return Ok(self.max_inflight_chunks),
+        };
+        // Only tick queries grow with demo length * props. Events etc. are small in comparison.
+        if !self.input.wanted_events.is_empty() || self.input.parse_projectiles || self.input.parse_grenades || self.input.list_props {
+            return Ok(self.max_inflight_chunks);
+        }
+        let estimate = estimate_output(first_pass_output);
+        if estimate.bytes > memory_limit {
+            return Err(DemoParserError::MemoryLimitExceeded(format!(
+                "output is estimated at {} bytes ({} rows) but memory_limit is {} bytes. Ask for fewer props, players or ticks, or stream the output with parse_demo_to_sink (parse_ticks_to_dataset in Python)",
+                estimate.bytes, estimate.rows, memory_limit
+            )));
+        }
+        if self.max_inflight_chunks.is_some() || !self.is_multithreaded() {
+            return Ok(self.max_inflight_chunks);
+        }
+        // Chunk outputs live next to the merged output until they are merged in,
+        // so only keep as many chunks in flight as fit in the rest of the budget.
+        let n_chunks = first_pass_output.fullpacket_offsets.len().max(1);
+        let bytes_per_chunk = (estimate.bytes / n_chunks).max(1);
+        let fits = ((memory_limit - estimate.bytes) / bytes_per_chunk).max(1);
+        if fits >= n_chunks {
+            return Ok(None);
+        }
+        Ok(Some(fits))
+    }
+    fn is_multithreaded(&self) -> bool {
+        // A window can start in an earlier chunk than its event
+        if self.input.event_window.is_some() {
+            return false;
+        }
+        (self.parsing_mode == ParsingMode::Normal || self.parsing_mode == ParsingMode::Pipelined)
+            && check_multithreadability(&self.input.wanted_player_props)
+            || self.parsing_mode == ParsingMode::ForceMultiThreaded
+    }
+
+    fn parse_demo_pipelined(&self, demo_bytes: &[u8]) -> Result<DemoOutput, DemoParserError> {
+        /*
+        Overlaps the passes instead of running them one after the other:
+
+        1. FrameParser scans the file for fullpackets and sends each chunk's offsets as soon as it is found
+        2. At the same time the first pass only reads until sendtables, classinfo and game event list are known
+        3. Chunks are handed to second pass threads as their offsets arrive
+
+        If the frame scan could not cover the whole file, second_pass_threaded_with_channels falls back
+        to a full first pass + normal multithreaded second pass.
+        */
+        let (sender, reciever) = channel();
+        thread::scope(|s| {
+            s.spawn(move || {
+                let mut frame_parser = FrameParser::new();
+                let _ = frame_parser.par_start(demo_bytes, sender);
+            });
+            let mut first_pass_parser = FirstPassParser::new(&self.input);
+            let first_pass_output = first_pass_parser.parse_demo(demo_bytes, true)?;
+            self.second_pass_threaded_with_channels(demo_bytes, first_pass_output, reciever)
+        })
+    }
+
+    fn second_pass_multi_threaded(&self, outer_bytes: &[u8], first_pass_output: FirstPassOutput) -> Result<DemoOutput, DemoParserError> {
+        let chunks = plan_chunks(&first_pass_output.fullpacket_offsets, outer_bytes.len(), self.target_chunk_bytes);
+        let second_pass_outputs = run_chunks_longest_first(&chunks, |chunk| -> Result<SecondPassOutput, DemoParserError> {
+            let mut parser = SecondPassParser::new(first_pass_output.clone(), chunk.start, false, Some(*chunk))?;
+            parser.start(outer_bytes)?;
+            Ok(parser.create_output())
+        });
         // check for errors
         let mut ok = vec![];
-        for result in second_pass_outputs {
+        let mut chunk_timings = vec![];
+        for (result, timing) in second_pass_outputs {
             match result {
                 Err(e) => return Err(e),
                 Ok(r) => ok.push(r),
             };
+            chunk_timings.push(timing);
         }
+        chunk_timings.sort_by_key(|t| t.start);
         let mut outputs = self.combine_outputs(&mut ok, first_pass_output);
-        if let Some(new_df) = self.rm_unwanted_ticks(&mut outputs.df) {
-            outputs.df = new_df;
-        }
-        Parser::add_item_purchase_sell_column(&mut outputs.game_events);
-        Parser::remove_item_sold_events(&mut outputs.game_events);
+        outputs.chunk_timings = chunk_timings;
+        self.post_process(&mut outputs)?;
         Ok(outputs)
     }
 
+    fn second_pass_multi_threaded_bounded(
+        &self,
+        outer_bytes: &[u8],
+        first_pass_output: FirstPassOutput,
+        max_inflight_chunks: usize,
+    ) -> Result<DemoOutput, DemoParserError> {
+        // Only one window of chunk outputs is alive next to the merged output. Unwanted ticks are
+        // dropped before merging so the merged output only grows by the rows that are kept.
+        // The result is still the whole output, parse_demo_to_sink is for outputs that don't fit in memory.
+        let mut merged: Option<DemoOutput> = None;
+        self.second_pass_in_windows(outer_bytes, &first_pass_output, max_inflight_chunks, |mut output| {
+            if let Some(new_df) = self.rm_unwanted_ticks(&mut output.df) {
+                output.df = new_df;
+            }
+            match merged.as_mut() {
+                Some(acc) => Parser::merge_outputs(acc, output),
+                None => merged = Some(output),
+            };
+            Ok(())
+        })?;
+        let mut outputs = match merged {
+            Some(outputs) => outputs,
+            None => self.combine_outputs(&mut vec![], first_pass_output),
+        };
+        self.post_process(&mut outputs)?;
+        Ok(outputs)
+    }
+
+    fn second_pass_in_windows<F>(
+        &self,
+        outer_bytes: &[u8],
+        first_pass_output: &FirstPassOutput,
+        max_inflight_chunks: usize,
+        mut on_window: F,
+    ) -> Result<(), DemoParserError>
+    where
+        F: FnMut(DemoOutput) -> Result<(), DemoParserError>,
+    {
+        // Parses max_inflight_chunks chunks at a time (in parallel) and hands each window over in file order
+        // before starting the next one, so only one window of chunk outputs is alive at a time.
+        let mut chunks = plan_chunks(&first_pass_output.fullpacket_offsets, outer_bytes.len(), self.target_chunk_bytes);
+        chunks.sort_by_key(|chunk| chunk.start);
+
+        for window in chunks.chunks(max_inflight_chunks.max(1)) {
+            let mut window = window.to_vec();
+            window.sort_by_key(|chunk| Reverse(chunk.end.saturating_sub(chunk.start)));
+            let second_pass_outputs = run_chunks_longest_first(&window, |chunk| -> Result<SecondPassOutput, DemoParserError> {
+                let mut parser = SecondPassParser::new(first_pass_output.clone(), chunk.start, false, Some(*chunk))?;
+                parser.start(outer_bytes)?;
+                Ok(parser.create_output())
+            });
+            let mut ok = vec![];
+            let mut chunk_timings = vec![];
+            for (result, timing) in second_pass_outputs {
+                match result {
+                    Err(e) => return Err(e),
+                    Ok(r) => ok.push(r),
+                };
+                chunk_timings.push(timing);
+            }
+            chunk_timings.sort_by_key(|t| t.start);
+            let mut output = self.combine_outputs(&mut ok, first_pass_output.clone());
+            output.chunk_timings = chunk_timings;
+            on_window(output)?;
+        }
+        Ok(())
+    }
+
     fn second_pass_single_threaded(&self, outer_bytes: &[u8], first_pass_output: FirstPassOutput) -> Result<DemoOutput, DemoParserError> {
         let mut parser = SecondPassParser::new(first_pass_output.clone(), 16, true, None)?;
         parser.start(outer_bytes)?;
         let second_pass_output = parser.create_output();
         let mut outputs = self.combine_outputs(&mut vec![second_pass_output], first_pass_output);
-        if let Some(new_df) = self.rm_unwanted_ticks(&mut outputs.df) {
-            outputs.df = new_df;
-        }
-        Parser::add_item_purchase_sell_column(&mut outputs.game_events);
-        Parser::remove_item_sold_events(&mut outputs.game_events);
+        self.post_process(&mut outputs)?;
         Ok(outputs)
     }
     fn second_pass_threaded_with_channels(
@@ -117,80 +412,145 @@ impl<'a> Parser<'a> {
         first_pass_output: FirstPassOutput,
         reciever: Receiver<StartEndOffset>,
     ) -> Result<DemoOutput, DemoParserError> {
-        thread::scope(|s| {
-            let mut handles = vec![];
-            let mut channel_threading_was_ok = true;
-            loop {
-                if let Ok(start_end_offset) = reciever.recv_timeout(Duration::from_secs(3)) {
-                    match start_end_offset.msg_type {
-                        StartEndType::EndOfMessages => break,
-                        StartEndType::OK => {}
-                        StartEndType::MultithreadingWasNotOk => {
-                            channel_threading_was_ok = false;
-                            break;
-                        }
-                    }
-                    let my_first_out = first_pass_output.clone();
-                    handles.push(s.spawn(move || {
-                        let mut parser = SecondPassParser::new(my_first_out, start_end_offset.start, false, Some(start_end_offset))?;
+        /*
+        Chunks are started while the frame scan is still running. Neighbouring intervals are merged
+        up to target_chunk_bytes like in plan_chunks, and the chunks are parsed by one worker per
+        rayon thread that pulls them from a queue, so the number of threads doesn't grow with the
+        number of fullpackets.
+
+        The scan only says whether it covered the whole file after sending every interval, so if it
+        didn't the workers finish the chunks they are on and we fall back to a full first pass.
+        */
+        let (chunk_sender, chunk_reciever) = channel::<StartEndOffset>();
+        let chunk_reciever = Mutex::new(chunk_reciever);
+        let done: Mutex<Vec<(Result<SecondPassOutput, DemoParserError>, ChunkTiming)>> = Mutex::new(vec![]);
+        let n_workers = rayon::current_num_threads().max(1);
+        let target_chunk_bytes = self.target_chunk_bytes;
+        let (first_pass, queue, finished) = (&first_pass_output, &chunk_reciever, &done);
+
+        let channel_threading_was_ok = rayon::scope(move |s| {
+            for _ in 0..n_workers {
+                s.spawn(move |_| loop {
+                    // The lock is released before the chunk is parsed
+                    let next_chunk = queue.lock().map(|reciever| reciever.recv());
+                    let chunk = match next_chunk {
+                        Ok(Ok(chunk)) => chunk,
+                        _ => break,
+                    };
+                    let before = Instant::now();
+                    let result = SecondPassParser::new(first_pass.clone(), chunk.start, false, Some(chunk)).and_then(|mut parser| {
                         parser.start(outer_bytes)?;
                         Ok(parser.create_output())
-                    }));
-                } else {
-                    channel_threading_was_ok = false;
-                    break;
-                }
-            }
-            // Fallback if channels failed to find all fullpackets. Should be rare.
-            if !channel_threading_was_ok {
-                let mut first_pass_parser = FirstPassParser::new(&self.input);
-                let first_pass_output = first_pass_parser.parse_demo(outer_bytes, false)?;
-                return self.second_pass_multi_threaded_no_channels(outer_bytes, first_pass_output);
+                    });
+                    let timing = ChunkTiming {
+                        start: chunk.start,
+                        end: chunk.end,
+                        duration: before.elapsed(),
+                    };
+                    if let Ok(mut done) = finished.lock() {
+                        done.push((result, timing));
+                    }
+                });
             }
-            // check for errors
-            let mut ok = vec![];
-            for result in handles {
-                match result.join() {
-                    Err(_e) => return Err(DemoParserError::MalformedMessage),
-                    Ok(r) => {
-                        ok.push(r?);
+            // Stays false if the scan thread exits without saying it covered the file
+            let mut channel_threading_was_ok = false;
+            let mut pending: Option<StartEndOffset> = None;
+            // Blocks until the scan is done, the sender is dropped when the scan thread exits
+            while let Ok(start_end_offset) = reciever.recv() {
+                match start_end_offset.msg_type {
+                    StartEndType::EndOfMessages => {
+                        channel_threading_was_ok = true;
+                        break;
+                    }
+                    StartEndType::OK => {}
+                    StartEndType::MultithreadingWasNotOk => break,
+                }
+                pending = match pending {
+                    Some(mut last) if last.end == start_end_offset.start && fits_in_chunk(&last, &start_end_offset, target_chunk_bytes) => {
+                        last.end = start_end_offset.end;
+                        Some(last)
                     }
+                    Some(last) => {
+                        let _ = chunk_sender.send(last);
+                        Some(start_end_offset)
+                    }
+                    None => Some(start_end_offset),
                 };
             }
-            let mut outputs = self.combine_outputs(&mut ok, first_pass_output);
-            if let Some(new_df) = self.rm_unwanted_ticks(&mut outputs.df) {
-                outputs.df = new_df;
+            match (pending, channel_threading_was_ok) {
+                (Some(last), true) => {
+                    let _ = chunk_sender.send(last);
+                }
+                // The result is thrown away, so the chunks no worker has started are dropped
+                (_, false) => while let Ok(Ok(_)) = queue.lock().map(|reciever| reciever.try_recv()) {},
+                (None, true) => {}
             }
-            Parser::add_item_purchase_sell_column(&mut outputs.game_events);
-            Parser::remove_item_sold_events(&mut outputs.game_events);
-            return Ok(outputs);
-        })
-    }
-    fn second_pass_multi_threaded_no_channels(&self, outer_bytes: &[u8], first_pass_output: FirstPassOutput) -> Result<DemoOutput, DemoParserError> {
-        let second_pass_outputs: Vec<Result<SecondPassOutput, DemoParserError>> = first_pass_output
-            .fullpacket_offsets
-            .par_iter()
-            .map(|offset| {
-                let mut parser = SecondPassParser::new(first_pass_output.clone(), *offset, false, None)?;
-                parser.start(outer_bytes)?;
-                Ok(parser.create_output())
-            })
-            .collect();
+            // Lets the workers exit once the queue is empty
+            drop(chunk_sender);
+            channel_threading_was_ok
+        });
+        // Fallback if channels failed to find all fullpackets. Should be rare.
+        if !channel_threading_was_ok {
+            let mut first_pass_parser = FirstPassParser::new(&self.input);
+            let first_pass_output = first_pass_parser.parse_demo(outer_bytes, false)?;
+            return self.second_pass_multi_threaded(outer_bytes, first_pass_output);
+        }
         // check for errors
         let mut ok = vec![];
-        for result in second_pass_outputs {
+        let mut chunk_timings = vec![];
+        for (result, timing) in done.into_inner().unwrap_or_default() {
             match result {
                 Err(e) => return Err(e),
                 Ok(r) => ok.push(r),
             };
+            chunk_timings.push(timing);
         }
+        chunk_timings.sort_by_key(|t| t.start);
         let mut outputs = self.combine_outputs(&mut ok, first_pass_output);
+        outputs.chunk_timings = chunk_timings;
+        self.post_process(&mut outputs)?;
+        Ok(outputs)
+    }
+    fn post_process(&self, outputs: &mut DemoOutput) -> Result<(), DemoParserError> {
+        self.post_process_ticks(outputs);
+        self.post_process_events(outputs)
+    }
+    fn post_process_ticks(&self, outputs: &mut DemoOutput) {
         if let Some(new_df) = self.rm_unwanted_ticks(&mut outputs.df) {
             outputs.df = new_df;
         }
+        if let Some(new_df) = self.rm_unwanted_ticks(&mut outputs.rules_df) {
+            outputs.rules_df = new_df;
+        }
+        if let Some(new_df) = self.rm_unwanted_ticks(&mut outputs.teams_df) {
+            outputs.teams_df = new_df;
+        }
+        if self.input.tick_output_mode != TickOutputMode::Full {
+            rm_unchanged_rows(outputs, self.input.tick_output_mode);
+        }
+    }
+    // Needs all events of the demo, item_sold events are matched to earlier purchases
+    fn post_process_events(&self, outputs: &mut DemoOutput) -> Result<(), DemoParserError> {
         Parser::add_item_purchase_sell_column(&mut outputs.game_events);
-        Parser::remove_item_sold_events(&mut outputs.game_events);
-        Ok(outputs)
+        // Custom events and was_sold are built from fields that may not be wanted
+        if let Some(columns) = &self.input.wanted_event_columns {
+            let found: AHashSet<&str> = outputs.game_events.iter().flat_map(|event| event.fields.iter().map(|field| field.name.as_str())).collect();
+            if let Some(unknown) = columns.iter().find(|column| !outputs.event_columns.contains(*column) && !found.contains(column.as_str())) {
+                return Err(DemoParserError::UnknownEventColumn(unknown.clone()));
+            }
+            for event in &mut outputs.game_events {
+                event.fields.retain(|field| wants_event_field(&self.input.wanted_event_columns, &field.name));
+            }
+        }
+        if self.input.event_snapshot_props.is_empty() {
+            Parser::remove_item_sold_events(&mut outputs.game_events);
+        } else {
+            index_event_snapshots(outputs);
+        }
+        if self.input.event_window.is_some() {
+            order_by_event_index(&mut outputs.event_snapshots);
+        }
+        Ok(())
     }
     fn remove_item_sold_events(events: &mut Vec<GameEvent>) {
         events.retain(|x| x.name != "item_sold")
@@ -262,11 +622,25 @@ impl<'a> Parser<'a> {
     }
 
     fn combine_outputs(&self, second_pass_outputs: &mut Vec<SecondPassOutput>, first_pass_output: FirstPassOutput) -> DemoOutput {
-        // Combines all inner DemoOutputs into one big output
+        // Combines all inner DemoOutputs into one big output.
+        // The parts are moved out of second_pass_outputs instead of cloned, so the chunk outputs
+        // and the combined output don't both have to fit in memory.
         second_pass_outputs.sort_by_key(|x| x.ptr);
 
-        let mut dfs = second_pass_outputs.iter().map(|x| x.df.clone()).collect();
+        let mut dfs = second_pass_outputs.iter_mut().map(|x| std::mem::take(&mut x.df)).collect();
         let all_dfs_combined = self.combine_dfs(&mut dfs, false);
+        // Snapshots point at the events of their own chunk
+        let mut n_events_before = 0;
+        let mut snapshots = vec![];
+        for output in second_pass_outputs.iter_mut() {
+            let mut snapshot = std::mem::take(&mut output.event_snapshots);
+            offset_event_indicies(&mut snapshot, n_events_before);
+            n_events_before += output.game_events.len();
+            snapshots.push(snapshot);
+        }
+        let event_snapshots = self.combine_dfs(&mut snapshots, false);
+        let mut rules_dfs = second_pass_outputs.iter_mut().map(|x| std::mem::take(&mut x.rules_df)).collect();
+        let mut teams_dfs = second_pass_outputs.iter_mut().map(|x| std::mem::take(&mut x.teams_df)).collect();
         let all_game_events: AHashSet<String> = AHashSet::from_iter(second_pass_outputs.iter().flat_map(|x| x.game_events_counter.iter().cloned()));
         let mut all_prop_names: Vec<String> = Vec::from_iter(second_pass_outputs.iter().flat_map(|x| x.uniq_prop_names.iter().cloned()));
         all_prop_names.sort();
@@ -277,7 +651,15 @@ impl<'a> Parser<'a> {
             prop_controller.wanted_player_props.retain(|x| x != &prop);
             prop_controller.prop_infos.retain(|x| &x.prop_name != &prop);
         }
-        let per_players: Vec<AHashMap<u64, AHashMap<u32, PropColumn>>> = second_pass_outputs.iter().map(|x| x.df_per_player.clone()).collect();
+        let mut event_columns = match &self.input.wanted_event_columns {
+            Some(_) => possible_event_columns(first_pass_output.ge_list, &self.input.wanted_events, &prop_controller.prop_infos),
+            None => AHashSet::default(),
+        };
+        // Added by index_event_snapshots after the events are projected
+        if !self.input.event_snapshot_props.is_empty() {
+            event_columns.insert("event_index".to_string());
+        }
+        let per_players: Vec<AHashMap<u64, AHashMap<u32, PropColumn>>> = second_pass_outputs.iter_mut().map(|x| std::mem::take(&mut x.df_per_player)).collect();
         let mut all_steamids = AHashSet::default();
         for entry in &per_players {
             for (k, _) in entry {
@@ -298,19 +680,69 @@ impl<'a> Parser<'a> {
 
         DemoOutput {
             prop_controller: prop_controller,
-            chat_messages: second_pass_outputs.iter().flat_map(|x| x.chat_messages.clone()).collect(),
-            item_drops: second_pass_outputs.iter().flat_map(|x| x.item_drops.clone()).collect(),
-            player_md: second_pass_outputs.iter().flat_map(|x| x.player_md.clone()).collect(),
-            game_events: second_pass_outputs.iter().flat_map(|x| x.game_events.clone()).collect(),
-            skins: second_pass_outputs.iter().flat_map(|x| x.skins.clone()).collect(),
-            convars: second_pass_outputs.iter().flat_map(|x| x.convars.clone()).collect(),
+            chat_messages: second_pass_outputs.iter_mut().flat_map(|x| std::mem::take(&mut x.chat_messages)).collect(),
+            item_drops: second_pass_outputs.iter_mut().flat_map(|x| std::mem::take(&mut x.item_drops)).collect(),
+            player_md: second_pass_outputs.iter_mut().flat_map(|x| std::mem::take(&mut x.player_md)).collect(),
+            game_events: second_pass_outputs.iter_mut().flat_map(|x| std::mem::take(&mut x.game_events)).collect(),
+            skins: second_pass_outputs.iter_mut().flat_map(|x| std::mem::take(&mut x.skins)).collect(),
+            convars: second_pass_outputs.iter_mut().flat_map(|x| std::mem::take(&mut x.convars)).collect(),
             df: all_dfs_combined,
             header: Some(first_pass_output.header),
             game_events_counter: all_game_events,
-            projectiles: second_pass_outputs.iter().flat_map(|x| x.projectiles.clone()).collect(),
-            voice_data: second_pass_outputs.iter().flat_map(|x| x.voice_data.clone()).collect_vec(),
+            projectiles: second_pass_outputs.iter_mut().flat_map(|x| std::mem::take(&mut x.projectiles)).collect(),
+            voice_data: second_pass_outputs.iter_mut().flat_map(|x| std::mem::take(&mut x.voice_data)).collect_vec(),
             df_per_player: pp,
             uniq_prop_names: all_prop_names,
+            chunk_timings: vec![],
+            event_snapshots,
+            rules_df: self.combine_dfs(&mut rules_dfs, false),
+            teams_df: self.combine_dfs(&mut teams_dfs, false),
+            players: players_by_steamid(&first_pass_output.stringtable_players),
+            event_columns,
+            tensor_rows: second_pass_outputs.iter_mut().map(|x| std::mem::take(&mut x.tensor_rows)).filter(|rows| !rows.ticks.is_empty()).collect(),
+        }
+    }
+
+    fn merge_outputs(acc: &mut DemoOutput, mut next: DemoOutput) {
+        // Appends a later part of the demo to an already combined output
+        Parser::merge_dfs(&mut acc.df, next.df);
+        offset_event_indicies(&mut next.event_snapshots, acc.game_events.len());
+        Parser::merge_dfs(&mut acc.event_snapshots, next.event_snapshots);
+        Parser::merge_dfs(&mut acc.rules_df, next.rules_df);
+        Parser::merge_dfs(&mut acc.teams_df, next.teams_df);
+        for (steamid, df) in next.df_per_player {
+            match acc.df_per_player.get_mut(&steamid) {
+                Some(acc_df) => Parser::merge_dfs(acc_df, df),
+                None => {
+                    acc.df_per_player.insert(steamid, df);
+                }
+            }
+        }
+        acc.game_events.extend(next.game_events);
+        acc.skins.extend(next.skins);
+        acc.item_drops.extend(next.item_drops);
+        acc.chat_messages.extend(next.chat_messages);
+        acc.player_md.extend(next.player_md);
+        acc.projectiles.extend(next.projectiles);
+        acc.voice_data.extend(next.voice_data);
+        acc.chunk_timings.extend(next.chunk_timings);
+        acc.tensor_rows.extend(next.tensor_rows);
+        acc.convars.extend(next.convars);
+        acc.game_events_counter.extend(next.game_events_counter);
+        acc.uniq_prop_names.extend(next.uniq_prop_names);
+        acc.uniq_prop_names.sort();
+        acc.uniq_prop_names.dedup();
+        // Every part comes from the same first pass so next.players is the same as acc.players
+    }
+
+    fn merge_dfs(big: &mut AHashMap<u32, PropColumn>, part: AHashMap<u32, PropColumn>) {
+        for (k, mut v) in part {
+            match big.get_mut(&k) {
+                Some(inner) => inner.extend_from(&mut v),
+                None => {
+                    big.insert(k, v);
+                }
+            }
         }
     }
 
@@ -325,20 +757,21 @@ impl<'a> Parser<'a> {
             return result;
         }
 
-        for part_df in v {
-            for (k, v) in part_df {
+        // Each part is dropped as soon as it is appended
+        for part_df in v.drain(..) {
+            for (k, mut v) in part_df {
                 if remove_name_and_steamid {
-                    if k == &STEAMID_ID || k == &NAME_ID {
+                    if k == STEAMID_ID || k == NAME_ID {
                         continue;
                     }
                 }
 
-                if big.contains_key(k) {
-                    if let Some(inner) = big.get_mut(k) {
-                        inner.extend_from(v)
+                if big.contains_key(&k) {
+                    if let Some(inner) = big.get_mut(&k) {
+                        inner.extend_from(&mut v)
                     }
                 } else {
-                    big.insert(*k, v.clone());
+                    big.insert(k, v);
                 }
             }
         }
@@ -346,6 +779,340 @@ impl<'a> Parser<'a> {
     }
 }
 
+pub fn estimate_output(first_pass_output: &FirstPassOutput) -> OutputEstimate {
+    // Assume a full 5v5 if no players were found in the stringtables
+    let n_players = match first_pass_output.stringtable_players.len() {
+        0 => 10,
+        n => n,
+    };
+    let n_players = match first_pass_output.wanted_players.len() {
+        0 => n_players,
+        n => n.min(n_players),
+    };
+    let every_n_ticks = first_pass_output.settings.every_n_ticks.unwrap_or(1).max(1);
+    let n_ticks = match first_pass_output.wanted_ticks.len() {
+        0 => first_pass_output.last_tick.max(0) as usize / every_n_ticks as usize + 1,
+        _ => first_pass_output.wanted_ticks.iter().filter(|tick| *tick % every_n_ticks == 0).count(),
+    };
+    let rows = n_ticks * n_players;
+    let bytes_per_row: usize = first_pass_output.prop_controller.prop_infos.iter().map(|p| estimated_value_size(&p.prop_type, &p.prop_name)).sum();
+    OutputEstimate {
+        rows,
+        bytes: rows * bytes_per_row,
+    }
+}
+// Userids are per connection, a player who reconnects gets a new one
+fn players_by_steamid(stringtable_players: &BTreeMap<i32, UserInfo>) -> Vec<UserInfo> {
+    let mut players: Vec<UserInfo> = vec![];
+    // Ordered by userid so later connections overwrite the name
+    for player in stringtable_players.values().filter(|p| !p.is_hltv && p.steamid != 0) {
+        match players.iter_mut().find(|p| p.steamid == player.steamid) {
+            Some(known) => *known = player.clone(),
+            None => players.push(player.clone()),
+        }
+    }
+    players.sort_by_key(|p| p.steamid);
+    players
+}
+// Size of one Option<T> in a PropColumn, strings and lists include a guess for their heap part
+fn estimated_value_size(prop_type: &PropType, prop_name: &str) -> usize {
+    match prop_type {
+        PropType::Tick | PropType::GameTime => 8,
+        PropType::Steamid | PropType::Button => 16,
+        PropType::Name => 40,
+        PropType::Custom => match prop_name {
+            "inventory" | "inventory_as_ids" | "weapon_stickers" => 96,
+            "usercmd_input_history" => 256,
+            "weapon_name" | "weapon_skin" | "agent_skin" => 40,
+            _ => 16,
+        },
+        _ => 16,
+    }
+}
+
+// Frame offset of the last fullpacket at or before the tick. Falls back to the start of the demo
+// (entities are then created from normal packets) if the tick is before the first fullpacket.
+pub fn fullpacket_at_or_before_tick(demo_bytes: &[u8], fullpacket_offsets: &[usize], tick: i32) -> Result<usize, DemoParserError> {
+    let mut best = HEADER_ENDS_AT_BYTE;
+    for offset in fullpacket_offsets {
+        let mut ptr = *offset;
+        let _cmd = read_varint(demo_bytes, &mut ptr)?;
+        let fullpacket_tick = read_varint(demo_bytes, &mut ptr)? as i32;
+        if fullpacket_tick <= tick && *offset > best {
+            best = *offset;
+        }
+    }
+    Ok(best)
+}
+
+fn offset_event_indicies(snapshots: &mut AHashMap<u32, PropColumn>, offset: usize) {
+    if let Some(PropColumn {
+        data: Some(VarVec::U32(indicies)),
+        ..
+    }) = snapshots.get_mut(&EVENT_INDEX_ID)
+    {
+        for idx in indicies.iter_mut().flatten() {
+            *idx += offset as u32;
+        }
+    }
+}
+
+fn index_event_snapshots(outputs: &mut DemoOutput) {
+    /*
+    Removes item_sold events like remove_item_sold_events() but keeps the snapshots pointing at
+    the right events (snapshots of removed events are dropped) and adds event_index to every
+    event, so events and snapshots can be joined.
+    */
+    let mut new_index = vec![];
+    let mut n_kept = 0;
+    for event in &outputs.game_events {
+        match event.name == "item_sold" {
+            true => new_index.push(None),
+            false => {
+                new_index.push(Some(n_kept as u32));
+                n_kept += 1;
+            }
+        }
+    }
+    Parser::remove_item_sold_events(&mut outputs.game_events);
+    for (idx, event) in outputs.game_events.iter_mut().enumerate() {
+        event.fields.push(EventField {
+            name: "event_index".to_string(),
+            data: Some(Variant::U32(idx as u32)),
+        });
+    }
+    outputs.prop_controller.prop_infos.push(PropInfo {
+        id: EVENT_INDEX_ID,
+        prop_type: PropType::Custom,
+        prop_name: "event_index".to_string(),
+        prop_friendly_name: "event_index".to_string(),
+        is_player_prop: true,
+    });
+    let old_indicies = match outputs.event_snapshots.get(&EVENT_INDEX_ID) {
+        Some(PropColumn {
+            data: Some(VarVec::U32(indicies)),
+            ..
+        }) => indicies.clone(),
+        _ => return,
+    };
+    let mut rows = vec![];
+    let mut indicies = vec![];
+    for (row, old) in old_indicies.iter().enumerate() {
+        if let Some(new) = old.and_then(|old| new_index.get(old as usize).copied().flatten()) {
+            rows.push(row);
+            indicies.push(Some(new));
+        }
+    }
+    if rows.len() != old_indicies.len() {
+        let mut new_df = AHashMap::default();
+        for (id, col) in &outputs.event_snapshots {
+            if let Some(new) = col.slice_to_new(&rows) {
+                new_df.insert(*id, new);
+            }
+        }
+        outputs.event_snapshots = new_df;
+    }
+    outputs.event_snapshots.insert(
+        EVENT_INDEX_ID,
+        PropColumn {
+            data: Some(VarVec::U32(indicies)),
+            num_nones: 0,
+        },
+    );
+}
+
+// Flattened vector props are stored under special ids (base + index) that are not in id_to_name
+const FLATTENED_VECTORS: [(u32, &str); 5] = [
+    (ITEM_PURCHASE_COUNT, "CCSPlayerPawn.CCSPlayer_ActionTrackingServices.WeaponPurchaseCount_t.m_nCount"),
+    (ITEM_PURCHASE_DEF_IDX, "CCSPlayerPawn.CCSPlayer_BuyServices.SellbackPurchaseEntry_t.m_unDefIdx"),
+    (ITEM_PURCHASE_COST, "CCSPlayerPawn.CCSPlayer_BuyServices.SellbackPurchaseEntry_t.m_nCost"),
+    (ITEM_PURCHASE_HANDLE, "CCSPlayerPawn.CCSPlayer_BuyServices.SellbackPurchaseEntry_t.m_hItem"),
+    (ITEM_PURCHASE_NEW_DEF_IDX, "CCSPlayerPawn.CCSPlayer_ActionTrackingServices.WeaponPurchaseCount_t.m_nItemDefIndex"),
+];
+const MY_WEAPONS_NAME: &str = "CCSPlayerPawn.CCSPlayer_WeaponServices.m_hMyWeapons";
+
+// Name of a prop in a snapshot. Elements of flattened vectors get their index after the name,
+// like "CCSPlayerPawn.CCSPlayer_WeaponServices.m_hMyWeapons.0". m_hMyWeapons itself is the length.
+fn snapshot_prop_name(id: u32, id_to_name: &AHashMap<u32, String>) -> Option<String> {
+    if id == MY_WEAPONS_OFFSET {
+        return Some(MY_WEAPONS_NAME.to_string());
+    }
+    if id > MY_WEAPONS_OFFSET && id < MY_WEAPONS_OFFSET + FLATTENED_VEC_MAX_LEN {
+        return Some(format!("{}.{}", MY_WEAPONS_NAME, id - MY_WEAPONS_OFFSET - 1));
+    }
+    for (base, name) in FLATTENED_VECTORS {
+        if id >= base && id < base + FLATTENED_VEC_MAX_LEN {
+            return Some(format!("{}.{}", name, id - base));
+        }
+    }
+    id_to_name.get(&id).cloned()
+}
+
+fn rm_unchanged_rows(outputs: &mut DemoOutput, mode: TickOutputMode) {
+    /*
+    Drops rows where none of the wanted props changed since the previous row of the same player.
+    Most of them are already dropped while collecting (see collect_entities), this runs after the
+    chunks are combined so runs that continue over a chunk border are merged too.
+    In rle mode the kept row starts a run and end_tick is the tick of the last row of the run.
+    */
+    let (kept_rows, end_ticks) = match find_runs(&outputs.df) {
+        Some(runs) => runs,
+        None => return,
+    };
+    let mut new_df: AHashMap<u32, PropColumn> = AHashMap::default();
+    for (id, col) in &outputs.df {
+        if let Some(new) = col.slice_to_new(&kept_rows) {
+            new_df.insert(*id, new);
+        }
+    }
+    if mode == TickOutputMode::Rle {
+        new_df.insert(
+            END_TICK_ID,
+            PropColumn {
+                data: Some(VarVec::I32(end_ticks)),
+                num_nones: 0,
+            },
+        );
+        // Bounded parses run this once per window
+        if !outputs.prop_controller.prop_infos.iter().any(|info| info.id == END_TICK_ID) {
+            outputs.prop_controller.prop_infos.push(PropInfo {
+                id: END_TICK_ID,
+                prop_type: PropType::Tick,
+                prop_name: "end_tick".to_string(),
+                prop_friendly_name: "end_tick".to_string(),
+                is_player_prop: true,
+            });
+        }
+    }
+    outputs.df = new_df;
+}
+
+// First row and last tick of every run of rows where a player's wanted props stay the same.
+// Rows that already have an end_tick (from collect_entities) count as runs ending there.
+fn find_runs(df: &AHashMap<u32, PropColumn>) -> Option<(Vec<usize>, Vec<Option<i32>>)> {
+    let (steamids, ticks) = match (df.get(&STEAMID_ID), df.get(&TICK_ID)) {
+        (
+            Some(PropColumn {
+                data: Some(VarVec::U64(steamids)),
+                ..
+            }),
+            Some(PropColumn {
+                data: Some(VarVec::I32(ticks)),
+                ..
+            }),
+        ) => (steamids, ticks),
+        _ => return None,
+    };
+    let names = match df.get(&NAME_ID) {
+        Some(PropColumn {
+            data: Some(VarVec::String(names)),
+            ..
+        }) => Some(names),
+        _ => None,
+    };
+    let existing_end_ticks = match df.get(&END_TICK_ID) {
+        Some(PropColumn {
+            data: Some(VarVec::I32(end_ticks)),
+            ..
+        }) => Some(end_ticks),
+        _ => None,
+    };
+    let end_of = |row: usize| existing_end_ticks.and_then(|end_ticks| end_ticks[row]).or(ticks[row]);
+    let value_columns = df
+        .iter()
+        .filter(|(id, _)| ![TICK_ID, STEAMID_ID, NAME_ID, END_TICK_ID].contains(id))
+        .map(|(_, col)| col)
+        .collect_vec();
+
+    // Keyed by name too, all bots have steamid 0
+    let mut previous_row: AHashMap<(Option<u64>, Option<&str>), usize> = AHashMap::default();
+    let mut current_run: AHashMap<(Option<u64>, Option<&str>), usize> = AHashMap::default();
+    let mut kept_rows = vec![];
+    let mut end_ticks = vec![];
+    for (row, steamid) in steamids.iter().enumerate() {
+        let player = (*steamid, names.and_then(|names| names[row].as_deref()));
+        let changed = match previous_row.insert(player, row) {
+            Some(previous) => value_columns.iter().any(|col| !col.rows_equal(previous, row)),
+            None => true,
+        };
+        if changed {
+            current_run.insert(player, kept_rows.len());
+            kept_rows.push(row);
+            end_ticks.push(end_of(row));
+        } else if let Some(run) = current_run.get(&player) {
+            end_ticks[*run] = end_of(row);
+        }
+    }
+    Some((kept_rows, end_ticks))
+}
+
+pub fn plan_chunks(fullpacket_offsets: &[usize], demo_len: usize, target_chunk_bytes: Option<usize>) -> Vec<StartEndOffset> {
+    /*
+    Turns fullpacket offsets into byte ranges for the second pass. A chunk has to start at a fullpacket
+    so intervals can't be split, but with a target size small neighbouring intervals (warmup, timeouts etc.)
+    are merged so we don't pay for a SecondPassParser per tiny chunk.
+
+    Returned longest first so the slowest chunks get started first.
+    */
+    let mut offsets = fullpacket_offsets.to_vec();
+    offsets.sort();
+    offsets.dedup();
+
+    let mut chunks: Vec<StartEndOffset> = vec![];
+    for (idx, start) in offsets.iter().enumerate() {
+        let interval = StartEndOffset {
+            start: *start,
+            end: *offsets.get(idx + 1).unwrap_or(&demo_len),
+            msg_type: StartEndType::OK,
+        };
+        match chunks.last_mut() {
+            Some(last) if fits_in_chunk(last, &interval, target_chunk_bytes) => last.end = interval.end,
+            _ => chunks.push(interval),
+        }
+    }
+    chunks.sort_by_key(|chunk| Reverse(chunk.end.saturating_sub(chunk.start)));
+    chunks
+}
+
+// Whether next can be merged into chunk without going over the target size
+fn fits_in_chunk(chunk: &StartEndOffset, next: &StartEndOffset, target_chunk_bytes: Option<usize>) -> bool {
+    match target_chunk_bytes {
+        Some(target) => chunk.end.saturating_sub(chunk.start) + next.end.saturating_sub(next.start) <= target,
+        None => false,
+    }
+}
+
+fn run_chunks_longest_first<T, F>(chunks: &[StartEndOffset], f: F) -> Vec<(T, ChunkTiming)>
+where
+    T: Send,
+    F: Fn(&StartEndOffset) -> T + Sync,
+{
+    // Workers pull chunks from a shared counter in the order given, so with a longest first order
+    // the big chunks start right away and the small ones fill in the gaps at the end.
+    let next_chunk = AtomicUsize::new(0);
+    let n_workers = rayon::current_num_threads().min(chunks.len()).max(1);
+    let per_worker: Vec<Vec<(T, ChunkTiming)>> = (0..n_workers)
+        .into_par_iter()
+        .map(|_| {
+            let mut done = vec![];
+            while let Some(chunk) = chunks.get(next_chunk.fetch_add(1, Ordering::Relaxed)) {
+                let before = Instant::now();
+                let result = f(chunk);
+                done.push((
+                    result,
+                    ChunkTiming {
+                        start: chunk.start,
+                        end: chunk.end,
+                        duration: before.elapsed(),
+                    },
+                ));
+            }
+            done
+        })
+        .collect();
+    per_worker.into_iter().flatten().collect()
+}
+
 #[derive(Debug)]
 pub struct SellBackHelper {
     pub tick: i32,
@@ -376,3 +1143,61 @@ impl SellBackHelper {
         None
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::find_runs;
+    use super::plan_chunks;
+    use crate::first_pass::prop_controller::{END_TICK_ID, STEAMID_ID, TICK_ID};
+    use crate::second_pass::variants::{PropColumn, VarVec};
+    use ahash::AHashMap;
+
+    fn ranges(offsets: &[usize], demo_len: usize, target: Option<usize>) -> Vec<(usize, usize)> {
+        plan_chunks(offsets, demo_len, target).iter().map(|c| (c.start, c.end)).collect()
+    }
+
+    #[test]
+    fn test_plan_chunks_one_per_fullpacket() {
+        assert_eq!(ranges(&[16, 100, 150, 400], 1000, None), vec![(400, 1000), (150, 400), (16, 100), (100, 150)]);
+    }
+    #[test]
+    fn test_plan_chunks_unsorted_and_duplicate_offsets() {
+        assert_eq!(ranges(&[150, 16, 100, 16], 200, None), vec![(16, 100), (100, 150), (150, 200)]);
+    }
+    #[test]
+    fn test_plan_chunks_merges_small_intervals() {
+        // 16..100 and 100..150 fit in 200 bytes together, 150..400 does not fit with them
+        assert_eq!(ranges(&[16, 100, 150, 400, 420], 1000, Some(200)), vec![(420, 1000), (150, 400), (16, 150), (400, 420)]);
+    }
+    #[test]
+    fn test_plan_chunks_does_not_split_big_intervals() {
+        assert_eq!(ranges(&[16, 5000], 6000, Some(100)), vec![(16, 5000), (5000, 6000)]);
+    }
+    #[test]
+    fn test_find_runs_per_player() {
+        let column = |data: VarVec| PropColumn { data: Some(data), num_nones: 0 };
+        let mut df = AHashMap::default();
+        // Two players, rows in tick order
+        df.insert(TICK_ID, column(VarVec::I32(vec![Some(1), Some(1), Some(2), Some(2), Some(3), Some(3), Some(4), Some(4)])));
+        df.insert(STEAMID_ID, column(VarVec::U64(vec![Some(1), Some(2), Some(1), Some(2), Some(1), Some(2), Some(1), Some(2)])));
+        df.insert(1000, column(VarVec::I32(vec![Some(800), Some(800), Some(800), Some(650), Some(800), Some(650), Some(0), Some(650)])));
+
+        let (rows, end_ticks) = find_runs(&df).unwrap();
+        assert_eq!(rows, vec![0, 1, 3, 6]);
+        assert_eq!(end_ticks, vec![Some(3), Some(1), Some(4), Some(4)]);
+    }
+    #[test]
+    fn test_find_runs_merges_collected_runs_and_nan() {
+        let column = |data: VarVec| PropColumn { data: Some(data), num_nones: 0 };
+        let mut df = AHashMap::default();
+        // Runs already deduplicated by two chunks, the second chunk starts at tick 5
+        df.insert(TICK_ID, column(VarVec::I32(vec![Some(1), Some(5), Some(8)])));
+        df.insert(END_TICK_ID, column(VarVec::I32(vec![Some(4), Some(7), Some(9)])));
+        df.insert(STEAMID_ID, column(VarVec::U64(vec![Some(1), Some(1), Some(1)])));
+        df.insert(1000, column(VarVec::F32(vec![Some(f32::NAN), Some(f32::NAN), Some(1.0)])));
+
+        let (rows, end_ticks) = find_runs(&df).unwrap();
+        assert_eq!(rows, vec![0, 2]);
+        assert_eq!(end_ticks, vec![Some(7), Some(9)]);
+    }
+}
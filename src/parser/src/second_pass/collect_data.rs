@@ -1,12 +1,17 @@
 use super::entities::PlayerMetaData;
+use super::variants::same_value;
 use super::variants::Sticker;
 use super::variants::Variant;
 use crate::first_pass::prop_controller::*;
 use crate::first_pass::read_bits::DemoParserError;
 use crate::maps::BUTTONMAP;
 use crate::maps::PLAYER_COLOR;
+use crate::parse_demo::TickOutputMode;
 use crate::second_pass::entities::EntityType;
+use crate::second_pass::event_windows::WindowRow;
+use crate::second_pass::normalize::{is_rules_prop, is_shared_prop, is_team_prop, push_values, TEAM_NUM_PROP};
 use crate::second_pass::parser_settings::SecondPassParser;
+use crate::second_pass::predicate::PredicateScope;
 use crate::second_pass::variants::PropColumn;
 use crate::second_pass::variants::VarVec;
 use ahash::AHashMap;
@@ -57,69 +62,225 @@ pub enum CoordinateAxis {
 // This file collects the data that is converted into a dataframe in the end in parser.parse_ticks()
 
 impl<'a> SecondPassParser<'a> {
-    pub fn collect_entities(&mut self) {
+    pub fn collect_entities(&mut self) -> Result<(), DemoParserError> {
+        if self.event_window.is_some() {
+            self.collect_event_windows();
+            return Ok(());
+        }
         if !self.prop_controller.event_with_velocity {
             if !self.wanted_ticks.contains(&self.tick) && self.wanted_ticks.len() != 0 || self.wanted_events.len() != 0 {
-                return;
+                return Ok(());
+            }
+            // Checked to be at least 1 before parsing, see FirstPassParser::parse_demo
+            if let Some(n) = self.every_n_ticks {
+                if self.tick % n != 0 {
+                    return Ok(());
+                }
             }
         }
         if self.parse_projectiles {
             self.collect_projectiles();
-            return;
+            return Ok(());
+        }
+        let predicate_scope = self.predicate.as_ref().map(|filter| filter.scope);
+        // Velocity is computed from consecutive rows so those are only deduplicated after parsing
+        let drop_unchanged = self.tick_output_mode != TickOutputMode::Full && !self.prop_controller.event_with_velocity;
+        if predicate_scope == Some(PredicateScope::Tick) && !self.players.iter().any(|(entity_id, player)| self.player_matches_predicate(entity_id, player)) {
+            return Ok(());
         }
         // iterate every player and every wanted prop name
         // if either one is missing then push None to output
         for (entity_id, player) in &self.players {
+            if predicate_scope == Some(PredicateScope::Player) && !self.player_matches_predicate(entity_id, player) {
+                continue;
+            }
             // iterate every wanted prop state
             // if any prop's state for this tick is not the wanted state, dont extract info from tick
             for wanted_prop_state_info in &self.prop_controller.wanted_prop_state_infos {
                 match self.find_prop(&wanted_prop_state_info.base, entity_id, player) {
                     Ok(prop) => {
                         if prop != wanted_prop_state_info.wanted_prop_state {
-                            return;
+                            return Ok(());
                         }
                     }
-                    Err(_e) => return,
+                    Err(_e) => return Ok(()),
                 }
             }
 
-            for prop_info in &self.prop_controller.prop_infos {
-                let player_steamid = match player.steamid {
-                    Some(steamid) => steamid,
-                    None => 0,
-                };
-                if !self.wanted_players.is_empty() && !self.wanted_players.contains(&player_steamid) {
+            let player_steamid = match player.steamid {
+                Some(steamid) => steamid,
+                None => 0,
+            };
+            if !self.wanted_players.is_empty() && !self.wanted_players.contains(&player_steamid) {
+                continue;
+            }
+            // Ultimate debugger is to print the errors of find_prop
+            let row: Vec<Option<Variant>> = self
+                .prop_controller
+                .prop_infos
+                .iter()
+                .map(|prop_info| match self.normalize_ticks && is_shared_prop(prop_info) {
+                    // Collected once per tick (or team) below
+                    true => None,
+                    false => self.find_prop(prop_info, entity_id, player).ok(),
+                })
+                .collect();
+            if let Some(settings) = &self.tensor {
+                self.tensor_rows.push(settings, &self.prop_controller.prop_infos, self.tick, player_steamid, player.name.as_ref(), &row)?;
+                // Velocity is computed from the earlier rows in output
+                if !self.prop_controller.needs_velocity {
                     continue;
                 }
-                if self.order_by_steamid && !self.df_per_player.contains_key(&player_steamid) {
-                    self.df_per_player.insert(player_steamid, AHashMap::default());
+            }
+            if self.order_by_steamid {
+                let df_this_player = self.df_per_player.entry(player_steamid).or_insert_with(AHashMap::default);
+                for (prop_info, value) in self.prop_controller.prop_infos.iter().zip(row) {
+                    df_this_player.entry(prop_info.id).or_insert_with(|| PropColumn::new()).push(value);
                 }
-                if self.order_by_steamid {
-                    match self.find_prop(prop_info, entity_id, player) {
-                        Ok(prop) => {
-                            let df_this_player = self.df_per_player.get_mut(&player.steamid.unwrap_or(0)).unwrap();
-                            df_this_player.entry(prop_info.id).or_insert_with(|| PropColumn::new()).push(Some(prop.clone()));
-                        }
-                        Err(_e) => {
-                            let df_this_player = self.df_per_player.get_mut(&player.steamid.unwrap_or(0)).unwrap();
-                            df_this_player.entry(prop_info.id).or_insert_with(|| PropColumn::new()).push(None);
+                continue;
+            }
+            if drop_unchanged {
+                /*
+                Rows where none of the wanted props changed since the player's last kept row are not pushed
+                at all, in rle mode the end_tick of the kept row is moved forward instead. Runs are only
+                tracked within this chunk, rm_unchanged_rows merges them across chunks after combining.
+                */
+                let key = (player_steamid, player.name.clone());
+                if let Some((kept_row, kept_values)) = self.last_kept_rows.get(&key) {
+                    let unchanged = self
+                        .prop_controller
+                        .prop_infos
+                        .iter()
+                        .zip(row.iter().zip(kept_values))
+                        .all(|(prop_info, (value, kept))| [TICK_ID, STEAMID_ID, NAME_ID].contains(&prop_info.id) || same_value(value, kept));
+                    if unchanged {
+                        if let Some(PropColumn {
+                            data: Some(VarVec::I32(end_ticks)),
+                            ..
+                        }) = self.output.get_mut(&END_TICK_ID)
+                        {
+                            end_ticks[*kept_row] = Some(self.tick);
                         }
+                        continue;
                     }
-                } else {
-                    match self.find_prop(prop_info, entity_id, player) {
-                        Ok(prop) => {
-                            self.output.entry(prop_info.id).or_insert_with(|| PropColumn::new()).push(Some(prop));
-                        }
-                        Err(_e) => {
-                            // Ultimate debugger is to print this error
-                            self.output.entry(prop_info.id).or_insert_with(|| PropColumn::new()).push(None);
-                        }
+                }
+                self.last_kept_rows.insert(key, (self.rows_collected, row.clone()));
+            }
+            for (prop_info, value) in self.prop_controller.prop_infos.iter().zip(row) {
+                if self.normalize_ticks && is_shared_prop(prop_info) {
+                    continue;
+                }
+                self.output.entry(prop_info.id).or_insert_with(|| PropColumn::new()).push(value);
+            }
+            if drop_unchanged && self.tick_output_mode == TickOutputMode::Rle {
+                self.output.entry(END_TICK_ID).or_insert_with(|| PropColumn::new()).push(Some(Variant::I32(self.tick)));
+            }
+            self.rows_collected += 1;
+            if !self.normalize_ticks {
+                continue;
+            }
+            // Rules and team props are the same for every player of the tick (or team), see normalize.rs
+            let prop_controller = self.prop_controller;
+            if self.rules_collected_tick != Some(self.tick) && prop_controller.prop_infos.iter().any(is_rules_prop) {
+                let mut values = vec![(TICK_ID, Some(Variant::I32(self.tick)))];
+                for prop_info in prop_controller.prop_infos.iter().filter(|info| is_rules_prop(info)) {
+                    values.push((prop_info.id, self.find_prop(prop_info, entity_id, player).ok()));
+                }
+                push_values(&mut self.rules_output, values);
+                self.rules_collected_tick = Some(self.tick);
+            }
+            if prop_controller.prop_infos.iter().any(is_team_prop) {
+                let team_num_info = match prop_controller.prop_infos.iter().find(|info| info.prop_name == TEAM_NUM_PROP) {
+                    Some(info) => info,
+                    None => return Err(DemoParserError::IncorrectTeamNum("team_num has to be wanted with team props".to_string())),
+                };
+                let team_num = match self.find_prop(team_num_info, entity_id, player) {
+                    Ok(Variant::U32(team_num)) => team_num,
+                    Ok(other) => return Err(DemoParserError::IncorrectTeamNum(format!("expected a u32 team_num, got {:?}", other))),
+                    // Players without a team have no team props either
+                    Err(_e) => continue,
+                };
+                if self.teams_collected.0 != self.tick {
+                    self.teams_collected = (self.tick, vec![]);
+                }
+                if !self.teams_collected.1.contains(&team_num) {
+                    self.teams_collected.1.push(team_num);
+                    let mut values = vec![(TICK_ID, Some(Variant::I32(self.tick))), (team_num_info.id, Some(Variant::U32(team_num)))];
+                    for prop_info in prop_controller.prop_infos.iter().filter(|info| is_team_prop(info)) {
+                        values.push((prop_info.id, self.find_prop(prop_info, entity_id, player).ok()));
                     }
+                    push_values(&mut self.teams_output, values);
                 }
             }
         }
+        Ok(())
     }
 
+    // Props of every player for the events pushed since the last call, at the end of the packet they fired in
+    pub fn collect_event_snapshots(&mut self) {
+        while self.snapshotted_events < self.game_events.len() {
+            let mut rows = vec![];
+            for (entity_id, player) in &self.players {
+                let row: Vec<Option<Variant>> = self.event_snapshot_infos.iter().map(|info| self.find_prop(info, entity_id, player).ok()).collect();
+                rows.push(row);
+            }
+            for row in rows {
+                for (prop_info, value) in self.event_snapshot_infos.iter().zip(row) {
+                    self.event_snapshots.entry(prop_info.id).or_insert_with(PropColumn::new).push(value);
+                }
+                self.event_snapshots
+                    .entry(EVENT_INDEX_ID)
+                    .or_insert_with(PropColumn::new)
+                    .push(Some(Variant::U32(self.snapshotted_events as u32)));
+            }
+            self.snapshotted_events += 1;
+        }
+    }
+
+    // Rows of every player go to the ring buffer of event_windows.rs, the ones inside open windows are written
+    fn collect_event_windows(&mut self) {
+        let rows = self
+            .players
+            .iter()
+            .map(|(entity_id, player)| {
+                let row = self.event_snapshot_infos.iter().map(|info| self.find_prop(info, entity_id, player).ok()).collect();
+                (player.steamid.unwrap_or(0), row)
+            })
+            .collect();
+        let window_rows = match &self.event_window {
+            Some(settings) => self.event_window_state.push_tick(settings, self.tick, rows),
+            None => vec![],
+        };
+        self.push_window_rows(window_rows);
+    }
+    // Opens the windows of the events pushed since the last call, at the end of the packet they fired in
+    pub fn open_event_windows(&mut self) {
+        let window_rows = match &self.event_window {
+            Some(settings) => self.event_window_state.open(settings, &self.game_events),
+            None => vec![],
+        };
+        self.push_window_rows(window_rows);
+    }
+    fn push_window_rows(&mut self, rows: Vec<WindowRow>) {
+        for (event_index, row) in rows {
+            for (prop_info, value) in self.event_snapshot_infos.iter().zip(row) {
+                self.event_snapshots.entry(prop_info.id).or_insert_with(PropColumn::new).push(value);
+            }
+            self.event_snapshots.entry(EVENT_INDEX_ID).or_insert_with(PropColumn::new).push(Some(Variant::U32(event_index)));
+        }
+    }
+
+    fn player_matches_predicate(&self, entity_id: &i32, player: &PlayerMetaData) -> bool {
+        let filter = match &self.predicate {
+            Some(filter) => filter,
+            None => return true,
+        };
+        let value_of = |prop: &str| match self.predicate_infos.iter().find(|info| info.prop_name == prop) {
+            Some(info) => self.find_prop(info, entity_id, player).ok(),
+            None => None,
+        };
+        filter.predicate.matches(&value_of)
+    }
     pub fn find_prop(&self, prop_info: &PropInfo, entity_id: &i32, player: &PlayerMetaData) -> Result<Variant, PropCollectionError> {
         match prop_info.prop_type {
             PropType::Tick => return self.create_tick(),
@@ -450,7 +611,7 @@ impl<'a> SecondPassParser<'a> {
         }
     }
     pub fn get_userid(&self, player: &PlayerMetaData) -> Result<Variant, PropCollectionError> {
-        for (_, st_player) in &self.stringtable_players {
+        for (_, st_player) in self.stringtable_players.iter() {
             if player.steamid == Some(st_player.steamid) {
                 return Ok(Variant::I32(st_player.userid));
             }
@@ -617,9 +778,17 @@ impl<'a> SecondPassParser<'a> {
             CoordinateAxis::Y => self.output.get(&PLAYER_Y_ID),
             CoordinateAxis::Z => self.output.get(&PLAYER_Z_ID),
         };
+        // The rows are more than a tick apart with every_n_ticks or sparse ticks, so divide by the ticks between them
+        let ticks_between = match self.output.get(&TICK_ID).map(|ticks| &ticks.data) {
+            Some(Some(VarVec::I32(ticks))) if indicies.len() == 2 => match (ticks[indicies[0]], ticks[indicies[1]]) {
+                (Some(t1), Some(t2)) if t1 > t2 => (t1 - t2) as f32,
+                _ => 1.0,
+            },
+            _ => 1.0,
+        };
         if let Some(c) = col {
             if let Some((Some(v1), Some(v2))) = self.index_coordinates_from_propcol(c, indicies) {
-                return Ok(Variant::F32((v1 * 64.0) - (v2 * 64.0)));
+                return Ok(Variant::F32(((v1 * 64.0) - (v2 * 64.0)) / ticks_between));
             }
         }
         return Err(PropCollectionError::VelocityNotFound);
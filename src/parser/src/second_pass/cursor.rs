@@ -0,0 +1,249 @@
+use crate::first_pass::parser::FirstPassOutput;
+use crate::first_pass::parser::HEADER_ENDS_AT_BYTE;
+use crate::first_pass::frameparser::{StartEndOffset, StartEndType};
+use crate::first_pass::parser_settings::{FirstPassParser, ParserInputs};
+use crate::first_pass::prop_controller::PropInfo;
+use crate::first_pass::read_bits::DemoParserError;
+use crate::parse_demo::fullpacket_at_or_before_tick;
+use crate::second_pass::collect_data::PropType;
+use crate::second_pass::parser_settings::create_huffman_lookup_table;
+use crate::second_pass::parser_settings::SecondPassParser;
+use crate::second_pass::variants::PropColumn;
+use ahash::AHashMap;
+use memmap2::Mmap;
+use std::sync::mpsc::{channel, Receiver, Sender};
+use std::sync::Arc;
+use std::thread;
+
+/*
+Keeps a second pass alive between calls so moving around the demo only costs the ticks in between.
+
+The first and second pass borrow from each other and from the parser inputs, so everything lives on
+a worker thread that owns the demo and is driven trough channels. The thread exits when the Cursor
+is dropped.
+seek() restarts from the last fullpacket before the tick when going backwards or when that
+fullpacket is ahead of the current position, otherwise it keeps decoding from where it is.
+Nothing is collected while replaying, read() looks the wanted props up from the current state.
+*/
+
+// Never a real tick, so collect_entities() skips every tick while replaying
+const NO_TICK: i32 = i32::MIN;
+
+#[derive(Debug, Clone)]
+pub struct CursorOutput {
+    pub tick: i32,
+    pub prop_infos: Vec<PropInfo>,
+    pub df: AHashMap<u32, PropColumn>,
+}
+
+enum CursorCommand {
+    Seek(i32),
+    Step(i32),
+    Read(Vec<String>),
+}
+
+enum CursorReply {
+    Tick(i32),
+    Output(CursorOutput),
+}
+
+pub struct Cursor {
+    commands: Sender<CursorCommand>,
+    replies: Receiver<Result<CursorReply, DemoParserError>>,
+    tick: i32,
+}
+
+impl Cursor {
+    // Runs the first pass and moves to tick 0 before returning, so errors in the demo show up here
+    pub fn new(demo: Arc<Mmap>, wanted_props: Vec<String>, real_name_to_og_name: AHashMap<String, String>, wanted_players: Vec<u64>) -> Result<Self, DemoParserError> {
+        let (command_sender, command_reciever) = channel();
+        let (reply_sender, reply_reciever) = channel();
+        thread::spawn(move || run_cursor(demo, wanted_props, real_name_to_og_name, wanted_players, command_reciever, reply_sender));
+        let mut cursor = Cursor {
+            commands: command_sender,
+            replies: reply_reciever,
+            tick: NO_TICK,
+        };
+        cursor.tick = cursor.wait_for_tick()?;
+        Ok(cursor)
+    }
+    pub fn tick(&self) -> i32 {
+        self.tick
+    }
+    // Moves to the end of the tick. Past the end of the demo the cursor stays at the last tick.
+    pub fn seek(&mut self, tick: i32) -> Result<i32, DemoParserError> {
+        self.send(CursorCommand::Seek(tick))?;
+        self.tick = self.wait_for_tick()?;
+        Ok(self.tick)
+    }
+    pub fn step(&mut self, n_ticks: i32) -> Result<i32, DemoParserError> {
+        self.send(CursorCommand::Step(n_ticks))?;
+        self.tick = self.wait_for_tick()?;
+        Ok(self.tick)
+    }
+    // Wanted props of every player at the current tick. Empty props means all of them.
+    pub fn read(&mut self, props: Vec<String>) -> Result<CursorOutput, DemoParserError> {
+        self.send(CursorCommand::Read(props))?;
+        match self.wait()? {
+            CursorReply::Output(output) => Ok(output),
+            CursorReply::Tick(_) => Err(DemoParserError::CursorClosed),
+        }
+    }
+    fn send(&self, command: CursorCommand) -> Result<(), DemoParserError> {
+        self.commands.send(command).map_err(|_| DemoParserError::CursorClosed)
+    }
+    fn wait(&self) -> Result<CursorReply, DemoParserError> {
+        match self.replies.recv() {
+            Ok(reply) => reply,
+            Err(_) => Err(DemoParserError::CursorClosed),
+        }
+    }
+    fn wait_for_tick(&self) -> Result<i32, DemoParserError> {
+        match self.wait()? {
+            CursorReply::Tick(tick) => Ok(tick),
+            CursorReply::Output(_) => Err(DemoParserError::CursorClosed),
+        }
+    }
+}
+
+fn run_cursor(
+    demo: Arc<Mmap>,
+    wanted_props: Vec<String>,
+    real_name_to_og_name: AHashMap<String, String>,
+    wanted_players: Vec<u64>,
+    commands: Receiver<CursorCommand>,
+    replies: Sender<Result<CursorReply, DemoParserError>>,
+) {
+    let huf = create_huffman_lookup_table();
+    let settings = ParserInputs {
+        real_name_to_og_name,
+        wanted_players,
+        wanted_player_props: wanted_props,
+        wanted_other_props: vec![],
+        wanted_prop_states: AHashMap::default(),
+        wanted_ticks: vec![NO_TICK],
+        wanted_events: vec![],
+        parse_ents: true,
+        parse_projectiles: false,
+        parse_grenades: false,
+        only_header: true,
+        only_convars: false,
+        huffman_lookup_table: &huf,
+        order_by_steamid: false,
+        list_props: false,
+        fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: crate::parse_demo::TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
+    };
+    let demo_bytes: &[u8] = &demo;
+    let mut first_pass_parser = FirstPassParser::new(&settings);
+    let mut state = match first_pass_parser.parse_demo(demo_bytes, false).and_then(|output| CursorState::new(demo_bytes, output)) {
+        Ok(state) => state,
+        Err(e) => {
+            let _ = replies.send(Err(e));
+            return;
+        }
+    };
+    if replies.send(state.seek(0).map(CursorReply::Tick)).is_err() {
+        return;
+    }
+    for command in commands {
+        let reply = match command {
+            CursorCommand::Seek(tick) => state.seek(tick).map(CursorReply::Tick),
+            CursorCommand::Step(n_ticks) => state.seek(state.tick.saturating_add(n_ticks)).map(CursorReply::Tick),
+            CursorCommand::Read(props) => Ok(CursorReply::Output(state.read(&props))),
+        };
+        if replies.send(reply).is_err() {
+            return;
+        }
+    }
+}
+
+struct CursorState<'a> {
+    demo_bytes: &'a [u8],
+    first_pass_output: FirstPassOutput<'a>,
+    parser: SecondPassParser<'a>,
+    tick: i32,
+}
+
+impl<'a> CursorState<'a> {
+    fn new(demo_bytes: &'a [u8], first_pass_output: FirstPassOutput<'a>) -> Result<Self, DemoParserError> {
+        let parser = new_parser(demo_bytes, &first_pass_output, HEADER_ENDS_AT_BYTE)?;
+        Ok(CursorState {
+            demo_bytes,
+            first_pass_output,
+            parser,
+            tick: NO_TICK,
+        })
+    }
+    fn seek(&mut self, tick: i32) -> Result<i32, DemoParserError> {
+        // Past the end there is nothing to stop at, the parser runs to the end of the demo
+        let tick = tick.min(self.first_pass_output.last_tick);
+        let start = fullpacket_at_or_before_tick(self.demo_bytes, &self.first_pass_output.fullpacket_offsets, tick)?;
+        if tick < self.tick || start > self.parser.ptr {
+            self.parser = new_parser(self.demo_bytes, &self.first_pass_output, start)?;
+            self.tick = NO_TICK;
+        }
+        if !self.parser.demo_ended {
+            self.parser.stop_after_tick = Some(tick);
+            self.parser.start(self.demo_bytes)?;
+        }
+        self.tick = match self.parser.demo_ended {
+            true => self.parser.tick,
+            false => tick,
+        };
+        Ok(self.tick)
+    }
+    fn read(&self, props: &[String]) -> CursorOutput {
+        let prop_infos: Vec<PropInfo> = self
+            .parser
+            .prop_controller
+            .prop_infos
+            .iter()
+            .filter(|info| props.is_empty() || props.contains(&info.prop_friendly_name) || is_id_prop(info))
+            .cloned()
+            .collect();
+        let mut df: AHashMap<u32, PropColumn> = AHashMap::default();
+        for (entity_id, player) in &self.parser.players {
+            let steamid = player.steamid.unwrap_or(0);
+            if !self.parser.wanted_players.is_empty() && !self.parser.wanted_players.contains(&steamid) {
+                continue;
+            }
+            for prop_info in &prop_infos {
+                let value = self.parser.find_prop(prop_info, entity_id, player).ok();
+                df.entry(prop_info.id).or_insert_with(PropColumn::new).push(value);
+            }
+        }
+        CursorOutput {
+            tick: self.tick,
+            prop_infos,
+            df,
+        }
+    }
+}
+
+fn is_id_prop(prop_info: &PropInfo) -> bool {
+    matches!(prop_info.prop_type, PropType::Tick | PropType::Steamid | PropType::Name)
+}
+
+fn new_parser<'a>(demo_bytes: &[u8], first_pass_output: &FirstPassOutput<'a>, start: usize) -> Result<SecondPassParser<'a>, DemoParserError> {
+    // Parsed like a chunk that runs to the end of the demo: entities are created from the first
+    // fullpacket and the following fullpackets only update the stringtables.
+    let chunk = StartEndOffset {
+        start,
+        end: demo_bytes.len(),
+        msg_type: StartEndType::OK,
+    };
+    let mut parser = SecondPassParser::new(first_pass_output.clone(), start, false, Some(chunk))?;
+    if start == HEADER_ENDS_AT_BYTE {
+        // Entities come from the signon packets, don't create them again at the first fullpacket
+        parser.fullpackets_parsed = 1;
+    }
+    Ok(parser)
+}
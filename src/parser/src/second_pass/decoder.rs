@@ -62,6 +62,34 @@ impl<'a> Bitreader<'a> {
             GameModeRulesDecoder => Ok(Variant::U32(self.read_nbits(7)?)),
         }
     }
+    // Moves the reader past the value without building it. Used for entities the query never looks at.
+    #[inline(always)]
+    pub fn skip(&mut self, decoder: &Decoder, qf_map: &QfMapper) -> Result<(), DemoParserError> {
+        match decoder {
+            NoscaleDecoder => {
+                self.read_nbits(32)?;
+            }
+            BooleanDecoder | ComponentDecoder => {
+                self.read_nbits(1)?;
+            }
+            UnsignedDecoder | SignedDecoder | BaseDecoder | CentityHandleDecoder | AmmoDecoder | FloatSimulationTimeDecoder => {
+                self.read_varint()?;
+            }
+            Qangle3Decoder | QanglePitchYawDecoder | VectorNoscaleDecoder => {
+                for _ in 0..3 {
+                    self.read_nbits(32)?;
+                }
+            }
+            GameModeRulesDecoder => {
+                self.read_nbits(7)?;
+            }
+            StringDecoder => while self.read_nbits(8)? != 0 {},
+            _ => {
+                self.decode(decoder, qf_map)?;
+            }
+        }
+        Ok(())
+    }
     pub fn decode_qangle_variant_pres(&mut self) -> Result<[f32; 3], DemoParserError> {
         let mut v = [0.0; 3];
 
@@ -6,14 +6,14 @@ use crate::first_pass::sendtables::get_decoder_from_field;
 use crate::first_pass::sendtables::get_propinfo;
 use crate::first_pass::sendtables::Field;
 use crate::first_pass::sendtables::FieldInfo;
+use crate::first_pass::wire::packet_entities_view;
 use crate::second_pass::game_events::GameEventInfo;
 use crate::second_pass::other_netmessages::Class;
 use crate::second_pass::parser_settings::SecondPassParser;
 use crate::second_pass::path_ops::*;
 use crate::second_pass::variants::Variant;
 use ahash::AHashMap;
-use csgoproto::CsvcMsgPacketEntities;
-use prost::Message;
+use std::sync::Arc;
 
 const NSERIALBITS: u32 = 17;
 const STOP_READING_SYMBOL: u8 = 39;
@@ -55,15 +55,12 @@ impl<'a> SecondPassParser<'a> {
         if !self.parse_entities {
             return Ok(());
         }
-        let msg = match CsvcMsgPacketEntities::decode(bytes) {
-            Err(_) => return Err(DemoParserError::MalformedMessage),
-            Ok(msg) => msg,
-        };
+        let msg = packet_entities_view(bytes)?;
 
-        let mut bitreader = Bitreader::new(msg.entity_data());
+        let mut bitreader = Bitreader::new(msg.entity_data);
         let mut entity_id: i32 = -1;
         let mut events_to_emit = vec![];
-        for _ in 0..msg.updated_entries() {
+        for _ in 0..msg.updated_entries {
             entity_id += 1 + (bitreader.read_u_bit_var()? as i32);
             // Read 2 bits to know which operation should be done to the entity.
             let cmd = match bitreader.read_nbits(2)? {
@@ -86,7 +83,7 @@ impl<'a> SecondPassParser<'a> {
                     self.update_entity(&mut bitreader, entity_id, false, &mut events_to_emit, is_fullpacket)?;
                 }
                 EntityCmd::Update => {
-                    if msg.has_pvs_vis_bits() > 0 {
+                    if msg.has_pvs_vis_bits > 0 {
                         // Most entities pass trough here. Seems like entities that are not updated.
                         if bitreader.read_nbits(2)? & 0x01 == 1 {
                             continue;
@@ -111,6 +108,9 @@ impl<'a> SecondPassParser<'a> {
         is_fullpacket: bool,
     ) -> Result<(), DemoParserError> {
         let n_updates = self.parse_paths(bitreader)?;
+        if !self.should_decode_entity(entity_id) {
+            return self.skip_entity_update(bitreader, entity_id, n_updates);
+        }
         let n_updated_values = self.decode_entity_update(bitreader, entity_id, n_updates, is_fullpacket, is_baseline, events_to_emit)?;
         if n_updated_values > 0 {
             self.gather_extra_info(&entity_id, is_baseline)?;
@@ -268,6 +268,32 @@ impl<'a> SecondPassParser<'a> {
         }
         Ok(n_updates)
     }
+    fn should_decode_entity(&self, entity_id: i32) -> bool {
+        let classes_to_decode = match &self.classes_to_decode {
+            Some(classes) => classes,
+            None => return true,
+        };
+        match self.entities.get(entity_id as usize) {
+            Some(Some(entity)) => classes_to_decode.get(entity.cls_id as usize).copied().unwrap_or(true),
+            _ => true,
+        }
+    }
+    fn skip_entity_update(&self, bitreader: &mut Bitreader, entity_id: i32, n_updates: usize) -> Result<(), DemoParserError> {
+        let entity = match self.entities.get(entity_id as usize) {
+            Some(Some(entity)) => entity,
+            _ => return Err(DemoParserError::EntityNotFound),
+        };
+        let class = match self.cls_by_id.get(entity.cls_id as usize) {
+            Some(cls) => cls,
+            None => return Err(DemoParserError::ClassNotFound),
+        };
+        for path in self.paths.iter().take(n_updates) {
+            let field = find_field(&path, &class.serializer)?;
+            let decoder = get_decoder_from_field(field)?;
+            bitreader.skip(&decoder, self.qf_mapper)?;
+        }
+        Ok(())
+    }
     pub fn debug_inspect(
         _result: &Variant,
         field: &Field,
@@ -341,10 +367,14 @@ impl<'a> SecondPassParser<'a> {
             Some(entry) => *entry = Some(entity),
             None => return Err(DemoParserError::VectorResizeFailure),
         };
+        // Entities the query doesn't need never have their props read so baselines can be skipped too
+        if !self.should_decode_entity(*entity_id) {
+            return Ok(());
+        }
         // Insert baselines
-        if let Some(baseline_bytes) = self.baselines.get(&cls_id) {
-            let b = &baseline_bytes.clone();
-            let mut br = Bitreader::new(&b);
+        let baselines = Arc::clone(&self.baselines);
+        if let Some(baseline_bytes) = baselines.get(&cls_id) {
+            let mut br = Bitreader::new(baseline_bytes);
             self.update_entity(&mut br, *entity_id, true, &mut vec![], false)?;
         }
         Ok(())
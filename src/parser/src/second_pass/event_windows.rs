@@ -0,0 +1,199 @@
+use crate::first_pass::prop_controller::EVENT_INDEX_ID;
+use crate::second_pass::game_events::GameEvent;
+use crate::second_pass::variants::PropColumn;
+use crate::second_pass::variants::VarVec;
+use crate::second_pass::variants::Variant;
+use ahash::AHashMap;
+use std::collections::VecDeque;
+
+/*
+Ticks around events, like the ticks before every player_hurt for the attacker, in one pass.
+
+While the ticks are collected the rows of every player go into a ring buffer that holds the last
+`before` ticks. When a wanted event fires the buffered rows of its players are written out and the
+window stays open for `after` more ticks. A tick that is in many windows ends up in every window
+it is in. The rows go to event_snapshots with the index of the event.
+
+A window can start before the chunk its event is in, so these parses are never split into chunks
+(see Parser::is_multithreaded).
+*/
+
+#[derive(Debug, Clone, PartialEq)]
+pub struct EventWindowSettings {
+    // Picks the players of the event, "attacker" uses the attacker_steamid field. Empty means all players.
+    pub player_prefixes: Vec<String>,
+    pub before: i32,
+    pub after: i32,
+}
+
+#[derive(Debug, Clone, PartialEq)]
+pub struct EventWindow {
+    pub event_index: u32,
+    pub end_tick: i32,
+    // None means all players
+    pub steamids: Option<Vec<u64>>,
+    // Ticks up to this one are already written
+    written_until: i32,
+}
+
+// Index of the event and the values of one row
+pub type WindowRow = (u32, Vec<Option<Variant>>);
+
+#[derive(Debug, Clone, Default)]
+pub struct EventWindowState {
+    // Rows (steamid, values) of the last `before` ticks, oldest first
+    buffer: VecDeque<(i32, Vec<(u64, Vec<Option<Variant>>)>)>,
+    open_windows: Vec<EventWindow>,
+    events_seen: usize,
+    last_tick: Option<i32>,
+}
+
+impl EventWindow {
+    fn wants(&self, steamid: u64) -> bool {
+        match &self.steamids {
+            None => true,
+            Some(steamids) => steamids.contains(&steamid),
+        }
+    }
+}
+
+impl EventWindowState {
+    // Takes the rows of one tick, returns the ones inside an open window
+    pub fn push_tick(&mut self, settings: &EventWindowSettings, tick: i32, rows: Vec<(u64, Vec<Option<Variant>>)>) -> Vec<WindowRow> {
+        let mut out = vec![];
+        for window in &mut self.open_windows {
+            if tick > window.written_until && tick <= window.end_tick {
+                out.extend(rows.iter().filter(|(steamid, _)| window.wants(*steamid)).map(|(_, row)| (window.event_index, row.clone())));
+                window.written_until = tick;
+            }
+        }
+        self.open_windows.retain(|window| window.end_tick > tick);
+        // The current tick is kept too, its event can come after its entities
+        self.buffer.push_back((tick, rows));
+        while self.buffer.front().is_some_and(|(buffered, _)| *buffered < tick - settings.before) {
+            self.buffer.pop_front();
+        }
+        self.last_tick = Some(tick);
+        out
+    }
+    // Opens a window for every event pushed since the last call, returns the buffered rows of them
+    pub fn open(&mut self, settings: &EventWindowSettings, events: &[GameEvent]) -> Vec<WindowRow> {
+        let steamid_fields: Vec<String> = settings.player_prefixes.iter().map(|prefix| prefix.to_owned() + "_steamid").collect();
+        let mut out = vec![];
+        while self.events_seen < events.len() {
+            let event = &events[self.events_seen];
+            let steamids = match steamid_fields.is_empty() {
+                true => None,
+                false => Some(
+                    event
+                        .fields
+                        .iter()
+                        .filter(|field| steamid_fields.contains(&field.name))
+                        .filter_map(|field| match &field.data {
+                            Some(Variant::String(steamid)) => steamid.parse::<u64>().ok(),
+                            Some(Variant::U64(steamid)) => Some(*steamid),
+                            _ => None,
+                        })
+                        .collect(),
+                ),
+            };
+            let window = EventWindow {
+                event_index: self.events_seen as u32,
+                end_tick: event.tick.saturating_add(settings.after),
+                steamids,
+                written_until: self.last_tick.unwrap_or(i32::MIN),
+            };
+            let start_tick = event.tick.saturating_sub(settings.before);
+            for (_, rows) in self.buffer.iter().filter(|(tick, _)| *tick >= start_tick && *tick <= window.end_tick) {
+                out.extend(rows.iter().filter(|(steamid, _)| window.wants(*steamid)).map(|(_, row)| (window.event_index, row.clone())));
+            }
+            if self.last_tick.map_or(true, |last_tick| window.end_tick > last_tick) {
+                self.open_windows.push(window);
+            }
+            self.events_seen += 1;
+        }
+        out
+    }
+}
+
+// Rows are written in tick order so the windows of close events are interleaved.
+// Groups them by event, in tick order within each event.
+pub fn order_by_event_index(df: &mut AHashMap<u32, PropColumn>) {
+    let rows = match df.get(&EVENT_INDEX_ID) {
+        Some(PropColumn {
+            data: Some(VarVec::U32(indicies)),
+            ..
+        }) => {
+            let mut rows: Vec<usize> = (0..indicies.len()).collect();
+            rows.sort_by_key(|row| indicies[*row]);
+            rows
+        }
+        _ => return,
+    };
+    *df = df.iter().filter_map(|(id, col)| Some((*id, col.slice_to_new(&rows)?))).collect();
+}
+
+#[cfg(test)]
+mod tests {
+    use super::{order_by_event_index, EventWindowSettings, EventWindowState};
+    use crate::first_pass::prop_controller::{EVENT_INDEX_ID, TICK_ID};
+    use crate::second_pass::game_events::{EventField, GameEvent};
+    use crate::second_pass::variants::{PropColumn, VarVec, Variant};
+    use ahash::AHashMap;
+
+    fn event(tick: i32, attacker: &str) -> GameEvent {
+        GameEvent {
+            name: "player_hurt".to_string(),
+            tick,
+            fields: vec![EventField {
+                name: "attacker_steamid".to_string(),
+                data: Some(Variant::String(attacker.to_string())),
+            }],
+        }
+    }
+    fn rows(tick: i32) -> Vec<(u64, Vec<Option<Variant>>)> {
+        vec![(7, vec![Some(Variant::I32(tick))]), (8, vec![Some(Variant::I32(tick))])]
+    }
+
+    #[test]
+    fn test_event_windows() {
+        let settings = EventWindowSettings {
+            player_prefixes: vec!["attacker".to_string()],
+            before: 2,
+            after: 1,
+        };
+        let mut state = EventWindowState::default();
+        let mut events = vec![];
+        let mut out = vec![];
+        for tick in 8..=13 {
+            // Events fire after the entities of their tick were collected
+            out.extend(state.push_tick(&settings, tick, rows(tick)));
+            match tick {
+                11 => events.push(event(11, "7")),
+                12 => events.push(event(12, "8")),
+                _ => {}
+            }
+            out.extend(state.open(&settings, &events));
+        }
+        let out: Vec<(u32, i32)> = out
+            .into_iter()
+            .map(|(event_index, row)| match row[0] {
+                Some(Variant::I32(tick)) => (event_index, tick),
+                _ => panic!(),
+            })
+            .collect();
+        // Ticks 9-12 of player 7 for the first event, 10-13 of player 8 for the second
+        assert_eq!(out, vec![(0, 9), (0, 10), (0, 11), (0, 12), (1, 10), (1, 11), (1, 12), (1, 13)]);
+    }
+
+    #[test]
+    fn test_order_by_event_index() {
+        let column = |data: VarVec| PropColumn { data: Some(data), num_nones: 0 };
+        let mut df = AHashMap::default();
+        df.insert(TICK_ID, column(VarVec::I32(vec![Some(11), Some(11), Some(12), Some(12)])));
+        df.insert(EVENT_INDEX_ID, column(VarVec::U32(vec![Some(0), Some(1), Some(1), Some(0)])));
+        order_by_event_index(&mut df);
+        assert_eq!(df[&TICK_ID], column(VarVec::I32(vec![Some(11), Some(12), Some(11), Some(12)])));
+        assert_eq!(df[&EVENT_INDEX_ID], column(VarVec::U32(vec![Some(0), Some(0), Some(1), Some(1)])));
+    }
+}
@@ -18,6 +18,9 @@ use crate::second_pass::entities::Entity;
 use crate::second_pass::entities::PlayerMetaData;
 use crate::second_pass::parser_settings::SecondPassParser;
 use crate::second_pass::variants::*;
+use ahash::AHashMap;
+use ahash::AHashSet;
+use csgoproto::csvc_msg_game_event_list::DescriptorT;
 use csgoproto::csvc_msg_game_event::KeyT;
 use csgoproto::maps::WEAPINDICIES;
 use csgoproto::CUserMessageSayText;
@@ -40,6 +43,60 @@ static INTERNALEVENTFIELDS: &'static [&str] = &[
     "victim",
     "victim_pawn",
 ];
+// Keys that find_extra needs to find the players of the event
+static PLAYEREVENTFIELDS: &'static [&str] = &["userid", "attacker", "assister", "victim", "entityid", "userid_pawn"];
+
+// None means every column. Tick is always kept.
+pub fn wants_event_field(columns: &Option<Vec<String>>, name: &str) -> bool {
+    match columns {
+        None => true,
+        Some(columns) => name == "tick" || columns.iter().any(|column| column == name),
+    }
+}
+// Columns the wanted events of the game event list can have, for rejecting unknown wanted_event_columns.
+// Custom events (item_purchase, round_end etc.) are not in the list, their columns are only known from the parsed events.
+pub fn possible_event_columns(ge_list: &AHashMap<i32, DescriptorT>, wanted_events: &[String], prop_infos: &[PropInfo]) -> AHashSet<String> {
+    let all_events = wanted_events.first() == Some(&"all".to_string());
+    let mut columns = AHashSet::default();
+    columns.insert("tick".to_string());
+    for event_desc in ge_list.values() {
+        if !all_events && !wanted_events.contains(&event_desc.name().to_string()) {
+            continue;
+        }
+        for key in &event_desc.keys {
+            // Same prefixes as find_extra
+            let prefix = match key.name() {
+                "attacker" => "attacker",
+                "userid" | "entityid" | "userid_pawn" => "user",
+                "assister" => "assister",
+                "victim" => "victim",
+                name if INTERNALEVENTFIELDS.contains(&name) => continue,
+                name => {
+                    columns.insert(name.to_string());
+                    continue;
+                }
+            };
+            columns.insert(prefix.to_owned() + "_name");
+            columns.insert(prefix.to_owned() + "_steamid");
+            for prop_info in prop_infos.iter().filter(|prop_info| prop_info.is_player_prop) {
+                columns.insert(prefix.to_owned() + "_" + &prop_info.prop_friendly_name);
+            }
+        }
+    }
+    // Same names as find_non_player_props
+    for prop_info in prop_infos.iter().filter(|prop_info| !prop_info.is_player_prop) {
+        match prop_info.prop_type {
+            PropType::Team => {
+                columns.insert("t_".to_owned() + &prop_info.prop_friendly_name);
+                columns.insert("ct_".to_owned() + &prop_info.prop_friendly_name);
+            }
+            _ => {
+                columns.insert(prop_info.prop_friendly_name.clone());
+            }
+        }
+    }
+    columns
+}
 #[derive(Debug, Clone)]
 pub struct RoundEnd {
     pub old_value: Option<Variant>,
@@ -101,6 +158,9 @@ impl<'a> SecondPassParser<'a> {
         for i in 0..event.keys.len() {
             let ge = &event.keys[i];
             let desc = &event_desc.keys[i];
+            if !self.wants_event_field(desc.name()) && !PLAYEREVENTFIELDS.contains(&desc.name()) {
+                continue;
+            }
             let val = parse_key(ge);
             event_fields.push(EventField {
                 name: desc.name().to_owned(),
@@ -192,6 +252,16 @@ impl<'a> SecondPassParser<'a> {
         }
         return None;
     }
+    fn wants_event_field(&self, name: &str) -> bool {
+        wants_event_field(&self.wanted_event_columns, name)
+    }
+    // If no column of the player is wanted the player does not need to be looked up at all
+    fn wants_any_player_field(&self, prefix: &str) -> bool {
+        match &self.wanted_event_columns {
+            None => true,
+            Some(columns) => columns.iter().any(|column| column.starts_with(prefix) && column[prefix.len()..].starts_with('_')),
+        }
+    }
     pub fn find_extra(&self, fields: &Vec<EventField>) -> Result<Vec<EventField>, DemoParserError> {
         let mut extra_fields = vec![];
         // Always add tick to event
@@ -228,6 +298,9 @@ impl<'a> SecondPassParser<'a> {
                 }
                 _ => continue,
             };
+            if !self.wants_any_player_field(prefix) {
+                continue;
+            }
             if let Some(Variant::I32(u)) = field.data {
                 let entity_id = match field.name.as_str() {
                     "entityid" => self.grenade_owner_entid_from_grenade(&field.data),
@@ -242,8 +315,12 @@ impl<'a> SecondPassParser<'a> {
                         continue;
                     }
                 };
-                extra_fields.push(self.create_player_name_field(entity_id, prefix));
-                extra_fields.push(self.create_player_steamid_field(entity_id, prefix));
+                if self.wants_event_field(&(prefix.to_owned() + "_name")) {
+                    extra_fields.push(self.create_player_name_field(entity_id, prefix));
+                }
+                if self.wants_event_field(&(prefix.to_owned() + "_steamid")) {
+                    extra_fields.push(self.create_player_steamid_field(entity_id, prefix));
+                }
                 extra_fields.extend(self.find_extra_props_events(entity_id, prefix));
             }
         }
@@ -274,6 +351,10 @@ impl<'a> SecondPassParser<'a> {
             if prop_info.prop_name == "tick" || prop_info.prop_name == "name" || prop_info.prop_name == "steamid" {
                 continue;
             }
+            // Only wanted in the event snapshots
+            if self.snapshot_only_props.contains(&prop_info.prop_name) {
+                continue;
+            }
             if !prop_info.is_player_prop {
                 continue;
             }
@@ -290,12 +371,26 @@ impl<'a> SecondPassParser<'a> {
             name: prefix.to_owned() + "_name",
             data: None,
         });
+        extra_fields.retain(|field| self.wants_event_field(&field.name));
         extra_fields
     }
 
     pub fn find_non_player_props(&self) -> Vec<EventField> {
         let mut extra_fields = vec![];
         for prop_info in &self.prop_controller.prop_infos {
+            if self.snapshot_only_props.contains(&prop_info.prop_name) {
+                continue;
+            }
+            let wanted = match prop_info.prop_type {
+                PropType::Team => {
+                    self.wants_event_field(&("t_".to_owned() + &prop_info.prop_friendly_name)) || self.wants_event_field(&("ct_".to_owned() + &prop_info.prop_friendly_name))
+                }
+                PropType::GameTime => self.wants_event_field("game_time"),
+                _ => self.wants_event_field(&prop_info.prop_friendly_name),
+            };
+            if !wanted {
+                continue;
+            }
             let fields = match prop_info.prop_type {
                 PropType::Team => self.find_other_team_props(&prop_info),
                 PropType::Rules => self.find_other_rules_props(&prop_info),
@@ -365,6 +460,13 @@ impl<'a> SecondPassParser<'a> {
             if prop_info.prop_name == "tick" || prop_info.prop_name == "name" || prop_info.prop_name == "steamid" {
                 continue;
             }
+            // Only wanted in the event snapshots
+            if self.snapshot_only_props.contains(&prop_info.prop_name) {
+                continue;
+            }
+            if !self.wants_event_field(&(prefix.to_owned() + "_" + &prop_info.prop_friendly_name)) {
+                continue;
+            }
             if entity_id == ENTITYIDNONE {
                 extra_pairs.push(EventField {
                     name: prefix.to_owned() + "_" + &prop_info.prop_friendly_name,
@@ -1,10 +1,16 @@
 pub mod collect_data;
+pub mod cursor;
 pub mod decoder;
 pub mod entities;
+pub mod event_windows;
 pub mod game_events;
+pub mod normalize;
 pub mod other_netmessages;
 pub mod parser;
 pub mod parser_settings;
 pub mod path_ops;
+pub mod predicate;
+pub mod tail_scan;
+pub mod tensor;
 pub mod variants;
 pub mod voice_data;
@@ -0,0 +1,221 @@
+use crate::first_pass::prop_controller::PropInfo;
+use crate::first_pass::prop_controller::{NAME_ID, PLAYER_KEY_ID, STEAMID_ID, TICK_ID};
+use crate::second_pass::collect_data::PropType;
+use crate::second_pass::variants::PropColumn;
+use crate::second_pass::variants::VarVec;
+use crate::second_pass::variants::Variant;
+use ahash::AHashMap;
+
+/*
+Splits parse_ticks output into tables without repeated values.
+
+Every player row of parse_ticks carries the steamid and name of the player and the values of all
+wanted rules and team props, which are the same for every player of the tick (or team). Here they
+are split into:
+    players:      player_key, steamid, name. One row per steamid and name, a player who is renamed
+                  during the demo (and every bot, they all have steamid 0) gets a key per name.
+    player_ticks: tick, player_key and the player props. One row per player per tick.
+    rules:        tick and the rules props (and game_time). One row per tick.
+    teams:        tick, team_num and the team props. One row per team per tick.
+The rules and teams rows are already made while collecting (ParserInputs.normalize_ticks), so those
+props are never pushed for every player. team_num has to be one of the wanted props when team props
+are wanted, it is also kept in player_ticks.
+*/
+
+pub const TEAM_NUM_PROP: &str = "CCSPlayerPawn.m_iTeamNum";
+
+#[derive(Debug, Clone)]
+pub struct NormalizedTable {
+    pub prop_infos: Vec<PropInfo>,
+    pub df: AHashMap<u32, PropColumn>,
+}
+
+#[derive(Debug, Clone)]
+pub struct NormalizedOutput {
+    pub players: NormalizedTable,
+    pub player_ticks: NormalizedTable,
+    pub rules: NormalizedTable,
+    pub teams: NormalizedTable,
+}
+
+pub fn is_rules_prop(prop_info: &PropInfo) -> bool {
+    matches!(prop_info.prop_type, PropType::Rules | PropType::GameTime)
+}
+pub fn is_team_prop(prop_info: &PropInfo) -> bool {
+    prop_info.prop_type == PropType::Team
+}
+// Props that go to the rules or teams table instead of player_ticks
+pub fn is_shared_prop(prop_info: &PropInfo) -> bool {
+    is_rules_prop(prop_info) || is_team_prop(prop_info)
+}
+// Pushes one row, values are (prop id, value)
+pub fn push_values(df: &mut AHashMap<u32, PropColumn>, values: Vec<(u32, Option<Variant>)>) {
+    for (id, value) in values {
+        df.entry(id).or_insert_with(PropColumn::new).push(value);
+    }
+}
+
+// df, rules_df and teams_df as in DemoOutput
+pub fn normalize_output(
+    mut df: AHashMap<u32, PropColumn>,
+    mut rules_df: AHashMap<u32, PropColumn>,
+    mut teams_df: AHashMap<u32, PropColumn>,
+    prop_infos: &[PropInfo],
+) -> NormalizedOutput {
+    let info = |id: u32| prop_infos.iter().find(|info| info.id == id).cloned();
+    let key_info = PropInfo {
+        id: PLAYER_KEY_ID,
+        prop_type: PropType::Custom,
+        prop_name: "player_key".to_string(),
+        prop_friendly_name: "player_key".to_string(),
+        is_player_prop: true,
+    };
+    let steamids = match df.get(&STEAMID_ID) {
+        Some(PropColumn {
+            data: Some(VarVec::U64(steamids)),
+            ..
+        }) => steamids.clone(),
+        _ => vec![],
+    };
+    let names = match df.get(&NAME_ID) {
+        Some(PropColumn {
+            data: Some(VarVec::String(names)),
+            ..
+        }) => names.clone(),
+        _ => vec![None; steamids.len()],
+    };
+
+    // Players get a key in order of first appearance
+    let mut key_of_player: AHashMap<(Option<u64>, Option<String>), u32> = AHashMap::default();
+    let mut first_row_of_player = vec![];
+    let mut keys = Vec::with_capacity(steamids.len());
+    for (row, player) in steamids.into_iter().zip(names).enumerate() {
+        let key = *key_of_player.entry(player).or_insert_with(|| {
+            first_row_of_player.push(row);
+            first_row_of_player.len() as u32 - 1
+        });
+        keys.push(Some(key));
+    }
+
+    let mut players = NormalizedTable::new();
+    let n_players = first_row_of_player.len() as u32;
+    players.insert(key_info.clone(), column(VarVec::U32((0..n_players).map(Some).collect())));
+    for id in [STEAMID_ID, NAME_ID] {
+        if let (Some(info), Some(col)) = (info(id), df.remove(&id)) {
+            players.insert_slice(info, &col, &first_row_of_player);
+        }
+    }
+    let mut player_ticks = NormalizedTable::new();
+    player_ticks.insert(key_info, column(VarVec::U32(keys)));
+    player_ticks.take_columns(&mut df, prop_infos, |_| true);
+
+    let team_num_id = prop_infos.iter().find(|info| info.prop_name == TEAM_NUM_PROP).map(|info| info.id);
+    let mut rules = NormalizedTable::new();
+    rules.take_columns(&mut rules_df, prop_infos, |info| info.id == TICK_ID || is_rules_prop(info));
+    let mut teams = NormalizedTable::new();
+    teams.take_columns(&mut teams_df, prop_infos, |info| {
+        info.id == TICK_ID || Some(info.id) == team_num_id || is_team_prop(info)
+    });
+    NormalizedOutput {
+        players,
+        player_ticks,
+        rules,
+        teams,
+    }
+}
+
+impl NormalizedTable {
+    fn new() -> Self {
+        NormalizedTable {
+            prop_infos: vec![],
+            df: AHashMap::default(),
+        }
+    }
+    fn insert(&mut self, info: PropInfo, col: PropColumn) {
+        self.df.insert(info.id, col);
+        self.prop_infos.push(info);
+    }
+    // Moves the columns of the wanted props out of df, in prop_infos order
+    fn take_columns<F: Fn(&PropInfo) -> bool>(&mut self, df: &mut AHashMap<u32, PropColumn>, prop_infos: &[PropInfo], wanted: F) {
+        for prop_info in prop_infos {
+            if !wanted(prop_info) {
+                continue;
+            }
+            if let Some(col) = df.remove(&prop_info.id) {
+                self.insert(prop_info.clone(), col);
+            }
+        }
+    }
+    fn insert_slice(&mut self, info: PropInfo, col: &PropColumn, rows: &[usize]) {
+        if let Some(col) = col.slice_to_new(rows) {
+            self.insert(info, col);
+        }
+    }
+}
+
+fn column(data: VarVec) -> PropColumn {
+    PropColumn { data: Some(data), num_nones: 0 }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::normalize_output;
+    use super::TEAM_NUM_PROP;
+    use crate::first_pass::prop_controller::PropInfo;
+    use crate::first_pass::prop_controller::{NAME_ID, PLAYER_KEY_ID, STEAMID_ID, TICK_ID};
+    use crate::second_pass::collect_data::PropType;
+    use crate::second_pass::variants::{PropColumn, VarVec};
+    use ahash::AHashMap;
+
+    fn info(id: u32, prop_type: PropType, name: &str) -> PropInfo {
+        PropInfo {
+            id,
+            prop_type,
+            prop_name: name.to_string(),
+            prop_friendly_name: name.to_string(),
+            is_player_prop: true,
+        }
+    }
+
+    #[test]
+    fn test_normalize_output() {
+        let column = |data: VarVec| PropColumn { data: Some(data), num_nones: 0 };
+        let string_column = |names: &[&str]| column(VarVec::String(names.iter().map(|name| Some(name.to_string())).collect()));
+        let prop_infos = vec![
+            info(TICK_ID, PropType::Tick, "tick"),
+            info(STEAMID_ID, PropType::Steamid, "steamid"),
+            info(NAME_ID, PropType::Name, "name"),
+            info(1000, PropType::Player, "health"),
+            info(1001, PropType::Rules, "total_rounds_played"),
+            info(1002, PropType::Team, "team_rounds_total"),
+            info(1003, PropType::Player, TEAM_NUM_PROP),
+        ];
+        let mut df = AHashMap::default();
+        // Player 7 and two bots over two ticks, player 7 is renamed at tick 2
+        df.insert(TICK_ID, column(VarVec::I32(vec![Some(1), Some(1), Some(1), Some(2), Some(2), Some(2)])));
+        df.insert(STEAMID_ID, column(VarVec::U64(vec![Some(7), Some(0), Some(0), Some(7), Some(0), Some(0)])));
+        df.insert(NAME_ID, string_column(&["a", "bot1", "bot2", "b", "bot1", "bot2"]));
+        df.insert(1000, column(VarVec::I32(vec![Some(100), Some(90), Some(80), Some(70), Some(60), Some(50)])));
+        df.insert(1003, column(VarVec::U32(vec![Some(2), Some(3), Some(3), Some(2), Some(3), Some(3)])));
+        // Already one row per tick and one per team per tick from collect_entities
+        let mut rules_df = AHashMap::default();
+        rules_df.insert(TICK_ID, column(VarVec::I32(vec![Some(1), Some(2)])));
+        rules_df.insert(1001, column(VarVec::I32(vec![Some(3), Some(4)])));
+        let mut teams_df = AHashMap::default();
+        teams_df.insert(TICK_ID, column(VarVec::I32(vec![Some(1), Some(1), Some(2), Some(2)])));
+        teams_df.insert(1003, column(VarVec::U32(vec![Some(2), Some(3), Some(2), Some(3)])));
+        teams_df.insert(1002, column(VarVec::I32(vec![Some(1), Some(2), Some(1), Some(3)])));
+
+        let out = normalize_output(df, rules_df, teams_df, &prop_infos);
+        assert_eq!(out.players.df[&STEAMID_ID], column(VarVec::U64(vec![Some(7), Some(0), Some(0), Some(7)])));
+        assert_eq!(out.players.df[&NAME_ID], string_column(&["a", "bot1", "bot2", "b"]));
+        assert_eq!(out.player_ticks.df[&PLAYER_KEY_ID], column(VarVec::U32(vec![Some(0), Some(1), Some(2), Some(3), Some(1), Some(2)])));
+        assert_eq!(out.player_ticks.df[&1000].len(), 6);
+        assert!(!out.player_ticks.df.contains_key(&STEAMID_ID));
+        assert_eq!(out.rules.df[&1001], column(VarVec::I32(vec![Some(3), Some(4)])));
+        assert_eq!(out.rules.df.len(), 2);
+        assert_eq!(out.teams.df[&1002], column(VarVec::I32(vec![Some(1), Some(2), Some(1), Some(3)])));
+        assert_eq!(out.teams.df[&TICK_ID], column(VarVec::I32(vec![Some(1), Some(1), Some(2), Some(2)])));
+        assert_eq!(out.teams.prop_infos.iter().map(|info| info.id).collect::<Vec<u32>>(), vec![TICK_ID, 1002, 1003]);
+    }
+}
@@ -18,100 +18,14 @@ pub struct Class {
 
 impl<'a> SecondPassParser<'a> {
     pub fn parse_item_drops(&mut self, bytes: &[u8]) -> Result<(), DemoParserError> {
-        let drops = match CcsUsrMsgSendPlayerItemDrops::decode(bytes) {
-            Ok(msg) => msg,
-            Err(_) => return Err(DemoParserError::MalformedMessage),
-        };
-        for item in &drops.entity_updates {
-            let item_name = match WEAPINDICIES.get(&item.defindex.unwrap_or(u32::MAX)) {
-                Some(name) => Some(name.to_string()),
-                None => None,
-            };
-            let skin_name = match PAINTKITS.get(&item.paintindex.unwrap_or(u32::MAX)) {
-                Some(name) => Some(name.to_string()),
-                None => None,
-            };
-            self.item_drops.push(EconItem {
-                account_id: item.accountid,
-                item_id: item.itemid,
-                def_index: item.defindex,
-                paint_index: item.paintindex,
-                rarity: item.rarity,
-                quality: item.quality,
-                paint_seed: item.paintseed,
-                paint_wear: item.paintwear,
-                quest_id: item.questid,
-                dropreason: item.dropreason,
-                custom_name: item.customname.clone(),
-                inventory: item.inventory,
-                ent_idx: item.entindex,
-                steamid: None,
-                item_name,
-                skin_name,
-            });
-        }
+        self.item_drops.extend(item_drops_from_msg(bytes)?);
         Ok(())
     }
 
     pub fn parse_player_end_msg(&mut self, bytes: &[u8]) -> Result<(), DemoParserError> {
-        let end_data = match CcsUsrMsgEndOfMatchAllPlayersData::decode(bytes) {
-            Ok(msg) => msg,
-            Err(_) => return Err(DemoParserError::MalformedMessage),
-        };
-        /*
-        Todo parse "accolade", seems to be the awards at the end like "most mvps in game"
-        But seems to only have integers so need to figure out what they mean
-        example:
-
-        Accolade {
-            eaccolade: Some(
-                21,
-            ),
-            value: Some(
-                5100.0,
-            ),
-            position: Some(
-                1,
-            ),
-        }
-        */
-        for player in &end_data.allplayerdata {
-            self.player_end_data.push(PlayerEndMetaData {
-                name: player.name.clone(),
-                steamid: player.xuid,
-                team_number: player.teamnumber,
-            });
-            for item in &player.items {
-                if item.itemid() != 0 {
-                    let item_name = match WEAPINDICIES.get(&item.defindex.unwrap_or(u32::MAX)) {
-                        Some(name) => Some(name.to_string()),
-                        None => None,
-                    };
-                    let skin_name = match PAINTKITS.get(&item.paintindex.unwrap_or(u32::MAX)) {
-                        Some(name) => Some(name.to_string()),
-                        None => None,
-                    };
-                    self.skins.push(EconItem {
-                        account_id: item.accountid,
-                        item_id: item.itemid,
-                        def_index: item.defindex,
-                        paint_index: item.paintindex,
-                        rarity: item.rarity,
-                        quality: item.quality,
-                        paint_seed: item.paintseed,
-                        paint_wear: item.paintwear,
-                        quest_id: item.questid,
-                        dropreason: item.dropreason,
-                        custom_name: item.customname.clone(),
-                        inventory: item.inventory,
-                        ent_idx: item.entindex,
-                        steamid: player.xuid,
-                        item_name,
-                        skin_name,
-                    });
-                }
-            }
-        }
+        let (player_end_data, skins) = player_end_data_from_msg(bytes)?;
+        self.player_end_data.extend(player_end_data);
+        self.skins.extend(skins);
         Ok(())
     }
     pub fn parse_player_stats_update(&mut self, _bytes: &[u8]) -> Result<(), DemoParserError> {
@@ -123,3 +37,106 @@ impl<'a> SecondPassParser<'a> {
         Ok(())
     }
 }
+
+// Free functions so the end of match messages can also be read without a SecondPassParser (see tail_scan)
+pub fn item_drops_from_msg(bytes: &[u8]) -> Result<Vec<EconItem>, DemoParserError> {
+    let drops = match CcsUsrMsgSendPlayerItemDrops::decode(bytes) {
+        Ok(msg) => msg,
+        Err(_) => return Err(DemoParserError::MalformedMessage),
+    };
+    let mut item_drops = vec![];
+    for item in &drops.entity_updates {
+        let item_name = match WEAPINDICIES.get(&item.defindex.unwrap_or(u32::MAX)) {
+            Some(name) => Some(name.to_string()),
+            None => None,
+        };
+        let skin_name = match PAINTKITS.get(&item.paintindex.unwrap_or(u32::MAX)) {
+            Some(name) => Some(name.to_string()),
+            None => None,
+        };
+        item_drops.push(EconItem {
+            account_id: item.accountid,
+            item_id: item.itemid,
+            def_index: item.defindex,
+            paint_index: item.paintindex,
+            rarity: item.rarity,
+            quality: item.quality,
+            paint_seed: item.paintseed,
+            paint_wear: item.paintwear,
+            quest_id: item.questid,
+            dropreason: item.dropreason,
+            custom_name: item.customname.clone(),
+            inventory: item.inventory,
+            ent_idx: item.entindex,
+            steamid: None,
+            item_name,
+            skin_name,
+        });
+    }
+    Ok(item_drops)
+}
+
+// Returns the players and the skins they had equipped
+pub fn player_end_data_from_msg(bytes: &[u8]) -> Result<(Vec<PlayerEndMetaData>, Vec<EconItem>), DemoParserError> {
+    let end_data = match CcsUsrMsgEndOfMatchAllPlayersData::decode(bytes) {
+        Ok(msg) => msg,
+        Err(_) => return Err(DemoParserError::MalformedMessage),
+    };
+    /*
+    Todo parse "accolade", seems to be the awards at the end like "most mvps in game"
+    But seems to only have integers so need to figure out what they mean
+    example:
+
+    Accolade {
+        eaccolade: Some(
+            21,
+        ),
+        value: Some(
+            5100.0,
+        ),
+        position: Some(
+            1,
+        ),
+    }
+    */
+    let mut player_end_data = vec![];
+    let mut skins = vec![];
+    for player in &end_data.allplayerdata {
+        player_end_data.push(PlayerEndMetaData {
+            name: player.name.clone(),
+            steamid: player.xuid,
+            team_number: player.teamnumber,
+        });
+        for item in &player.items {
+            if item.itemid() != 0 {
+                let item_name = match WEAPINDICIES.get(&item.defindex.unwrap_or(u32::MAX)) {
+                    Some(name) => Some(name.to_string()),
+                    None => None,
+                };
+                let skin_name = match PAINTKITS.get(&item.paintindex.unwrap_or(u32::MAX)) {
+                    Some(name) => Some(name.to_string()),
+                    None => None,
+                };
+                skins.push(EconItem {
+                    account_id: item.accountid,
+                    item_id: item.itemid,
+                    def_index: item.defindex,
+                    paint_index: item.paintindex,
+                    rarity: item.rarity,
+                    quality: item.quality,
+                    paint_seed: item.paintseed,
+                    paint_wear: item.paintwear,
+                    quest_id: item.questid,
+                    dropreason: item.dropreason,
+                    custom_name: item.customname.clone(),
+                    inventory: item.inventory,
+                    ent_idx: item.entindex,
+                    steamid: player.xuid,
+                    item_name,
+                    skin_name,
+                });
+            }
+        }
+    }
+    Ok((player_end_data, skins))
+}
@@ -7,19 +7,21 @@ use crate::first_pass::read_bits::read_varint;
 use crate::first_pass::read_bits::Bitreader;
 use crate::first_pass::read_bits::DemoParserError;
 use crate::first_pass::stringtables::parse_userinfo;
+use crate::first_pass::wire::demo_packet_data;
+use crate::first_pass::wire::full_packet_view;
 use crate::maps::demo_cmd_type_from_int;
 use crate::second_pass::collect_data::ProjectileRecord;
 use crate::second_pass::entities::Entity;
 use crate::second_pass::game_events::GameEvent;
 use crate::second_pass::parser_settings::SecondPassParser;
 use crate::second_pass::parser_settings::*;
+use crate::second_pass::tensor::TensorRows;
 use crate::second_pass::variants::PropColumn;
 use crate::second_pass::variants::Variant;
 use ahash::AHashMap;
 use ahash::AHashSet;
 use csgoproto::message_type::NetMessageType::{self, *};
-use csgoproto::CDemoFullPacket;
-use csgoproto::CDemoPacket;
+use csgoproto::CDemoStringTables;
 use csgoproto::CnetMsgTick;
 use csgoproto::CsgoUserCmdPb;
 use csgoproto::CsvcMsgServerInfo;
@@ -29,6 +31,7 @@ use csgoproto::EDemoCommands::*;
 use prost::Message;
 use snap::raw::decompress_len;
 use snap::raw::Decoder as SnapDecoder;
+use std::sync::Arc;
 
 use super::variants::InputHistory;
 
@@ -52,8 +55,14 @@ pub struct SecondPassOutput {
     pub ptr: usize,
     pub voice_data: Vec<CsvcMsgVoiceData>,
     pub df_per_player: AHashMap<u64, AHashMap<u32, PropColumn>>,
+    // Indexed by the events of this output with EVENT_INDEX_ID
+    pub event_snapshots: AHashMap<u32, PropColumn>,
+    // Only filled for normalized tick queries
+    pub rules_df: AHashMap<u32, PropColumn>,
+    pub teams_df: AHashMap<u32, PropColumn>,
     pub entities: Vec<Option<Entity>>,
     pub last_tick: i32,
+    pub tensor_rows: TensorRows,
 }
 impl<'a> SecondPassParser<'a> {
     pub fn start(&mut self, demo_bytes: &'a [u8]) -> Result<(), DemoParserError> {
@@ -62,8 +71,27 @@ impl<'a> SecondPassParser<'a> {
         let mut buf = vec![0_u8; INNER_BUF_DEFAULT_LEN];
         let mut buf2 = vec![0_u8; OUTER_BUF_DEFAULT_LEN];
         loop {
-            if demo_bytes.len() < self.ptr { break; }
-            let frame = self.read_frame(demo_bytes)?;
+            if demo_bytes.len() < self.ptr {
+                self.demo_ended = true;
+                break;
+            }
+            let frame = match self.read_frame(demo_bytes) {
+                Ok(frame) => frame,
+                // Demos that were cut off have no DemStop and can end in the middle of a frame header
+                Err(DemoParserError::OutOfBytesError) => {
+                    self.demo_ended = true;
+                    break;
+                }
+                Err(e) => return Err(e),
+            };
+            if let Some(stop_tick) = self.stop_after_tick {
+                if frame.tick > stop_tick {
+                    // Leave the frame unread so start() can be called again to continue from here
+                    self.ptr = frame.frame_starts_at;
+                    self.tick = stop_tick;
+                    break;
+                }
+            }
             if frame.demo_cmd == DemAnimationData || frame.demo_cmd == DemSendTables || frame.demo_cmd == DemStringTables {
                 self.ptr += frame.size as usize;
                 continue;
@@ -81,7 +109,10 @@ impl<'a> SecondPassParser<'a> {
             let ok = match frame.demo_cmd {
                 DemSignonPacket => self.parse_packet(&bytes, &mut buf2),
                 DemPacket => self.parse_packet(&bytes, &mut buf2),
-                DemStop => break,
+                DemStop => {
+                    self.demo_ended = true;
+                    break;
+                }
                 DemUserCmd => Ok(()),
                 DemFullPacket => {
                     if self.parse_full_packet_and_break_if_needed(&bytes, &mut buf2, started_at)? {
@@ -92,6 +123,11 @@ impl<'a> SecondPassParser<'a> {
                 _ => Ok(()),
             };
             ok?;
+            if self.event_window.is_some() {
+                self.open_event_windows();
+            } else if !self.event_snapshot_infos.is_empty() {
+                self.collect_event_snapshots();
+            }
         }
         Ok(())
     }
@@ -100,7 +136,11 @@ impl<'a> SecondPassParser<'a> {
             if self.ptr > start_end_offset.end {
                 return Ok(true);
             } else {
-                self.parse_full_packet(&bytes, true, buf)?;
+                // A chunk can span multiple fullpackets. Only the one we started from creates the entities,
+                // the rest are handled like in single threaded mode.
+                let should_parse_entities = self.fullpackets_parsed == 0 && started_at != HEADER_ENDS_AT_BYTE;
+                self.parse_full_packet(&bytes, should_parse_entities, buf)?;
+                self.fullpackets_parsed += 1;
                 return Ok(false);
             }
         }
@@ -169,11 +209,7 @@ impl<'a> SecondPassParser<'a> {
     }
 
     pub fn parse_packet(&mut self, bytes: &[u8], buf: &mut Vec<u8>) -> Result<(), DemoParserError> {
-        let msg = match CDemoPacket::decode(bytes) {
-            Err(_) => return Err(DemoParserError::MalformedMessage),
-            Ok(msg) => msg,
-        };
-        let mut bitreader = Bitreader::new(msg.data());
+        let mut bitreader = Bitreader::new(demo_packet_data(bytes)?);
         self.parse_packet_from_bitreader(&mut bitreader, buf, true, false)?;
         Ok(())
     }
@@ -200,7 +236,7 @@ impl<'a> SecondPassParser<'a> {
                     if should_parse_entities {
                         self.parse_packet_ents(&msg_bytes, is_fullpacket)?;
                         if !is_fullpacket {
-                            self.collect_entities();
+                            self.collect_entities()?;
                         }
                     }
                     Ok(())
@@ -314,43 +350,49 @@ impl<'a> SecondPassParser<'a> {
     }
 
     pub fn parse_full_packet(&mut self, bytes: &[u8], should_parse_entities: bool, buf: &mut Vec<u8>) -> Result<(), DemoParserError> {
-        self.string_tables = vec![];
-        let full_packet = match CDemoFullPacket::decode(bytes) {
-            Err(_e) => return Err(DemoParserError::MalformedMessage),
-            Ok(p) => p,
-        };
-        self.parse_full_packet_stringtables(&full_packet);
+        self.string_tables = Arc::default();
+        let full_packet = full_packet_view(bytes)?;
+        if let Some(string_table_bytes) = full_packet.string_table {
+            match CDemoStringTables::decode(string_table_bytes) {
+                Err(_e) => return Err(DemoParserError::MalformedMessage),
+                Ok(string_table) => self.parse_full_packet_stringtables(&string_table),
+            };
+        }
         if let Some(packet) = full_packet.packet {
-            let mut bitreader = Bitreader::new(packet.data());
+            let mut bitreader = Bitreader::new(demo_packet_data(packet)?);
             self.parse_packet_from_bitreader(&mut bitreader, buf, should_parse_entities, true)
         } else {
             Ok(())
         }
     }
 
-    pub fn parse_full_packet_stringtables(&mut self, full_packet: &CDemoFullPacket) {
-        if let Some(string_table) = &full_packet.string_table {
-            for item in &string_table.tables {
-                if item.table_name == Some("instancebaseline".to_string()) {
-                    for i in &item.items {
-                        let k = i.str().parse::<u32>().unwrap_or(u32::MAX);
-                        self.baselines.insert(k, i.data().to_vec());
-                    }
+    pub fn parse_full_packet_stringtables(&mut self, string_table: &CDemoStringTables) {
+        for item in &string_table.tables {
+            if item.table_name == Some("instancebaseline".to_string()) {
+                for i in &item.items {
+                    let k = i.str().parse::<u32>().unwrap_or(u32::MAX);
+                    self.insert_baseline(k, i.data());
                 }
-                if item.table_name == Some("userinfo".to_string()) {
-                    for i in &item.items {
-                        if let Ok(player) = parse_userinfo(&i.data()) {
-                            if player.steamid != 0 {
-                                self.stringtable_players.insert(player.userid, player);
-                            }
+            }
+            if item.table_name == Some("userinfo".to_string()) {
+                for i in &item.items {
+                    if let Ok(player) = parse_userinfo(&i.data()) {
+                        if player.steamid != 0 {
+                            Arc::make_mut(&mut self.stringtable_players).insert(player.userid, player);
                         }
                     }
                 }
             }
         }
     }
+    pub fn insert_baseline(&mut self, cls_id: u32, bytes: &[u8]) {
+        // Baselines are shared with other chunks so only copy them if this chunk actually sees a different one
+        if self.baselines.get(&cls_id).map(|b| b.as_slice()) != Some(bytes) {
+            Arc::make_mut(&mut self.baselines).insert(cls_id, bytes.to_vec());
+        }
+    }
     fn clear_stringtables(&mut self) -> Result<(), DemoParserError> {
-        self.string_tables = vec![];
+        self.string_tables = Arc::default();
         Ok(())
     }
     pub fn parse_server_info(&mut self, bytes: &[u8]) -> Result<(), DemoParserError> {
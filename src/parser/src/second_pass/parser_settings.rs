@@ -1,19 +1,26 @@
 use crate::first_pass::frameparser::StartEndOffset;
 use crate::first_pass::parser::FirstPassOutput;
 use crate::first_pass::prop_controller::PropController;
+use crate::first_pass::prop_controller::PropInfo;
 use crate::first_pass::read_bits::DemoParserError;
 use crate::first_pass::sendtables::Serializer;
 use crate::first_pass::stringtables::StringTable;
 use crate::first_pass::stringtables::UserInfo;
 use crate::second_pass::collect_data::ProjectileRecord;
+use crate::second_pass::collect_data::PropType;
 use crate::second_pass::decoder::QfMapper;
 use crate::second_pass::entities::Entity;
 use crate::second_pass::entities::PlayerMetaData;
+use crate::second_pass::event_windows::{EventWindowSettings, EventWindowState};
 use crate::second_pass::game_events::GameEvent;
 use crate::second_pass::other_netmessages::Class;
+use crate::second_pass::tensor::{TensorRows, TensorSettings};
 use crate::second_pass::parser::SecondPassOutput;
 use crate::second_pass::path_ops::FieldPath;
+use crate::second_pass::predicate::PredicateFilter;
+use crate::parse_demo::TickOutputMode;
 use crate::second_pass::variants::PropColumn;
+use crate::second_pass::variants::Variant;
 use ahash::AHashMap;
 use ahash::AHashSet;
 use ahash::HashMap;
@@ -23,6 +30,7 @@ use csgoproto::CsvcMsgVoiceData;
 use std::collections::BTreeMap;
 use std::collections::BTreeSet;
 use std::env;
+use std::sync::Arc;
 const HUF_LOOKUPTABLE_MAXVALUE: u32 = (1 << 17) - 1;
 const DEFAULT_MAX_ENTITY_ID: usize = 1024;
 
@@ -31,7 +39,8 @@ pub struct SecondPassParser<'a> {
     pub qf_mapper: &'a QfMapper,
     pub prop_controller: &'a PropController,
     pub cls_by_id: &'a Vec<Class>,
-    pub stringtable_players: BTreeMap<i32, UserInfo>,
+    pub classes_to_decode: Option<Arc<Vec<bool>>>,
+    pub stringtable_players: Arc<BTreeMap<i32, UserInfo>>,
     pub net_tick: u32,
     pub parse_inventory: bool,
     pub paths: Vec<FieldPath>,
@@ -46,16 +55,16 @@ pub struct SecondPassParser<'a> {
     pub teams: Teams,
     pub huffman_lookup_table: &'a [(u8, u8)],
     pub game_events: Vec<GameEvent>,
-    pub string_tables: Vec<StringTable>,
+    pub string_tables: Arc<Vec<StringTable>>,
     pub rules_entity_id: Option<i32>,
     pub c4_entity_id: Option<i32>,
     pub game_events_counter: AHashSet<String>,
     pub uniq_prop_names: AHashSet<String>,
-    pub baselines: AHashMap<u32, Vec<u8>, RandomState>,
+    pub baselines: Arc<AHashMap<u32, Vec<u8>>>,
     pub projectiles: BTreeSet<i32>,
     pub fullpackets_parsed: u32,
-    pub wanted_players: AHashSet<u64>,
-    pub wanted_ticks: AHashSet<i32>,
+    pub wanted_players: Arc<AHashSet<u64>>,
+    pub wanted_ticks: Arc<AHashSet<i32>>,
     // Output from parsing
     pub projectile_records: Vec<ProjectileRecord>,
     pub voice_data: Vec<CsvcMsgVoiceData>,
@@ -77,6 +86,37 @@ pub struct SecondPassParser<'a> {
     pub last_tick: i32,
     pub parse_usercmd: bool,
     pub list_props: bool,
+    // Stop before the first frame after this tick
+    pub stop_after_tick: Option<i32>,
+    pub demo_ended: bool,
+    // Props collected for every player when an event fires, empty if not wanted
+    pub event_snapshot_infos: Vec<PropInfo>,
+    // Snapshot props that are not wanted in the events themselves
+    pub snapshot_only_props: Vec<String>,
+    pub event_snapshots: AHashMap<u32, PropColumn>,
+    pub snapshotted_events: usize,
+    pub predicate: Option<PredicateFilter>,
+    // Infos of the props used in the predicate
+    pub predicate_infos: Vec<PropInfo>,
+    pub every_n_ticks: Option<i32>,
+    pub wanted_event_columns: Option<Vec<String>>,
+    pub tick_output_mode: TickOutputMode,
+    // Output row and values of the last row kept for each player, see collect_entities
+    pub last_kept_rows: AHashMap<(u64, Option<String>), (usize, Vec<Option<Variant>>)>,
+    pub rows_collected: usize,
+    pub normalize_ticks: bool,
+    // Rows of the rules and team props when normalize_ticks is set
+    pub rules_output: AHashMap<u32, PropColumn>,
+    pub teams_output: AHashMap<u32, PropColumn>,
+    pub rules_collected_tick: Option<i32>,
+    // Teams that already have a row in teams_output this tick
+    pub teams_collected: (i32, Vec<u32>),
+    // Rows of the windows go to event_snapshots, see event_windows.rs
+    pub event_window: Option<EventWindowSettings>,
+    pub event_window_state: EventWindowState,
+    // Rows of tensor queries go here instead of to output, see tensor.rs
+    pub tensor: Option<TensorSettings>,
+    pub tensor_rows: TensorRows,
 }
 #[derive(Debug, Clone)]
 pub struct Teams {
@@ -146,8 +186,12 @@ impl<'a> SecondPassParser<'a> {
             projectiles: self.projectile_records,
             ptr: self.ptr,
             df_per_player: self.df_per_player,
+            event_snapshots: self.event_snapshots,
+            rules_df: self.rules_output,
+            teams_df: self.teams_output,
             entities: self.entities,
             last_tick: self.tick,
+            tensor_rows: self.tensor_rows,
         }
     }
     pub fn new(
@@ -163,6 +207,31 @@ impl<'a> SecondPassParser<'a> {
             .extend(vec!["tick".to_owned(), "steamid".to_owned(), "name".to_owned()]);
         let args: Vec<String> = env::args().collect();
         let debug = if args.len() > 2 { args[2] == "true" } else { false };
+        let settings = first_pass_output.settings;
+        let event_snapshot_infos = match settings.event_snapshot_props.is_empty() {
+            true => vec![],
+            false => first_pass_output
+                .prop_controller
+                .prop_infos
+                .iter()
+                .filter(|info| matches!(info.prop_type, PropType::Tick | PropType::Steamid | PropType::Name) || settings.event_snapshot_props.contains(&info.prop_name))
+                .cloned()
+                .collect(),
+        };
+        let predicate_infos: Vec<PropInfo> = match &settings.predicate {
+            Some(filter) => {
+                let props = filter.predicate.props();
+                first_pass_output.prop_controller.prop_infos.iter().filter(|info| props.contains(&info.prop_name)).cloned().collect()
+            }
+            None => vec![],
+        };
+        // A prop that doesn't exist would make the predicate match nothing and quietly return an empty output
+        if let Some(filter) = &settings.predicate {
+            if let Some(unknown) = filter.predicate.props().into_iter().find(|prop| !predicate_infos.iter().any(|info| &info.prop_name == prop)) {
+                return Err(DemoParserError::UnknownPropName(unknown));
+            }
+        }
+        let snapshot_only_props = settings.event_snapshot_props.iter().filter(|prop| !settings.wanted_player_props.contains(prop)).cloned().collect();
 
         Ok(SecondPassParser {
             uniq_prop_names: AHashSet::default(),
@@ -186,8 +255,8 @@ impl<'a> SecondPassParser<'a> {
             is_debug_mode: debug,
             projectile_records: vec![],
             parse_all_packets: parse_all_packets,
-            wanted_players: first_pass_output.wanted_players.clone(),
-            wanted_ticks: first_pass_output.wanted_ticks.clone(),
+            wanted_players: first_pass_output.wanted_players,
+            wanted_ticks: first_pass_output.wanted_ticks,
             prop_controller: &first_pass_output.prop_controller,
             qf_mapper: &first_pass_output.qfmap,
             fullpackets_parsed: 0,
@@ -195,6 +264,7 @@ impl<'a> SecondPassParser<'a> {
             ptr: offset,
             ge_list: first_pass_output.ge_list,
             cls_by_id: &first_pass_output.cls_by_id,
+            classes_to_decode: first_pass_output.classes_to_decode,
             entities: vec![None; DEFAULT_MAX_ENTITY_ID],
             cls_bits: None,
             tick: -99999,
@@ -204,8 +274,8 @@ impl<'a> SecondPassParser<'a> {
             wanted_events: first_pass_output.settings.wanted_events.clone(),
             parse_entities: first_pass_output.settings.parse_ents,
             projectiles: BTreeSet::default(),
-            baselines: first_pass_output.baselines.clone(),
-            string_tables: first_pass_output.string_tables.clone(),
+            baselines: first_pass_output.baselines,
+            string_tables: first_pass_output.string_tables,
             teams: Teams::new(),
             game_events_counter: AHashSet::default(),
             parse_projectiles: first_pass_output.settings.parse_projectiles,
@@ -219,6 +289,28 @@ impl<'a> SecondPassParser<'a> {
             huffman_lookup_table: &first_pass_output.settings.huffman_lookup_table,
             header: HashMap::default(),
             list_props: first_pass_output.list_props,
+            stop_after_tick: None,
+            demo_ended: false,
+            event_snapshot_infos,
+            snapshot_only_props,
+            event_snapshots: AHashMap::default(),
+            snapshotted_events: 0,
+            predicate: settings.predicate.clone(),
+            predicate_infos,
+            every_n_ticks: settings.every_n_ticks,
+            wanted_event_columns: settings.wanted_event_columns.clone(),
+            tick_output_mode: settings.tick_output_mode,
+            last_kept_rows: AHashMap::default(),
+            rows_collected: 0,
+            normalize_ticks: settings.normalize_ticks,
+            rules_output: AHashMap::default(),
+            teams_output: AHashMap::default(),
+            rules_collected_tick: None,
+            teams_collected: (-99999, vec![]),
+            event_window: settings.event_window.clone(),
+            event_window_state: EventWindowState::default(),
+            tensor: settings.tensor.clone(),
+            tensor_rows: TensorRows::default(),
         })
     }
 }
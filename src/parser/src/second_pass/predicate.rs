@@ -0,0 +1,170 @@
+use crate::second_pass::variants::Variant;
+use std::cmp::Ordering;
+
+/*
+Filters for parse_ticks rows, evaluated in collect_entities before any values are pushed.
+
+Unlike wanted_prop_states (equality only, the whole tick is dropped when any player differs)
+a predicate can compare, check ranges and sets, and combine props with AND/OR. With
+PredicateScope::Player only the rows of matching players are kept. With PredicateScope::Tick
+all players of a tick are kept if any player matches, like "ticks where any CT has health < 20".
+
+Numbers are compared as numbers whatever their type, so health (i32) < 20u32 works. Strings
+only compare with strings. A missing value never matches.
+*/
+
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub enum CompareOp {
+    Eq,
+    Ne,
+    Lt,
+    Le,
+    Gt,
+    Ge,
+}
+
+#[derive(Debug, Clone, PartialEq)]
+pub enum Predicate {
+    Compare { prop: String, op: CompareOp, value: Variant },
+    // Inclusive on both ends
+    Between { prop: String, low: Variant, high: Variant },
+    In { prop: String, values: Vec<Variant> },
+    And(Vec<Predicate>),
+    Or(Vec<Predicate>),
+}
+
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub enum PredicateScope {
+    Player,
+    Tick,
+}
+
+#[derive(Debug, Clone, PartialEq)]
+pub struct PredicateFilter {
+    pub predicate: Predicate,
+    pub scope: PredicateScope,
+}
+
+impl Predicate {
+    // Every prop the predicate needs, without duplicates
+    pub fn props(&self) -> Vec<String> {
+        let mut props = vec![];
+        self.collect_props(&mut props);
+        props
+    }
+    fn collect_props(&self, props: &mut Vec<String>) {
+        match self {
+            Predicate::Compare { prop, .. } | Predicate::Between { prop, .. } | Predicate::In { prop, .. } => {
+                if !props.contains(prop) {
+                    props.push(prop.clone());
+                }
+            }
+            Predicate::And(inner) | Predicate::Or(inner) => inner.iter().for_each(|p| p.collect_props(props)),
+        }
+    }
+    // Renames every prop, used for going from friendly names to real names
+    pub fn map_props<F, E>(self, f: &F) -> Result<Predicate, E>
+    where
+        F: Fn(String) -> Result<String, E>,
+    {
+        Ok(match self {
+            Predicate::Compare { prop, op, value } => Predicate::Compare { prop: f(prop)?, op, value },
+            Predicate::Between { prop, low, high } => Predicate::Between { prop: f(prop)?, low, high },
+            Predicate::In { prop, values } => Predicate::In { prop: f(prop)?, values },
+            Predicate::And(inner) => Predicate::And(inner.into_iter().map(|p| p.map_props(f)).collect::<Result<_, _>>()?),
+            Predicate::Or(inner) => Predicate::Or(inner.into_iter().map(|p| p.map_props(f)).collect::<Result<_, _>>()?),
+        })
+    }
+    pub fn matches<F>(&self, value_of: &F) -> bool
+    where
+        F: Fn(&str) -> Option<Variant>,
+    {
+        match self {
+            Predicate::Compare { prop, op, value } => match value_of(prop).and_then(|v| compare(&v, value)) {
+                Some(ordering) => match op {
+                    CompareOp::Eq => ordering == Ordering::Equal,
+                    CompareOp::Ne => ordering != Ordering::Equal,
+                    CompareOp::Lt => ordering == Ordering::Less,
+                    CompareOp::Le => ordering != Ordering::Greater,
+                    CompareOp::Gt => ordering == Ordering::Greater,
+                    CompareOp::Ge => ordering != Ordering::Less,
+                },
+                None => false,
+            },
+            Predicate::Between { prop, low, high } => match value_of(prop) {
+                Some(v) => compare(&v, low).is_some_and(|o| o != Ordering::Less) && compare(&v, high).is_some_and(|o| o != Ordering::Greater),
+                None => false,
+            },
+            Predicate::In { prop, values } => match value_of(prop) {
+                Some(v) => values.iter().any(|value| compare(&v, value) == Some(Ordering::Equal)),
+                None => false,
+            },
+            Predicate::And(inner) => inner.iter().all(|p| p.matches(value_of)),
+            Predicate::Or(inner) => inner.iter().any(|p| p.matches(value_of)),
+        }
+    }
+}
+
+fn as_f64(v: &Variant) -> Option<f64> {
+    match v {
+        Variant::Bool(b) => Some(*b as u8 as f64),
+        Variant::I32(n) => Some(*n as f64),
+        Variant::U32(n) => Some(*n as f64),
+        Variant::U64(n) => Some(*n as f64),
+        Variant::F32(n) => Some(*n as f64),
+        _ => None,
+    }
+}
+
+// None when the values can't be compared (different kinds or NaN)
+fn compare(a: &Variant, b: &Variant) -> Option<Ordering> {
+    match (as_f64(a), as_f64(b)) {
+        (Some(a), Some(b)) => a.partial_cmp(&b),
+        _ => match (a, b) {
+            (Variant::String(a), Variant::String(b)) => Some(a.cmp(b)),
+            _ if a == b => Some(Ordering::Equal),
+            _ => None,
+        },
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::{CompareOp, Predicate};
+    use crate::second_pass::variants::Variant;
+
+    #[test]
+    fn test_predicate_matches() {
+        let row = |prop: &str| match prop {
+            "health" => Some(Variant::I32(15)),
+            "team_num" => Some(Variant::U32(3)),
+            "name" => Some(Variant::String("s1mple".to_string())),
+            _ => None,
+        };
+        let compare = |prop: &str, op, value| Predicate::Compare {
+            prop: prop.to_string(),
+            op,
+            value,
+        };
+        // Numbers of different types compare as numbers
+        assert!(compare("health", CompareOp::Lt, Variant::U32(20)).matches(&row));
+        assert!(!compare("health", CompareOp::Ge, Variant::F32(20.0)).matches(&row));
+        assert!(compare("name", CompareOp::Ne, Variant::String("device".to_string())).matches(&row));
+        // Missing values never match, not even !=
+        assert!(!compare("armor", CompareOp::Ne, Variant::I32(1)).matches(&row));
+        let ct_low_health = Predicate::And(vec![
+            Predicate::In {
+                prop: "team_num".to_string(),
+                values: vec![Variant::I32(3)],
+            },
+            Predicate::Between {
+                prop: "health".to_string(),
+                low: Variant::I32(1),
+                high: Variant::I32(15),
+            },
+        ]);
+        assert!(ct_low_health.matches(&row));
+        assert!(!Predicate::Or(vec![compare("health", CompareOp::Eq, Variant::I32(100)), compare("team_num", CompareOp::Eq, Variant::I32(2))]).matches(&row));
+        assert_eq!(ct_low_health.props(), vec!["team_num".to_string(), "health".to_string()]);
+    }
+}
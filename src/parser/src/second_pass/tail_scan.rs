@@ -0,0 +1,144 @@
+use crate::first_pass::parser::HEADER_ENDS_AT_BYTE;
+use crate::first_pass::read_bits::read_varint;
+use crate::first_pass::read_bits::Bitreader;
+use crate::first_pass::read_bits::DemoParserError;
+use crate::first_pass::wire::demo_packet_data;
+use crate::first_pass::wire::full_packet_view;
+use crate::maps::demo_cmd_type_from_int;
+use crate::second_pass::other_netmessages::item_drops_from_msg;
+use crate::second_pass::other_netmessages::player_end_data_from_msg;
+use crate::second_pass::parser_settings::EconItem;
+use crate::second_pass::parser_settings::PlayerEndMetaData;
+use csgoproto::message_type::NetMessageType::{self, *};
+use csgoproto::EDemoCommands;
+use snap::raw::Decoder as SnapDecoder;
+
+/*
+Finds the end of match messages (CS_UM_EndOfMatchAllPlayersData and CS_UM_SendPlayerItemDrops)
+without parsing the demo.
+
+Frames can't be read backwards, but walking the frame headers from the start is cheap since
+nothing is decompressed. That gives an index of all packets, which are then decompressed
+from the last one backwards. Only the two wanted netmessages are decoded, entities are skipped.
+The scan stops END_OF_MATCH_WINDOW_TICKS before the tick of CS_UM_EndOfMatchAllPlayersData,
+item drops are sent around the same time. Returns None if the message is not in the last
+TAIL_SCAN_MAX_BYTES of packets, then the caller should fall back to a full parse.
+*/
+
+const END_OF_MATCH_WINDOW_TICKS: i32 = 64 * 60;
+const TAIL_SCAN_MAX_BYTES: usize = 32 * 1024 * 1024;
+
+#[derive(Debug, Clone, Default)]
+pub struct EndOfMatchData {
+    pub player_md: Vec<PlayerEndMetaData>,
+    pub skins: Vec<EconItem>,
+    pub item_drops: Vec<EconItem>,
+}
+
+struct PacketFrame {
+    tick: i32,
+    starts_at: usize,
+    size: usize,
+    is_compressed: bool,
+    is_fullpacket: bool,
+}
+
+pub fn scan_end_of_match(demo_bytes: &[u8]) -> Result<Option<EndOfMatchData>, DemoParserError> {
+    let packets = packet_index(demo_bytes)?;
+    let mut decompressed = vec![];
+    let mut msg_buf = vec![];
+    let mut scanned_bytes = 0;
+    let mut end_of_match_tick = None;
+    // Collected backwards, one entry per packet
+    let mut found: Vec<(Vec<PlayerEndMetaData>, Vec<EconItem>, Vec<EconItem>)> = vec![];
+
+    for frame in packets.iter().rev() {
+        match end_of_match_tick {
+            Some(tick) if frame.tick < tick - END_OF_MATCH_WINDOW_TICKS => break,
+            None if scanned_bytes > TAIL_SCAN_MAX_BYTES => return Ok(None),
+            _ => {}
+        }
+        scanned_bytes += frame.size;
+        let bytes = &demo_bytes[frame.starts_at..frame.starts_at + frame.size];
+        let bytes = match frame.is_compressed {
+            true => match SnapDecoder::new().decompress_vec(bytes) {
+                Ok(b) => {
+                    decompressed = b;
+                    &decompressed
+                }
+                Err(e) => return Err(DemoParserError::DecompressionFailure(format!("{}", e))),
+            },
+            false => bytes,
+        };
+        let mut player_md = vec![];
+        let mut skins = vec![];
+        let mut item_drops = vec![];
+        let packet = match frame.is_fullpacket {
+            true => match full_packet_view(bytes)?.packet {
+                Some(packet) => packet,
+                None => continue,
+            },
+            false => bytes,
+        };
+        let mut bitreader = Bitreader::new(demo_packet_data(packet)?);
+        while bitreader.bits_remaining().unwrap_or(0) > 8 {
+            let msg_type = bitreader.read_u_bit_var()?;
+            let size = bitreader.read_varint()? as usize;
+            if msg_buf.len() < size {
+                msg_buf.resize(size, 0)
+            }
+            bitreader.read_n_bytes_mut(size, &mut msg_buf)?;
+            let msg_bytes = &msg_buf[..size];
+            match NetMessageType::from(msg_type as i32) {
+                CS_UM_EndOfMatchAllPlayersData => {
+                    let (md, s) = player_end_data_from_msg(msg_bytes)?;
+                    player_md.extend(md);
+                    skins.extend(s);
+                    end_of_match_tick.get_or_insert(frame.tick);
+                }
+                CS_UM_SendPlayerItemDrops => item_drops.extend(item_drops_from_msg(msg_bytes)?),
+                _ => {}
+            }
+        }
+        found.push((player_md, skins, item_drops));
+    }
+    if end_of_match_tick.is_none() {
+        return Ok(None);
+    }
+    let mut output = EndOfMatchData::default();
+    for (player_md, skins, item_drops) in found.into_iter().rev() {
+        output.player_md.extend(player_md);
+        output.skins.extend(skins);
+        output.item_drops.extend(item_drops);
+    }
+    Ok(Some(output))
+}
+
+// Only reads frame headers
+fn packet_index(demo_bytes: &[u8]) -> Result<Vec<PacketFrame>, DemoParserError> {
+    let mut packets = vec![];
+    let mut ptr = HEADER_ENDS_AT_BYTE;
+    while ptr < demo_bytes.len() {
+        let cmd = read_varint(demo_bytes, &mut ptr)?;
+        let tick = read_varint(demo_bytes, &mut ptr)? as i32;
+        let size = read_varint(demo_bytes, &mut ptr)? as usize;
+        if ptr + size > demo_bytes.len() {
+            break;
+        }
+        match demo_cmd_type_from_int((cmd & !64) as i32)? {
+            demo_cmd @ (EDemoCommands::DemPacket | EDemoCommands::DemSignonPacket | EDemoCommands::DemFullPacket) => {
+                packets.push(PacketFrame {
+                    tick,
+                    starts_at: ptr,
+                    size,
+                    is_compressed: (cmd & 64) == 64,
+                    is_fullpacket: demo_cmd == EDemoCommands::DemFullPacket,
+                })
+            }
+            EDemoCommands::DemStop => break,
+            _ => {}
+        }
+        ptr += size;
+    }
+    Ok(packets)
+}
@@ -0,0 +1,307 @@
+use crate::first_pass::prop_controller::PropInfo;
+use crate::first_pass::read_bits::DemoParserError;
+use crate::first_pass::stringtables::UserInfo;
+use crate::second_pass::variants::Variant;
+use ahash::AHashMap;
+
+/*
+Turns parse_ticks style rows into a dense array shaped [ticks, player slots, props].
+
+With ParserInputs.tensor set, collect_entities writes each row into TensorRows instead of the long
+format df. A row is its tick, its slot and the values already in the output dtype, so the long frame
+is never built and the chunks hold about as many bytes as the filled cells of the tensor. to_tensor
+then moves the rows of every chunk into the tensor and frees them chunk by chunk.
+Velocity props are computed from the earlier rows of the long df, so with those wanted the rows
+still go to the df too.
+
+Player slots are the players of the userinfo table (DemoOutput.players) plus anyone else found in
+the rows, one per steamid and sorted by it, so a player keeps the same slot no matter which ticks
+are asked for or whether they changed their name. Bots have steamid 0 and get a slot per name.
+The tick axis is the requested ticks, or the ticks with rows if none were requested.
+
+mask[tick, slot] tells if the player has a row at that tick, missing values are NaN.
+Values are native endian floats in one buffer that the bindings can wrap without copying it again.
+Only numeric and bool props can be put in a tensor.
+*/
+
+#[derive(Debug, Clone, PartialEq)]
+pub struct TensorSettings {
+    pub props: Vec<String>,
+    pub dtype: TensorDtype,
+}
+
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub enum TensorDtype {
+    F32,
+    F64,
+}
+
+impl TensorDtype {
+    pub fn n_bytes(&self) -> usize {
+        match self {
+            TensorDtype::F32 => 4,
+            TensorDtype::F64 => 8,
+        }
+    }
+}
+
+#[derive(Debug, Clone)]
+pub struct TickTensor {
+    pub ticks: Vec<i32>,
+    pub steamids: Vec<u64>,
+    pub names: Vec<String>,
+    pub props: Vec<String>,
+    pub dtype: TensorDtype,
+    // [ticks, slots, props]
+    pub data: Vec<u8>,
+    // [ticks, slots]
+    pub mask: Vec<bool>,
+}
+
+// Rows of one chunk, see collect_entities
+#[derive(Debug, Clone, Default)]
+pub struct TensorRows {
+    pub ticks: Vec<i32>,
+    // Index in slots for every row
+    pub slot_of_row: Vec<u32>,
+    // (steamid, name), the name is only set for bots
+    pub slots: Vec<(u64, String)>,
+    slot_idx: AHashMap<(u64, String), u32>,
+    // Last name of every steamid in the rows
+    pub names: AHashMap<u64, String>,
+    // [rows, props]
+    pub data: Vec<u8>,
+}
+
+impl TensorRows {
+    pub fn push(
+        &mut self,
+        settings: &TensorSettings,
+        prop_infos: &[PropInfo],
+        tick: i32,
+        steamid: u64,
+        name: Option<&String>,
+        row: &[Option<Variant>],
+    ) -> Result<(), DemoParserError> {
+        // Only bots (steamid 0) are told apart by name
+        let key = match steamid {
+            0 => (0, name.cloned().unwrap_or_default()),
+            steamid => (steamid, String::new()),
+        };
+        let slot = match self.slot_idx.get(&key) {
+            Some(slot) => *slot,
+            None => {
+                let slot = self.slots.len() as u32;
+                self.slots.push(key.clone());
+                self.slot_idx.insert(key, slot);
+                slot
+            }
+        };
+        if let Some(name) = name {
+            if self.names.get(&steamid) != Some(name) {
+                self.names.insert(steamid, name.clone());
+            }
+        }
+        let width = settings.dtype.n_bytes();
+        for prop in &settings.props {
+            let value = match prop_infos.iter().position(|info| &info.prop_friendly_name == prop) {
+                Some(idx) => row.get(idx).cloned().flatten(),
+                None => None,
+            };
+            let value = match value {
+                None => f64::NAN,
+                Some(value) => variant_to_f64(&value).ok_or_else(|| DemoParserError::NonNumericProp(prop.clone()))?,
+            };
+            let start = self.data.len();
+            self.data.resize(start + width, 0);
+            write_value(&mut self.data[start..], settings.dtype, value);
+        }
+        self.ticks.push(tick);
+        self.slot_of_row.push(slot);
+        Ok(())
+    }
+}
+
+pub fn to_tensor(parts: Vec<TensorRows>, props: &[String], players: &[UserInfo], wanted_ticks: &[i32], dtype: TensorDtype) -> TickTensor {
+    let mut ticks: Vec<i32> = match wanted_ticks.is_empty() {
+        true => parts.iter().flat_map(|part| part.ticks.iter().copied()).collect(),
+        false => wanted_ticks.to_vec(),
+    };
+    ticks.sort_unstable();
+    ticks.dedup();
+    let mut slots: Vec<(u64, String)> = players.iter().map(|player| (player.steamid, String::new())).collect();
+    slots.extend(parts.iter().flat_map(|part| part.slots.iter().cloned()));
+    slots.sort_unstable();
+    slots.dedup();
+    let tick_idx: AHashMap<i32, usize> = ticks.iter().enumerate().map(|(idx, tick)| (*tick, idx)).collect();
+    let slot_idx: AHashMap<&(u64, String), usize> = slots.iter().enumerate().map(|(idx, slot)| (slot, idx)).collect();
+    // Name of each slot, players missing from the userinfo table use the name of their last row
+    let mut names_by_steamid: AHashMap<u64, String> = AHashMap::default();
+    for part in &parts {
+        names_by_steamid.extend(part.names.iter().map(|(steamid, name)| (*steamid, name.clone())));
+    }
+    for player in players {
+        names_by_steamid.insert(player.steamid, player.name.clone());
+    }
+
+    let row_bytes = props.len() * dtype.n_bytes();
+    let mut mask = vec![false; ticks.len() * slots.len()];
+    let mut data = vec![0; mask.len() * row_bytes];
+    for value in data.chunks_exact_mut(dtype.n_bytes()) {
+        write_value(value, dtype, f64::NAN);
+    }
+    // Each part is freed as soon as its rows are in the tensor
+    for part in parts {
+        let part_slots: Vec<usize> = part.slots.iter().map(|slot| slot_idx[slot]).collect();
+        for (row, tick) in part.ticks.iter().enumerate() {
+            let cell = match tick_idx.get(tick) {
+                Some(tick) => tick * slots.len() + part_slots[part.slot_of_row[row] as usize],
+                None => continue,
+            };
+            mask[cell] = true;
+            data[cell * row_bytes..(cell + 1) * row_bytes].copy_from_slice(&part.data[row * row_bytes..(row + 1) * row_bytes]);
+        }
+    }
+    TickTensor {
+        ticks,
+        steamids: slots.iter().map(|(steamid, _)| *steamid).collect(),
+        names: slots
+            .into_iter()
+            .map(|(steamid, name)| match steamid {
+                0 => name,
+                _ => names_by_steamid.remove(&steamid).unwrap_or_default(),
+            })
+            .collect(),
+        props: props.to_vec(),
+        dtype,
+        data,
+        mask,
+    }
+}
+
+fn write_value(out: &mut [u8], dtype: TensorDtype, value: f64) {
+    match dtype {
+        TensorDtype::F32 => out.copy_from_slice(&(value as f32).to_ne_bytes()),
+        TensorDtype::F64 => out.copy_from_slice(&value.to_ne_bytes()),
+    }
+}
+
+fn variant_to_f64(value: &Variant) -> Option<f64> {
+    match value {
+        Variant::Bool(b) => Some(*b as u8 as f64),
+        Variant::U32(n) => Some(*n as f64),
+        Variant::I32(n) => Some(*n as f64),
+        Variant::U64(n) => Some(*n as f64),
+        Variant::F32(n) => Some(*n as f64),
+        _ => None,
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::{to_tensor, TensorDtype, TensorRows, TensorSettings};
+    use crate::first_pass::prop_controller::PropInfo;
+    use crate::first_pass::prop_controller::{NAME_ID, STEAMID_ID, TICK_ID};
+    use crate::first_pass::stringtables::UserInfo;
+    use crate::second_pass::collect_data::PropType;
+    use crate::second_pass::variants::Variant;
+
+    fn info(id: u32, prop_type: PropType, name: &str) -> PropInfo {
+        PropInfo {
+            id,
+            prop_type,
+            prop_name: name.to_string(),
+            prop_friendly_name: name.to_string(),
+            is_player_prop: true,
+        }
+    }
+
+    #[test]
+    fn test_to_tensor() {
+        let prop_infos = vec![
+            info(TICK_ID, PropType::Tick, "tick"),
+            info(STEAMID_ID, PropType::Steamid, "steamid"),
+            info(1000, PropType::Player, "health"),
+            info(1001, PropType::Player, "is_alive"),
+        ];
+        let settings = TensorSettings {
+            props: vec!["is_alive".to_string(), "health".to_string()],
+            dtype: TensorDtype::F32,
+        };
+        let row = |tick: i32, steamid: u64, health: Option<i32>, is_alive: bool| {
+            vec![Some(Variant::I32(tick)), Some(Variant::U64(steamid)), health.map(Variant::I32), Some(Variant::Bool(is_alive))]
+        };
+        // Player 8 is missing from tick 2
+        let mut rows = TensorRows::default();
+        rows.push(&settings, &prop_infos, 1, 8, None, &row(1, 8, Some(100), true)).unwrap();
+        rows.push(&settings, &prop_infos, 1, 7, None, &row(1, 7, Some(90), true)).unwrap();
+        rows.push(&settings, &prop_infos, 2, 7, None, &row(2, 7, None, false)).unwrap();
+
+        let tensor = to_tensor(vec![rows], &settings.props, &[], &[], TensorDtype::F32);
+        let values: Vec<f32> = tensor.data.chunks(4).map(|b| f32::from_ne_bytes(b.try_into().unwrap())).collect();
+        assert_eq!(tensor.ticks, vec![1, 2]);
+        assert_eq!(tensor.steamids, vec![7, 8]);
+        assert_eq!(tensor.mask, vec![true, true, true, false]);
+        // [tick 1: [player 7: is_alive, health], [player 8: ...]], [tick 2: ...]]
+        assert_eq!(values[..5], [1.0, 90.0, 1.0, 100.0, 0.0]);
+        assert!(values[5].is_nan() && values[6].is_nan() && values[7].is_nan());
+    }
+
+    #[test]
+    fn test_to_tensor_slots_and_ticks() {
+        let prop_infos = vec![
+            info(TICK_ID, PropType::Tick, "tick"),
+            info(STEAMID_ID, PropType::Steamid, "steamid"),
+            info(NAME_ID, PropType::Name, "name"),
+            info(1000, PropType::Player, "health"),
+        ];
+        let settings = TensorSettings {
+            props: vec!["health".to_string()],
+            dtype: TensorDtype::F64,
+        };
+        let row = |health: i32| vec![None, None, None, Some(Variant::I32(health))];
+        let name = |name: &str| name.to_string();
+        // Player 7 renames between the ticks, which are in different chunks. The two bots share steamid 0
+        let mut first_chunk = TensorRows::default();
+        first_chunk.push(&settings, &prop_infos, 1, 7, Some(&name("a")), &row(100)).unwrap();
+        first_chunk.push(&settings, &prop_infos, 1, 0, Some(&name("bot1")), &row(50)).unwrap();
+        first_chunk.push(&settings, &prop_infos, 1, 0, Some(&name("bot2")), &row(60)).unwrap();
+        let mut second_chunk = TensorRows::default();
+        second_chunk.push(&settings, &prop_infos, 2, 7, Some(&name("b")), &row(90)).unwrap();
+        // Player 9 is in the userinfo table but has no rows
+        let players = vec![
+            UserInfo {
+                steamid: 7,
+                name: "b".to_string(),
+                userid: 1,
+                is_hltv: false,
+            },
+            UserInfo {
+                steamid: 9,
+                name: "c".to_string(),
+                userid: 2,
+                is_hltv: false,
+            },
+        ];
+        let tensor = to_tensor(vec![first_chunk, second_chunk], &settings.props, &players, &[3, 1, 2], TensorDtype::F64);
+        assert_eq!(tensor.ticks, vec![1, 2, 3]);
+        assert_eq!(tensor.steamids, vec![0, 0, 7, 9]);
+        assert_eq!(tensor.names, vec!["bot1", "bot2", "b", "c"]);
+        // Tick 3 was asked for but has no rows
+        assert_eq!(tensor.mask, vec![true, true, true, false, false, false, true, false, false, false, false, false]);
+        let values: Vec<f64> = tensor.data.chunks(8).map(|b| f64::from_ne_bytes(b.try_into().unwrap())).collect();
+        assert_eq!(values[..3], [50.0, 60.0, 100.0]);
+        assert_eq!(values[6], 90.0);
+    }
+
+    #[test]
+    fn test_tensor_rows_reject_non_numeric_props() {
+        let prop_infos = vec![info(1000, PropType::Player, "weapon_name")];
+        let settings = TensorSettings {
+            props: vec!["weapon_name".to_string()],
+            dtype: TensorDtype::F32,
+        };
+        let mut rows = TensorRows::default();
+        assert!(rows.push(&settings, &prop_infos, 1, 7, None, &[Some(Variant::String("ak47".to_string()))]).is_err());
+    }
+}
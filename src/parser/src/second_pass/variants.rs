@@ -24,6 +24,25 @@ pub enum Variant {
     Stickers(Vec<Sticker>),
     InputHistory(Vec<InputHistory>),
 }
+// Like == but floats are compared by their bits, so a NaN prop equals itself
+pub fn same_value(a: &Option<Variant>, b: &Option<Variant>) -> bool {
+    match (a, b) {
+        (Some(Variant::F32(a)), Some(Variant::F32(b))) => a.to_bits() == b.to_bits(),
+        (Some(Variant::VecXY(a)), Some(Variant::VecXY(b))) => same_floats(a, b),
+        (Some(Variant::VecXYZ(a)), Some(Variant::VecXYZ(b))) => same_floats(a, b),
+        _ => a == b,
+    }
+}
+fn same_floats(a: &[f32], b: &[f32]) -> bool {
+    a.len() == b.len() && a.iter().zip(b).all(|(a, b)| a.to_bits() == b.to_bits())
+}
+fn same_optional_floats<const N: usize>(a: &Option<[f32; N]>, b: &Option<[f32; N]>) -> bool {
+    match (a, b) {
+        (Some(a), Some(b)) => same_floats(a, b),
+        (None, None) => true,
+        _ => false,
+    }
+}
 #[derive(Debug, Clone, PartialEq, Serialize)]
 pub struct Sticker {
     pub name: String,
@@ -117,6 +136,25 @@ impl PropColumn {
             num_nones: 0,
         })
     }
+    // Same value in rows a and b, floats are compared like in same_value
+    pub fn rows_equal(&self, a: usize, b: usize) -> bool {
+        match &self.data {
+            Some(VarVec::Bool(v)) => v[a] == v[b],
+            Some(VarVec::I32(v)) => v[a] == v[b],
+            Some(VarVec::F32(v)) => same_optional_floats(&v[a].map(|x| [x]), &v[b].map(|x| [x])),
+            Some(VarVec::String(v)) => v[a] == v[b],
+            Some(VarVec::U32(v)) => v[a] == v[b],
+            Some(VarVec::U64(v)) => v[a] == v[b],
+            Some(VarVec::StringVec(v)) => v[a] == v[b],
+            Some(VarVec::U64Vec(v)) => v[a] == v[b],
+            Some(VarVec::U32Vec(v)) => v[a] == v[b],
+            Some(VarVec::XYVec(v)) => same_optional_floats(&v[a], &v[b]),
+            Some(VarVec::XYZVec(v)) => same_optional_floats(&v[a], &v[b]),
+            Some(VarVec::Stickers(v)) => v[a] == v[b],
+            Some(VarVec::InputHistory(v)) => v[a] == v[b],
+            None => true,
+        }
+    }
     pub fn len(&self) -> usize {
         match &self.data {
             Some(VarVec::Bool(b)) => b.len(),
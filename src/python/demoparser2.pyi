@@ -1,5 +1,9 @@
+import os
+import numpy as np
 import pandas as pd
+import pyarrow.dataset as ds
 from typing import (
+    Any,
     Dict,
     Sequence,
     Optional,
@@ -7,8 +11,10 @@ from typing import (
     Tuple,
     final,
     Union,
+    Literal,
     Protocol,
     type_check_only,
+    overload,
 )
 
 @type_check_only
@@ -20,9 +26,141 @@ class WantedPropStateProtocol(Protocol):
 class WantedPropState:
     def __init__(self, prop: str, state: Union[bool, str, int, float]) -> None: ...
 
+@final
+class Predicate:
+    """Row filter for `parse_ticks`. Combine with `&` and `|`."""
+    @staticmethod
+    def eq(prop: str, value: Union[bool, str, int, float]) -> Predicate: ...
+    @staticmethod
+    def ne(prop: str, value: Union[bool, str, int, float]) -> Predicate: ...
+    @staticmethod
+    def lt(prop: str, value: Union[bool, str, int, float]) -> Predicate: ...
+    @staticmethod
+    def le(prop: str, value: Union[bool, str, int, float]) -> Predicate: ...
+    @staticmethod
+    def gt(prop: str, value: Union[bool, str, int, float]) -> Predicate: ...
+    @staticmethod
+    def ge(prop: str, value: Union[bool, str, int, float]) -> Predicate: ...
+    @staticmethod
+    def between(prop: str, low: Union[bool, str, int, float], high: Union[bool, str, int, float]) -> Predicate:
+        """`low <= prop <= high`."""
+    @staticmethod
+    def isin(prop: str, values: Sequence[Union[bool, str, int, float]]) -> Predicate: ...
+    @staticmethod
+    def all_of(predicates: Sequence[Predicate]) -> Predicate: ...
+    @staticmethod
+    def any_of(predicates: Sequence[Predicate]) -> Predicate: ...
+    def __and__(self, other: Predicate) -> Predicate: ...
+    def __or__(self, other: Predicate) -> Predicate: ...
+
+@final
+class Query:
+    """A query checked and normalized once, for running on many demos with `DemoParser.run` or `run_many`.
+
+    Without `events` it returns the same DataFrame as `parse_ticks`, with `events` the same list as
+    `parse_events` with `props` as the player props. Arguments of the other kind raise ValueError,
+    for example `predicate` or `ticks` together with `events`. Picklable and hashable.
+    """
+    def __init__(
+        self,
+        props: Optional[Sequence[str]] = None,
+        *,
+        events: Optional[Sequence[str]] = None,
+        other: Optional[Sequence[str]] = None,
+        players: Optional[Sequence[int]] = None,
+        ticks: Optional[Sequence[int]] = None,
+        predicate: Optional[Predicate] = None,
+        predicate_scope: Literal["player", "tick"] = "player",
+        every_n_ticks: Optional[int] = None,
+        hz: Optional[float] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> None: ...
+    def __hash__(self) -> int: ...
+    def __eq__(self, other: object) -> bool: ...
+
+def run_many(
+    paths: Sequence[Union[str, os.PathLike[str]]],
+    query: Query,
+    *,
+    parsing_mode: Literal["normal", "pipelined", "single_threaded", "multi_threaded"] = "normal",
+    return_exceptions: bool = False,
+) -> List[Any]:
+    """Run `query` on every demo, returns the outputs in the same order as `paths`.
+
+    By default the first demo that fails raises and the outputs of the other demos are lost.
+    With `return_exceptions=True` the exception is returned in place of that demo's output instead.
+    """
+
+@final
+class DemoProbe:
+    """Header and file info of a demo, see `probe`. The playback fields are `None` if the demo was cut short."""
+    @property
+    def path(self) -> str: ...
+    @property
+    def map_name(self) -> str: ...
+    @property
+    def server_name(self) -> str: ...
+    @property
+    def client_name(self) -> str: ...
+    @property
+    def demo_version_name(self) -> str: ...
+    @property
+    def network_protocol(self) -> int: ...
+    @property
+    def build_num(self) -> int: ...
+    @property
+    def file_size(self) -> int: ...
+    @property
+    def playback_time(self) -> Optional[float]: ...
+    @property
+    def playback_ticks(self) -> Optional[int]: ...
+    @property
+    def playback_frames(self) -> Optional[int]: ...
+
+@overload
+def probe(path_or_paths: Union[str, os.PathLike[str]]) -> DemoProbe: ...
+@overload
+def probe(path_or_paths: Sequence[Union[str, os.PathLike[str]]]) -> List[DemoProbe]:
+    """Read the header and the file info at the end of one or many demos without parsing them.
+
+    A sequence of paths is probed in parallel and returns the results in the same order.
+    """
+
+@final
+class Cursor:
+    """Position in a demo that keeps the parser state between calls, see `DemoParser.cursor`."""
+    @property
+    def tick(self) -> int: ...
+    def seek(self, tick: int) -> int:
+        """Move to the end of `tick` and return it.
+
+        Going forward continues from the current position, going backward restarts from the last
+        fullpacket before the tick. Past the end of the demo the cursor stays at the last tick.
+        """
+    def step(self, n: int = 1) -> int:
+        """Move `n` ticks forward (backward if negative) and return the new tick."""
+    def read(self, props: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """One row per player at the current tick, same columns as `parse_ticks`.
+
+        `props` picks a subset of the wanted props given to `DemoParser.cursor`.
+        """
+
 @final
 class DemoParser:
-    def __init__(self, path: str) -> None: ...
+    def __init__(
+        self,
+        path: str,
+        *,
+        parsing_mode: Literal[
+            "normal", "pipelined", "single_threaded", "multi_threaded"
+        ] = "normal",
+        target_chunk_bytes: Optional[int] = None,
+        max_inflight_chunks: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        cache_max_bytes: Optional[int] = None,
+        memory_cache_bytes: Optional[int] = None,
+    ) -> None: ...
     def parse_header(self) -> Dict[str, str]: ...
     def list_updated_fields(self) -> list[str]: ...
     def list_game_events(self) -> List[str]: ...
@@ -40,15 +178,89 @@ class DemoParser:
         *,
         player: Optional[Sequence[str]] = None,
         other: Optional[Sequence[str]] = None,
-    ) -> pd.DataFrame: ...
+        columns: Optional[Sequence[str]] = None,
+    ) -> pd.DataFrame:
+        """`columns` keeps only those output columns (and "tick"), the rest are not computed. `None` means all,
+        an empty list only "tick". Raises ValueError for a column that the event can't have."""
+    @overload
     def parse_events(
         self,
         event_name: Sequence[str],
         *,
         player: Optional[Sequence[str]] = None,
         other: Optional[Sequence[str]] = None,
+        snapshot_props: None = None,
+        columns: Optional[Sequence[str]] = None,
     ) -> List[Tuple[str, pd.DataFrame]]: ...
+    @overload
+    def parse_events(
+        self,
+        event_name: Sequence[str],
+        *,
+        player: Optional[Sequence[str]] = None,
+        other: Optional[Sequence[str]] = None,
+        snapshot_props: Sequence[str],
+        columns: Optional[Sequence[str]] = None,
+    ) -> Tuple[List[Tuple[str, pd.DataFrame]], pd.DataFrame]:
+        """With `snapshot_props` also returns the props of every player at the moment each event fired.
+
+        Every event gets an "event_index" column, the snapshot DataFrame has one row per player per event
+        with the same "event_index".
+        """
     def parse_voice(self) -> Dict[str, bytes]: ...
+    def estimate(
+        self,
+        wanted_props: Sequence[str],
+        *,
+        players: Optional[Sequence[int]] = None,
+        ticks: Optional[Sequence[int]] = None,
+    ) -> Dict[str, int]:
+        """Estimate the size of `parse_ticks` output without parsing any ticks.
+
+        Returns:
+            Dict[str, int]: "rows" and "bytes" of the parsed columns before they are turned into a DataFrame.
+        """
+    def parse_ticks_to_dataset(
+        self,
+        wanted_props: Sequence[str],
+        *,
+        players: Optional[Sequence[int]] = None,
+        ticks: Optional[Sequence[int]] = None,
+        spill_dir: Optional[str] = None,
+    ) -> ds.Dataset:
+        """Same as `parse_ticks` but the output is written to Arrow IPC files while parsing.
+
+        Props that can't be parsed in chunks (for example the per round stats like utility_damage,
+        ducking and fall velocity) and parsing_mode="single_threaded" parse the whole demo as one
+        window, so the output is in memory before the single file is written.
+
+        Args:
+            spill_dir (Optional[str]): Directory for the files. `None` creates a temporary directory that is removed when the dataset is garbage collected.
+
+        Returns:
+            ds.Dataset: pyarrow dataset over the written files.
+        """
+    def snapshot(self, tick: int) -> Dict[str, Any]:
+        """State of player, team, rules, C4 and projectile entities at the end of `tick`.
+
+        Only parses from the last fullpacket at or before the tick. Flattened vectors like
+        m_hMyWeapons have one entry per element ("...m_hMyWeapons.0"), the econ attributes
+        of gloves are not included.
+
+        Returns:
+            Dict[str, Any]: {"tick": int, "entities": [{"entity_id": int, "class_name": str, "props": Dict[str, Any]}]}
+        """
+    def cursor(
+        self,
+        wanted_props: Sequence[str],
+        *,
+        players: Optional[Sequence[int]] = None,
+    ) -> Cursor:
+        """Create a `Cursor` at tick 0 for moving around the demo and reading `wanted_props`."""
+    def run(self, query: Query) -> Any:
+        """Run a `Query` on this demo. Returns a DataFrame for tick queries and a list of (event name, DataFrame) for event queries."""
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss statistics of the result caches under "memory" and "disk". Empty if no cache is enabled."""
     def parse_ticks(
         self,
         wanted_props: Sequence[str],
@@ -58,6 +270,11 @@ class DemoParser:
         prop_states: Optional[
             Sequence[WantedPropStateProtocol | WantedPropState]
         ] = None,
+        mode: Literal["full", "changes", "rle"] = "full",
+        predicate: Optional[Predicate] = None,
+        predicate_scope: Literal["player", "tick"] = "player",
+        every_n_ticks: Optional[int] = None,
+        hz: Optional[float] = None,
     ) -> pd.DataFrame:
         """Parse the specified props.
 
@@ -67,9 +284,81 @@ class DemoParser:
                 `None` or an empty Sequence means all players. Defaults to `None`.
             ticks (Optional[Sequence[int]]): Sequence of ticks to parse.
                 `None` or an empty Sequence means all ticks. Defaults to `None`.
+            mode (Literal["full", "changes", "rle"]): "full" returns a row per player per tick,
+                "changes" only the rows where any wanted prop changed since the player's previous row
+                and "rle" one row per run of unchanged values with an extra "end_tick" column.
+                Defaults to "full".
+            predicate (Optional[Predicate]): Only collect rows matching the predicate.
+                Raises ValueError if it uses a prop that doesn't exist. Defaults to `None`.
+            predicate_scope (Literal["player", "tick"]): "player" keeps the matching players,
+                "tick" keeps all players of ticks where any player matches. Defaults to "player".
+            every_n_ticks (Optional[int]): Only parse ticks divisible by this. Defaults to `None` (every tick).
+            hz (Optional[float]): Same as every_n_ticks=round(64 / hz). Can't be combined with every_n_ticks.
 
         Returns:
             pd.DataFrame: Dataframe of all the parsed props for each player at each tick.
         """
+    def parse_ticks_normalized(
+        self,
+        wanted_props: Sequence[str],
+        *,
+        players: Optional[Sequence[int]] = None,
+        ticks: Optional[Sequence[int]] = None,
+        prop_states: Optional[
+            Sequence[WantedPropStateProtocol | WantedPropState]
+        ] = None,
+    ) -> Dict[str, pd.DataFrame]:
+        """Same as `parse_ticks` but split into tables without repeated values.
+
+        Returns:
+            Dict[str, pd.DataFrame]: "players" (player_key, steamid, name, one row per steamid and name),
+                "player_ticks" (one row per player per tick), "rules" (one row per tick) and "teams"
+                (one row per team per tick). "team_num" is added when team props are wanted.
+        """
+    def parse_event_windows(
+        self,
+        event_name: str,
+        props: Sequence[str],
+        *,
+        before: int = 0,
+        after: int = 0,
+        players: Optional[Union[str, Sequence[str]]] = None,
+    ) -> pd.DataFrame:
+        """Parse `props` for the ticks around every `event_name` event.
+
+        Args:
+            before (int): Ticks before the event tick to include. Defaults to 0.
+            after (int): Ticks after the event tick to include. Defaults to 0.
+            players (Optional[Union[str, Sequence[str]]]): Prefixes of the event's players to include,
+                like "attacker" or ["user", "attacker"]. `None` includes every player. Defaults to `None`.
+
+        Returns:
+            pd.DataFrame: One row per player per tick per event, "event_index" is the row of the event
+                in `parse_event(event_name)`.
+        """
+    def parse_tensor(
+        self,
+        wanted_props: Sequence[str],
+        *,
+        players: Optional[Sequence[int]] = None,
+        ticks: Optional[Sequence[int]] = None,
+        dtype: Literal["float32", "float64"] = "float32",
+    ) -> Dict[str, Any]:
+        """Parse numeric props into a dense array shaped [ticks, player slots, props].
+
+        Args:
+            wanted_props (Sequence[str]): Numeric or bool props, in the order of the last axis.
+            players (Optional[Sequence[int]]): Steam IDs of the slots. `None` means every player
+                of the demo, one slot per steamid (bots per name). Defaults to `None`.
+            ticks (Optional[Sequence[int]]): The tick axis, ticks without rows are masked.
+                `None` means every tick with rows. Defaults to `None`.
+            dtype (Literal["float32", "float64"]): dtype of "data". Defaults to "float32".
+
+        Returns:
+            Dict[str, Any]: "data" (np.ndarray [ticks, slots, props], NaN where missing),
+                "mask" (bool np.ndarray [ticks, slots], False where the player has no row),
+                "ticks" (np.ndarray), "steamids" (np.ndarray) and "names" (List[str]) of the slots
+                and "props" (List[str]).
+        """
 
-__all__ = ["DemoParser", "WantedPropState"]
+__all__ = ["Cursor", "DemoParser", "DemoProbe", "Predicate", "Query", "WantedPropState", "probe", "run_many"]
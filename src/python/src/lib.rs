@@ -1,3 +1,5 @@
+mod result_cache;
+
 use ahash::AHashMap;
 use itertools::Itertools;
 use memmap2::Mmap;
@@ -6,11 +8,33 @@ use parser::first_pass::parser_settings::rm_map_user_friendly_names;
 use parser::first_pass::parser_settings::rm_user_friendly_names;
 use parser::first_pass::parser_settings::FirstPassParser;
 use parser::first_pass::parser_settings::ParserInputs;
+use parser::first_pass::probe::probe_demo_files;
+use parser::first_pass::probe::DemoProbe;
+use parser::first_pass::prop_controller::PropInfo;
 use parser::first_pass::read_bits::DemoParserError;
+use parser::parse_demo::DemoOutput;
 use parser::parse_demo::Parser;
+use parser::parse_demo::ParsingMode;
+use parser::parse_demo::TickOutputMode;
+use parser::second_pass::cursor::Cursor;
+use parser::second_pass::event_windows::EventWindowSettings;
 use parser::second_pass::game_events::EventField;
 use parser::second_pass::game_events::GameEvent;
+use parser::second_pass::normalize::normalize_output;
+use parser::second_pass::normalize::TEAM_NUM_PROP;
 use parser::second_pass::parser_settings::create_huffman_lookup_table;
+use parser::second_pass::predicate::CompareOp;
+use parser::second_pass::predicate::Predicate;
+use parser::second_pass::predicate::PredicateFilter;
+use parser::second_pass::predicate::PredicateScope;
+use parser::second_pass::tail_scan::scan_end_of_match;
+use parser::second_pass::tail_scan::EndOfMatchData;
+use parser::second_pass::tensor::to_tensor;
+use parser::second_pass::tensor::TensorDtype;
+use parser::second_pass::tensor::TensorSettings;
+use parser::second_pass::variants::InputHistory;
+use parser::second_pass::variants::PropColumn;
+use parser::second_pass::variants::Sticker;
 use parser::second_pass::variants::VarVec;
 use parser::second_pass::variants::Variant;
 #[cfg(feature = "voice")]
@@ -23,6 +47,8 @@ use polars_arrow::array::{
     Array, BooleanArray, Float32Array, Int32Array, UInt32Array, UInt64Array,
 };
 use polars_arrow::ffi;
+use pyo3::exceptions::PyBufferError;
+use pyo3::exceptions::PyMemoryError;
 use pyo3::exceptions::PyValueError;
 use pyo3::ffi::Py_uintptr_t;
 use pyo3::impl_::frompyobject::extract_struct_field;
@@ -31,11 +57,18 @@ use pyo3::types::IntoPyDict;
 use pyo3::types::PyBytes;
 use pyo3::types::PyDict;
 use pyo3::types::PyList;
+use pyo3::types::PyTuple;
 use pyo3::{intern, Python};
 use pyo3::{PyAny, PyObject, PyResult};
-use std::sync::Arc;
 
 use pyo3::create_exception;
+use result_cache::hash_bytes;
+use result_cache::DiskCache;
+use result_cache::MemoryCache;
+use result_cache::QueryKey;
+use std::path::PathBuf;
+use std::sync::Arc;
+use std::sync::OnceLock;
 create_exception!(DemoParser, Exception, pyo3::exceptions::PyException);
 
 #[derive(Clone)]
@@ -75,6 +108,289 @@ impl WantedPropState {
     }
 }
 
+#[pyclass(name = "Predicate")]
+#[derive(Clone)]
+struct PyPredicate(Predicate);
+
+impl PyPredicate {
+    fn compare(prop: String, op: CompareOp, value: PyVariant) -> Self {
+        PyPredicate(Predicate::Compare { prop, op, value: value.0 })
+    }
+}
+
+#[pymethods]
+impl PyPredicate {
+    #[staticmethod]
+    fn eq(prop: String, value: PyVariant) -> Self {
+        Self::compare(prop, CompareOp::Eq, value)
+    }
+    #[staticmethod]
+    fn ne(prop: String, value: PyVariant) -> Self {
+        Self::compare(prop, CompareOp::Ne, value)
+    }
+    #[staticmethod]
+    fn lt(prop: String, value: PyVariant) -> Self {
+        Self::compare(prop, CompareOp::Lt, value)
+    }
+    #[staticmethod]
+    fn le(prop: String, value: PyVariant) -> Self {
+        Self::compare(prop, CompareOp::Le, value)
+    }
+    #[staticmethod]
+    fn gt(prop: String, value: PyVariant) -> Self {
+        Self::compare(prop, CompareOp::Gt, value)
+    }
+    #[staticmethod]
+    fn ge(prop: String, value: PyVariant) -> Self {
+        Self::compare(prop, CompareOp::Ge, value)
+    }
+    #[staticmethod]
+    fn between(prop: String, low: PyVariant, high: PyVariant) -> Self {
+        PyPredicate(Predicate::Between {
+            prop,
+            low: low.0,
+            high: high.0,
+        })
+    }
+    #[staticmethod]
+    fn isin(prop: String, values: Vec<PyVariant>) -> Self {
+        PyPredicate(Predicate::In {
+            prop,
+            values: values.into_iter().map(|v| v.0).collect(),
+        })
+    }
+    fn __and__(&self, other: PyPredicate) -> Self {
+        PyPredicate(Predicate::And(vec![self.0.clone(), other.0]))
+    }
+    fn __or__(&self, other: PyPredicate) -> Self {
+        PyPredicate(Predicate::Or(vec![self.0.clone(), other.0]))
+    }
+    #[staticmethod]
+    fn all_of(predicates: Vec<PyPredicate>) -> Self {
+        PyPredicate(Predicate::And(predicates.into_iter().map(|p| p.0).collect()))
+    }
+    #[staticmethod]
+    fn any_of(predicates: Vec<PyPredicate>) -> Self {
+        PyPredicate(Predicate::Or(predicates.into_iter().map(|p| p.0).collect()))
+    }
+    // Pickled as the constructor call that builds it
+    fn __reduce__(&self, py: Python) -> PyResult<(PyObject, PyObject)> {
+        let to_py_list = |inner: &Vec<Predicate>| -> PyResult<Vec<PyObject>> {
+            inner.iter().map(|p| Ok(Py::new(py, PyPredicate(p.clone()))?.to_object(py))).collect()
+        };
+        let (constructor, args) = match &self.0 {
+            Predicate::Compare { prop, op, value } => {
+                let constructor = match op {
+                    CompareOp::Eq => "eq",
+                    CompareOp::Ne => "ne",
+                    CompareOp::Lt => "lt",
+                    CompareOp::Le => "le",
+                    CompareOp::Gt => "gt",
+                    CompareOp::Ge => "ge",
+                };
+                (constructor, (prop, variant_to_py(py, value)?).to_object(py))
+            }
+            Predicate::Between { prop, low, high } => (
+                "between",
+                (prop, variant_to_py(py, low)?, variant_to_py(py, high)?).to_object(py),
+            ),
+            Predicate::In { prop, values } => {
+                let values = values.iter().map(|v| variant_to_py(py, v)).collect::<PyResult<Vec<_>>>()?;
+                ("isin", (prop, values).to_object(py))
+            }
+            Predicate::And(inner) => ("all_of", (to_py_list(inner)?,).to_object(py)),
+            Predicate::Or(inner) => ("any_of", (to_py_list(inner)?,).to_object(py)),
+        };
+        let rebuild = py.import_bound("demoparser2")?.getattr("_rebuild_predicate")?;
+        Ok((rebuild.to_object(py), (constructor, args).to_object(py)))
+    }
+    fn __repr__(&self) -> String {
+        format!("Predicate({:?})", self.0)
+    }
+}
+
+/// Props, events and filters checked and turned into real prop names once, for running the same
+/// query on many demos with DemoParser.run or run_many. Queries without events return parse_ticks
+/// output, queries with events return parse_events output with props as the player props.
+#[pyclass(name = "Query", module = "demoparser2", frozen)]
+#[derive(Clone)]
+struct PyQuery {
+    // As given, for pickling and repr
+    props: Vec<String>,
+    events: Vec<String>,
+    other: Vec<String>,
+    players: Vec<u64>,
+    ticks: Vec<i32>,
+    predicate: Option<PyPredicate>,
+    predicate_scope: String,
+    every_n_ticks: Option<i32>,
+    columns: Option<Vec<String>>,
+    // Normalized once in new
+    real_props: Vec<String>,
+    real_other: Vec<String>,
+    real_name_to_og_name: AHashMap<String, String>,
+    predicate_filter: Option<PredicateFilter>,
+}
+
+impl PyQuery {
+    fn parser_inputs<'a>(&self, huf: &'a Vec<(u8, u8)>) -> ParserInputs<'a> {
+        ParserInputs {
+            real_name_to_og_name: self.real_name_to_og_name.clone(),
+            wanted_players: self.players.clone(),
+            wanted_player_props: self.real_props.clone(),
+            wanted_other_props: self.real_other.clone(),
+            wanted_prop_states: AHashMap::default(),
+            wanted_events: self.events.clone(),
+            parse_ents: true,
+            wanted_ticks: self.ticks.clone(),
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: huf,
+            order_by_steamid: false,
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: self.predicate_filter.clone(),
+            every_n_ticks: self.every_n_ticks,
+            wanted_event_columns: self.columns.clone(),
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        }
+    }
+    fn key(&self) -> String {
+        format!(
+            "{:?}",
+            (
+                &self.props,
+                &self.events,
+                &self.other,
+                &self.players,
+                &self.ticks,
+                &self.predicate_filter,
+                self.every_n_ticks,
+                &self.columns,
+            )
+        )
+    }
+    fn output_to_py(&self, py: Python, output: DemoOutput) -> PyResult<PyObject> {
+        match self.events.is_empty() {
+            true => ticks_to_df(py, output.prop_controller.prop_infos, &output.df),
+            false => match series_from_multiple_events(&output.game_events, py) {
+                Ok(events) => Ok(events),
+                Err(e) => Err(Exception::new_err(format!("{e}"))),
+            },
+        }
+    }
+}
+
+#[pymethods]
+impl PyQuery {
+    #[new]
+    #[pyo3(signature = (props=None, *, events=None, other=None, players=None, ticks=None, predicate=None, predicate_scope="player", every_n_ticks=None, hz=None, columns=None))]
+    fn new(
+        props: Option<Vec<String>>,
+        events: Option<Vec<String>>,
+        other: Option<Vec<String>>,
+        players: Option<Vec<u64>>,
+        ticks: Option<Vec<i32>>,
+        predicate: Option<PyPredicate>,
+        predicate_scope: &str,
+        every_n_ticks: Option<i32>,
+        hz: Option<f64>,
+        columns: Option<Vec<String>>,
+    ) -> PyResult<Self> {
+        let props = props.unwrap_or_default();
+        let events = events.unwrap_or_default();
+        let other = other.unwrap_or_default();
+        if props.is_empty() && events.is_empty() {
+            return Err(PyValueError::new_err("Query needs props or events"));
+        }
+        // parse_events has no row filters and parse_ticks no event arguments, anything else would be silently ignored
+        let ticks_only = [
+            ("players", players.is_some()),
+            ("ticks", ticks.is_some()),
+            ("predicate", predicate.is_some()),
+            ("every_n_ticks", every_n_ticks.is_some()),
+            ("hz", hz.is_some()),
+        ];
+        let events_only = [("other", !other.is_empty()), ("columns", columns.is_some())];
+        let unsupported = match events.is_empty() {
+            true => events_only.iter().find(|(_, given)| *given),
+            false => ticks_only.iter().find(|(_, given)| *given),
+        };
+        if let Some((name, _)) = unsupported {
+            return Err(PyValueError::new_err(match events.is_empty() {
+                true => format!("{name} can only be used in a Query with events"),
+                false => format!("{name} can't be used in a Query with events"),
+            }));
+        }
+        let real_props = match rm_user_friendly_names(&props) {
+            Ok(real_props) => real_props,
+            Err(e) => return Err(PyValueError::new_err(format!("{e}"))),
+        };
+        let real_other = match rm_user_friendly_names(&other) {
+            Ok(real_other) => real_other,
+            Err(e) => return Err(PyValueError::new_err(format!("{e}"))),
+        };
+        let mut real_name_to_og_name = AHashMap::default();
+        for (real_name, user_friendly_name) in real_props.iter().zip(&props).chain(real_other.iter().zip(&other)) {
+            real_name_to_og_name.insert(real_name.clone(), user_friendly_name.clone());
+        }
+        let predicate_filter = match &predicate {
+            Some(predicate) => Some(predicate_filter(predicate.0.clone(), predicate_scope)?),
+            None => None,
+        };
+        Ok(PyQuery {
+            props,
+            events,
+            other,
+            players: players.unwrap_or_default(),
+            ticks: ticks.unwrap_or_default(),
+            predicate,
+            predicate_scope: predicate_scope.to_string(),
+            every_n_ticks: tick_step(every_n_ticks, hz)?,
+            columns,
+            real_props,
+            real_other,
+            real_name_to_og_name,
+            predicate_filter,
+        })
+    }
+    fn __getnewargs_ex__(&self, py: Python) -> PyResult<(PyObject, PyObject)> {
+        // Only the arguments of the query's kind, new rejects the others
+        let kwargs = PyDict::new_bound(py);
+        if self.events.is_empty() {
+            kwargs.set_item("players", &self.players)?;
+            kwargs.set_item("ticks", &self.ticks)?;
+            let predicate = match &self.predicate {
+                Some(predicate) => Some(Py::new(py, predicate.clone())?),
+                None => None,
+            };
+            kwargs.set_item("predicate", predicate)?;
+            kwargs.set_item("predicate_scope", &self.predicate_scope)?;
+            kwargs.set_item("every_n_ticks", self.every_n_ticks)?;
+        } else {
+            kwargs.set_item("events", &self.events)?;
+            kwargs.set_item("other", &self.other)?;
+            kwargs.set_item("columns", &self.columns)?;
+        }
+        Ok(((self.props.clone(),).to_object(py), kwargs.to_object(py)))
+    }
+    fn __hash__(&self) -> u64 {
+        hash_bytes(self.key().as_bytes())
+    }
+    fn __eq__(&self, other: PyRef<'_, Self>) -> bool {
+        self.key() == other.key()
+    }
+    fn __repr__(&self) -> String {
+        format!("Query(props={:?}, events={:?})", self.props, self.events)
+    }
+}
+
 impl<'py> FromPyObject<'py> for WantedPropState {
     fn extract_bound(obj: &Bound<'py, PyAny>) -> PyResult<Self> {
         // First try to downcast the object
@@ -106,13 +422,41 @@ impl<'py> FromPyObject<'py> for WantedPropState {
 #[pymethods]
 impl DemoParser {
     #[new]
-    pub fn py_new(demo_path: String) -> PyResult<Self> {
+    #[pyo3(signature = (demo_path, *, parsing_mode="normal", target_chunk_bytes=None, max_inflight_chunks=None, memory_limit=None, cache_dir=None, cache_max_bytes=None, memory_cache_bytes=None))]
+    pub fn py_new(
+        demo_path: String,
+        parsing_mode: &str,
+        target_chunk_bytes: Option<usize>,
+        max_inflight_chunks: Option<usize>,
+        memory_limit: Option<usize>,
+        cache_dir: Option<String>,
+        cache_max_bytes: Option<u64>,
+        memory_cache_bytes: Option<u64>,
+    ) -> PyResult<Self> {
+        let parsing_mode = parsing_mode_from_str(parsing_mode)?;
         let mmap = match create_mmap(demo_path.clone()) {
-            Ok(mmap) => mmap,
+            Ok(mmap) => Arc::new(mmap),
             Err(e) => return Err(Exception::new_err(format!("{e}. File name: {demo_path}"))),
         };
         let huf = create_huffman_lookup_table();
-        Ok(Self { mmap, huf })
+        let disk_cache = match cache_dir {
+            Some(dir) => match DiskCache::new(dir.clone(), cache_max_bytes) {
+                Ok(cache) => Some(cache),
+                Err(e) => return Err(Exception::new_err(format!("{e}. Cache dir: {dir}"))),
+            },
+            None => None,
+        };
+        Ok(Self {
+            mmap,
+            huf,
+            parsing_mode,
+            target_chunk_bytes,
+            max_inflight_chunks,
+            memory_limit,
+            disk_cache,
+            memory_cache: memory_cache_bytes.map(MemoryCache::new),
+            demo_hash: OnceLock::new(),
+        })
     }
 
     /// Parses header message (different from the first 16 bytes of the file)
@@ -140,6 +484,14 @@ impl DemoParser {
             huffman_lookup_table: &self.huf,
             order_by_steamid: false,
             fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
         };
         let mut parser = FirstPassParser::new(&settings);
         let output = match parser.parse_header_only(&self.mmap) {
@@ -167,8 +519,16 @@ impl DemoParser {
             huffman_lookup_table: &self.huf,
             order_by_steamid: false,
             fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
         };
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
+        let mut parser = self.new_parser(settings);
         let output = match parser.parse_demo(&self.mmap) {
             Ok(output) => output,
             Err(e) => return Err(Exception::new_err(format!("{e}"))),
@@ -195,8 +555,16 @@ impl DemoParser {
             huffman_lookup_table: &self.huf,
             order_by_steamid: false,
             fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
         };
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
+        let mut parser = self.new_parser(settings);
         let output = match parser.parse_demo(&self.mmap) {
             Ok(output) => output,
             Err(e) => return Err(Exception::new_err(format!("{e}"))),
@@ -248,9 +616,17 @@ impl DemoParser {
             huffman_lookup_table: &self.huf,
             order_by_steamid: false,
             fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
         };
 
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
+        let mut parser = self.new_parser(settings);
         let output = match parser.parse_demo(&self.mmap) {
             Ok(output) => output,
             Err(e) => return Err(Exception::new_err(format!("{e}"))),
@@ -329,29 +705,7 @@ impl DemoParser {
     }
 
     pub fn parse_player_info(&self, py: Python<'_>) -> PyResult<Py<PyAny>> {
-        let settings = ParserInputs {
-            real_name_to_og_name: AHashMap::default(),
-            wanted_players: vec![],
-            wanted_player_props: vec![],
-            wanted_other_props: vec![],
-            wanted_prop_states: AHashMap::default(),
-            wanted_events: vec![],
-            parse_ents: false,
-            wanted_ticks: vec![],
-            parse_projectiles: false,
-            parse_grenades: false,
-            only_header: true,
-            list_props: false,
-            only_convars: false,
-            huffman_lookup_table: &self.huf,
-            order_by_steamid: false,
-            fallback_bytes: None,
-        };
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
-        let output = match parser.parse_demo(&self.mmap) {
-            Ok(output) => output,
-            Err(e) => return Err(Exception::new_err(format!("{e}"))),
-        };
+        let output = self.end_of_match_data(py)?;
         let steamids: Vec<Option<u64>> = output.player_md.iter().map(|p| p.steamid).collect();
         let team_numbers: Vec<Option<i32>> =
             output.player_md.iter().map(|p| p.team_number).collect();
@@ -376,29 +730,7 @@ impl DemoParser {
         })
     }
     pub fn parse_item_drops(&self, py: Python<'_>) -> PyResult<Py<PyAny>> {
-        let settings = ParserInputs {
-            real_name_to_og_name: AHashMap::default(),
-            wanted_players: vec![],
-            wanted_player_props: vec![],
-            wanted_other_props: vec![],
-            wanted_prop_states: AHashMap::default(),
-            wanted_events: vec![],
-            parse_ents: false,
-            wanted_ticks: vec![],
-            parse_projectiles: false,
-            parse_grenades: false,
-            only_header: true,
-            list_props: false,
-            only_convars: false,
-            huffman_lookup_table: &self.huf,
-            order_by_steamid: false,
-            fallback_bytes: None,
-        };
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
-        let output = match parser.parse_demo(&self.mmap) {
-            Ok(output) => output,
-            Err(e) => return Err(Exception::new_err(format!("{e}"))),
-        };
+        let output = self.end_of_match_data(py)?;
         let def_index: Vec<Option<u32>> = output.item_drops.iter().map(|x| x.def_index).collect();
         let account_id: Vec<Option<u32>> = output.item_drops.iter().map(|x| x.account_id).collect();
         let dropreason: Vec<Option<u32>> = output.item_drops.iter().map(|x| x.dropreason).collect();
@@ -459,29 +791,7 @@ impl DemoParser {
         })
     }
     pub fn parse_skins(&self, py: Python<'_>) -> PyResult<Py<PyAny>> {
-        let settings = ParserInputs {
-            real_name_to_og_name: AHashMap::default(),
-            wanted_players: vec![],
-            wanted_player_props: vec![],
-            wanted_other_props: vec![],
-            wanted_prop_states: AHashMap::default(),
-            wanted_events: vec![],
-            parse_ents: false,
-            wanted_ticks: vec![],
-            parse_projectiles: false,
-            parse_grenades: false,
-            only_header: true,
-            list_props: false,
-            only_convars: false,
-            huffman_lookup_table: &self.huf,
-            order_by_steamid: false,
-            fallback_bytes: None,
-        };
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
-        let output = match parser.parse_demo(&self.mmap) {
-            Ok(output) => output,
-            Err(e) => return Err(Exception::new_err(format!("{e}"))),
-        };
+        let output = self.end_of_match_data(py)?;
 
         let def_idx_vec: Vec<Option<u32>> = output.skins.iter().map(|s| s.def_index).collect();
         let item_id: Vec<Option<u64>> = output.skins.iter().map(|s| s.item_id).collect();
@@ -531,16 +841,29 @@ impl DemoParser {
         })
     }
 
-    #[pyo3(signature = (event_name, *, player=None, other=None))]
+    #[pyo3(signature = (event_name, *, player=None, other=None, columns=None))]
     pub fn parse_event(
         &self,
         py: Python<'_>,
         event_name: String,
         player: Option<Vec<String>>,
         other: Option<Vec<String>>,
+        columns: Option<Vec<String>>,
     ) -> PyResult<Py<PyAny>> {
         let wanted_player_props = player.unwrap_or_default();
         let wanted_other_props = other.unwrap_or_default();
+        let mut query_key = QueryKey::new("parse_event")
+            .field("event_name", &event_name)
+            .set("player", &wanted_player_props)
+            .set("other", &wanted_other_props);
+        // No columns (all) and columns=[] (only tick) are different queries
+        if let Some(columns) = &columns {
+            query_key = query_key.set("columns", columns);
+        }
+        let cache_key = self.cache_key(query_key);
+        if let Some(df) = self.cache_get(py, &cache_key)? {
+            return Ok(df);
+        }
 
         let real_player_props = rm_user_friendly_names(&wanted_player_props);
         let real_other_props = rm_user_friendly_names(&wanted_other_props);
@@ -579,32 +902,51 @@ impl DemoParser {
             huffman_lookup_table: &self.huf,
             order_by_steamid: false,
             fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: columns,
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
         };
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
+        let mut parser = self.new_parser(settings);
         let output = match parser.parse_demo(&self.mmap) {
             Ok(output) => output,
+            Err(DemoParserError::UnknownEventColumn(column)) => return Err(PyValueError::new_err(format!("Unknown event column: {column}"))),
             Err(e) => return Err(Exception::new_err(format!("{e}"))),
         };
         let event_series = match series_from_event(&output.game_events, py) {
             Ok(ser) => ser,
             Err(_e) => return Ok(PyList::empty_bound(py).into()),
         };
+        self.cache_put(py, &cache_key, &event_series);
         Ok(event_series)
     }
 
-    #[pyo3(signature = (event_name, *, player=None, other=None))]
+    /// With snapshot_props returns (events, snapshots): snapshots has the snapshot_props of every
+    /// player at the moment each event fired, joined to the events by "event_index".
+    #[pyo3(signature = (event_name, *, player=None, other=None, snapshot_props=None, columns=None))]
     pub fn parse_events(
         &self,
         py: Python<'_>,
         event_name: Vec<String>,
         player: Option<Vec<String>>,
         other: Option<Vec<String>>,
+        snapshot_props: Option<Vec<String>>,
+        columns: Option<Vec<String>>,
     ) -> PyResult<Py<PyAny>> {
         let wanted_player_props = player.unwrap_or_default();
         let wanted_other_props = other.unwrap_or_default();
+        let wanted_snapshot_props = snapshot_props.clone().unwrap_or_default();
 
         let real_player_props = rm_user_friendly_names(&wanted_player_props);
         let real_other_props = rm_user_friendly_names(&wanted_other_props);
+        let real_snapshot_props = match rm_user_friendly_names(&wanted_snapshot_props) {
+            Ok(real_props) => real_props,
+            Err(e) => return Err(PyValueError::new_err(format!("{e}"))),
+        };
 
         let real_player_props = match real_player_props {
             Ok(real_props) => real_props,
@@ -622,6 +964,9 @@ impl DemoParser {
         for (real_name, user_friendly_name) in real_other_props.iter().zip(&wanted_other_props) {
             real_name_to_og_name.insert(real_name.clone(), user_friendly_name.clone());
         }
+        for (real_name, user_friendly_name) in real_snapshot_props.iter().zip(&wanted_snapshot_props) {
+            real_name_to_og_name.insert(real_name.clone(), user_friendly_name.clone());
+        }
 
         let settings = ParserInputs {
             real_name_to_og_name,
@@ -640,17 +985,31 @@ impl DemoParser {
             huffman_lookup_table: &self.huf,
             order_by_steamid: false,
             fallback_bytes: None,
+            event_snapshot_props: real_snapshot_props,
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: columns,
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
         };
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
+        let mut parser = self.new_parser(settings);
         let output = match parser.parse_demo(&self.mmap) {
             Ok(output) => output,
+            Err(DemoParserError::UnknownEventColumn(column)) => return Err(PyValueError::new_err(format!("Unknown event column: {column}"))),
             Err(e) => return Err(Exception::new_err(format!("{e}"))),
         };
         let event_series = match series_from_multiple_events(&output.game_events, py) {
             Ok(ser) => ser,
             Err(e) => return Err(Exception::new_err(format!("{e}"))),
         };
-        Ok(event_series)
+        if snapshot_props.is_none() {
+            return Ok(event_series);
+        }
+        let pyarrow = py.import_bound("pyarrow")?;
+        let snapshots = prop_columns_to_table(py, &pyarrow, &output.prop_controller.prop_infos, &output.event_snapshots)?;
+        Ok((event_series, snapshots.call_method0("to_pandas")?).to_object(py))
     }
     #[cfg(feature = "voice")]
     pub fn parse_voice(&self, py: Python<'_>) -> PyResult<Py<PyAny>> {
@@ -671,8 +1030,16 @@ impl DemoParser {
             huffman_lookup_table: &vec![],
             order_by_steamid: false,
             fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
         };
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
+        let mut parser = self.new_parser(settings);
         let output = match parser.parse_demo(&self.mmap) {
             Ok(output) => output,
             Err(e) => return Err(PyValueError::new_err(format!("{e}"))),
@@ -686,193 +1053,646 @@ impl DemoParser {
         Ok(out_hm.to_object(py))
     }
 
-    #[pyo3(signature = (wanted_props, *, players=None, ticks=None, prop_states=None))]
-    pub fn parse_ticks(
+    /// Estimates the size of parse_ticks() output without parsing any ticks.
+    /// Returns a dict with "rows" and "bytes". Bytes is the size of the parsed columns
+    /// before they are converted into a DataFrame.
+    #[pyo3(signature = (wanted_props, *, players=None, ticks=None))]
+    pub fn estimate(
         &self,
         py: Python,
         wanted_props: Vec<String>,
         players: Option<Vec<u64>>,
         ticks: Option<Vec<i32>>,
-        prop_states: Option<Vec<WantedPropState>>,
     ) -> PyResult<PyObject> {
-        let wanted_players = players.unwrap_or_default();
-        let wanted_ticks = ticks.unwrap_or_default();
-        let wanted_prop_states = prop_states
-            .unwrap_or_default()
-            .into_iter()
-            .map(|prop| (prop.prop, prop.state.0))
-            .collect();
-
-        let real_props = rm_user_friendly_names(&wanted_props);
-        let real_wanted_prop_states = rm_map_user_friendly_names(&wanted_prop_states);
-
-        let real_props = match real_props {
-            Ok(real_props) => real_props,
+        let settings = self.tick_query_settings(&wanted_props, players, ticks, None)?;
+        let mut parser = self.new_parser(settings);
+        let estimate = match parser.estimate(&self.mmap) {
+            Ok(estimate) => estimate,
             Err(e) => return Err(Exception::new_err(format!("{e}"))),
         };
-        let real_wanted_prop_states = match real_wanted_prop_states {
-            Ok(real_wanted_prop_states) => real_wanted_prop_states,
+        let dict = PyDict::new_bound(py);
+        dict.set_item("rows", estimate.rows)?;
+        dict.set_item("bytes", estimate.bytes)?;
+        Ok(dict.to_object(py))
+    }
+
+    /// State of all player, team, rules, C4 and projectile entities at the end of the given tick.
+    /// Only the part of the demo from the last fullpacket before the tick is parsed.
+    /// Returns {"tick": tick, "entities": [{"entity_id", "class_name", "props": {name: value}}]}.
+    pub fn snapshot(&self, py: Python, tick: i32) -> PyResult<PyObject> {
+        let settings = self.tick_query_settings(&vec![], None, None, None)?;
+        let mut parser = self.new_parser(settings);
+        let snapshot = match parser.snapshot(&self.mmap, tick) {
+            Ok(snapshot) => snapshot,
             Err(e) => return Err(Exception::new_err(format!("{e}"))),
         };
+        let mut entities = vec![];
+        for entity in &snapshot.entities {
+            let props = PyDict::new_bound(py);
+            for (name, value) in &entity.props {
+                props.set_item(name, variant_to_py(py, value)?)?;
+            }
+            let dict = PyDict::new_bound(py);
+            dict.set_item("entity_id", entity.entity_id)?;
+            dict.set_item("class_name", &entity.class_name)?;
+            dict.set_item("props", props)?;
+            entities.push(dict);
+        }
+        let dict = PyDict::new_bound(py);
+        dict.set_item("tick", snapshot.tick)?;
+        dict.set_item("entities", entities)?;
+        Ok(dict.to_object(py))
+    }
 
-        let arc_huf = Arc::new(&self.huf);
-        let mut real_name_to_og_name = AHashMap::default();
-        for (real_name, user_friendly_name) in real_props.iter().zip(&wanted_props) {
-            real_name_to_og_name.insert(real_name.clone(), user_friendly_name.clone());
+    /// Cursor that keeps the parser state between calls, for moving around the demo with
+    /// seek() and step() and reading wanted_props at the current tick with read().
+    #[pyo3(signature = (wanted_props, *, players=None))]
+    pub fn cursor(
+        &self,
+        py: Python,
+        wanted_props: Vec<String>,
+        players: Option<Vec<u64>>,
+    ) -> PyResult<PyCursor> {
+        let settings = self.tick_query_settings(&wanted_props, players, None, None)?;
+        let (props, real_name_to_og_name, players) = (
+            settings.wanted_player_props,
+            settings.real_name_to_og_name,
+            settings.wanted_players,
+        );
+        let mmap = self.mmap.clone();
+        match py.allow_threads(|| Cursor::new(mmap, props, real_name_to_og_name, players)) {
+            Ok(cursor) => Ok(PyCursor { cursor }),
+            Err(e) => Err(Exception::new_err(format!("{e}"))),
         }
-        for (real_name, user_friendly_name) in real_wanted_prop_states
-            .keys()
-            .zip(wanted_prop_states.keys())
-        {
-            real_name_to_og_name.insert(real_name.clone(), user_friendly_name.clone());
+    }
+
+    /// Same as parse_ticks but the output is written to Arrow IPC files in spill_dir while parsing,
+    /// one file per window of max_inflight_chunks chunks, so the result never has to fit in memory.
+    /// Single threaded parses (parsing_mode or a NON_MULTITHREADABLE_PROPS prop) are one window.
+    /// Returns a pyarrow dataset over the files. A temporary directory is used if spill_dir is None,
+    /// it is removed when the dataset is garbage collected. The files are removed if the parse fails.
+    #[pyo3(signature = (wanted_props, *, players=None, ticks=None, spill_dir=None))]
+    pub fn parse_ticks_to_dataset(
+        &self,
+        py: Python,
+        wanted_props: Vec<String>,
+        players: Option<Vec<u64>>,
+        ticks: Option<Vec<i32>>,
+        spill_dir: Option<String>,
+    ) -> PyResult<PyObject> {
+        let pyarrow = py.import_bound("pyarrow")?;
+        let (spill_dir, is_temp_dir) = match spill_dir {
+            Some(dir) => {
+                std::fs::create_dir_all(&dir)?;
+                (std::fs::canonicalize(&dir)?.to_string_lossy().to_string(), false)
+            }
+            None => {
+                let kwargs = vec![("prefix", "demoparser2_")].into_py_dict_bound(py);
+                let dir = py
+                    .import_bound("tempfile")?
+                    .call_method("mkdtemp", (), Some(&kwargs))?
+                    .extract::<String>()?;
+                (dir, true)
+            }
+        };
+        let settings = self.tick_query_settings(&wanted_props, players, ticks, None)?;
+        let mut parser = self.new_parser(settings);
+        let max_inflight_chunks = self.max_inflight_chunks.unwrap_or_else(|| {
+            std::thread::available_parallelism()
+                .map(|n| n.get())
+                .unwrap_or(8)
+        });
+
+        let mut paths = vec![];
+        let mut schemas = vec![];
+        let mut sink_error = None;
+        let result = parser.parse_demo_to_sink(&self.mmap, max_inflight_chunks, |output| {
+            let path = std::path::Path::new(&spill_dir)
+                .join(format!("part-{:05}.arrow", paths.len()))
+                .to_string_lossy()
+                .to_string();
+            match write_ipc_part(py, &pyarrow, &output, &path) {
+                Ok(schema) => {
+                    schemas.push(schema);
+                    paths.push(path);
+                    Ok(())
+                }
+                Err(e) => {
+                    let msg = e.to_string();
+                    sink_error = Some(e);
+                    Err(DemoParserError::SinkFailed(msg))
+                }
+            }
+        });
+        let err = match (sink_error, result) {
+            (Some(e), _) => Some(e),
+            (None, Err(e)) => Some(Exception::new_err(format!("{e}"))),
+            (None, Ok(())) => None,
+        };
+        if let Some(e) = err {
+            remove_spill_parts(&paths, &spill_dir, is_temp_dir);
+            return Err(e);
+        }
+        match spill_parts_to_dataset(py, &pyarrow, paths.clone(), schemas) {
+            Ok(dataset) => {
+                if is_temp_dir {
+                    // The files are mmapped by the dataset so the directory lives as long as it does
+                    let shutil = py.import_bound("shutil")?;
+                    py.import_bound("weakref")?
+                        .call_method1("finalize", (dataset.bind(py), shutil.getattr("rmtree")?, &spill_dir, true))?;
+                }
+                Ok(dataset)
+            }
+            Err(e) => {
+                remove_spill_parts(&paths, &spill_dir, is_temp_dir);
+                Err(e)
+            }
         }
+    }
 
-        let settings = ParserInputs {
-            real_name_to_og_name,
-            wanted_players,
-            wanted_player_props: real_props,
-            wanted_other_props: vec![],
-            wanted_events: vec![],
-            wanted_prop_states: real_wanted_prop_states,
-            parse_ents: true,
-            wanted_ticks,
-            parse_projectiles: false,
-            parse_grenades: false,
-            only_header: true,
-            list_props: false,
-            only_convars: false,
-            huffman_lookup_table: &arc_huf,
-            order_by_steamid: false,
-            fallback_bytes: None,
+    #[pyo3(signature = (wanted_props, *, players=None, ticks=None, prop_states=None, mode="full", predicate=None, predicate_scope="player", every_n_ticks=None, hz=None))]
+    pub fn parse_ticks(
+        &self,
+        py: Python,
+        wanted_props: Vec<String>,
+        players: Option<Vec<u64>>,
+        ticks: Option<Vec<i32>>,
+        prop_states: Option<Vec<WantedPropState>>,
+        mode: &str,
+        predicate: Option<PyPredicate>,
+        predicate_scope: &str,
+        every_n_ticks: Option<i32>,
+        hz: Option<f64>,
+    ) -> PyResult<PyObject> {
+        let tick_output_mode = tick_output_mode_from_str(mode)?;
+        let every_n_ticks = tick_step(every_n_ticks, hz)?;
+        let predicate = match predicate {
+            Some(predicate) => Some(predicate_filter(predicate.0, predicate_scope)?),
+            None => None,
         };
-        let mut parser = Parser::new(settings, parser::parse_demo::ParsingMode::Normal);
+        let cache_key = self.cache_key(
+            QueryKey::new("parse_ticks")
+                .field("props", wanted_props.join(","))
+                .field("mode", mode)
+                .set("players", players.as_deref().unwrap_or_default())
+                .set("ticks", ticks.as_deref().unwrap_or_default())
+                .set(
+                    "prop_states",
+                    &prop_states
+                        .iter()
+                        .flatten()
+                        .map(|p| format!("{}={:?}", p.prop, p.state.0))
+                        .collect_vec(),
+                )
+                .field("predicate", format!("{predicate:?}"))
+                .field("every_n_ticks", every_n_ticks.unwrap_or(1)),
+        );
+        if let Some(df) = self.cache_get(py, &cache_key)? {
+            return Ok(df);
+        }
+        let mut settings = self.tick_query_settings(&wanted_props, players, ticks, prop_states)?;
+        settings.predicate = predicate;
+        settings.every_n_ticks = every_n_ticks;
+        settings.tick_output_mode = tick_output_mode;
+        let mut parser = self.new_parser(settings);
         let output = match parser.parse_demo(&self.mmap) {
             Ok(output) => output,
+            Err(DemoParserError::MemoryLimitExceeded(msg)) => return Err(PyMemoryError::new_err(msg)),
+            Err(DemoParserError::UnknownPropName(prop)) => return Err(PyValueError::new_err(format!("Unknown prop in predicate: {prop}"))),
             Err(e) => return Err(Exception::new_err(format!("{e}"))),
         };
-        let mut all_series = vec![];
-        let mut all_pyobjects = vec![];
-        let prop_infos = output.prop_controller.prop_infos;
-        let mut df_column_names_arrow = vec![];
-        let mut df_column_names_py = vec![];
+        let pandas_df = ticks_to_df(py, output.prop_controller.prop_infos, &output.df)?;
+        self.cache_put(py, &cache_key, &pandas_df);
+        Ok(pandas_df)
+    }
 
-        for prop_info in prop_infos {
-            if output.df.contains_key(&prop_info.id) {
-                match &output.df[&prop_info.id].data {
-                    Some(VarVec::F32(data)) => {
-                        df_column_names_arrow.push(prop_info.prop_friendly_name);
-                        all_series.push(arr_to_py(Box::new(Float32Array::from(data)))?);
-                    }
-                    Some(VarVec::I32(data)) => {
-                        df_column_names_arrow.push(prop_info.prop_friendly_name);
-                        all_series.push(arr_to_py(Box::new(Int32Array::from(data)))?);
-                    }
-                    Some(VarVec::U64(data)) => {
-                        df_column_names_arrow.push(prop_info.prop_friendly_name);
-                        all_series.push(arr_to_py(Box::new(UInt64Array::from(data)))?);
-                    }
-                    Some(VarVec::U32(data)) => {
-                        df_column_names_arrow.push(prop_info.prop_friendly_name);
-                        all_series.push(arr_to_py(Box::new(UInt32Array::from(data)))?);
-                    }
-                    Some(VarVec::Bool(data)) => {
-                        df_column_names_arrow.push(prop_info.prop_friendly_name);
-                        all_series.push(arr_to_py(Box::new(BooleanArray::from(data)))?);
-                    }
-                    Some(VarVec::String(data)) => {
-                        df_column_names_arrow.push(prop_info.prop_friendly_name.clone());
-                        let s = Series::new(&prop_info.prop_friendly_name.clone(), data);
-                        let py_series = rust_series_to_py_series(&s)?;
-                        all_series.push(py_series);
-                    }
-                    Some(VarVec::StringVec(data)) => {
-                        df_column_names_py.push(prop_info.prop_friendly_name);
-                        all_pyobjects.push(data.to_object(py));
-                    }
-                    Some(VarVec::U64Vec(data)) => {
-                        df_column_names_py.push(prop_info.prop_friendly_name);
-                        all_pyobjects.push(data.to_object(py));
-                    }
-                    Some(VarVec::XYZVec(data)) => {
-                        df_column_names_py.push(prop_info.prop_friendly_name);
-                        all_pyobjects.push(data.to_object(py));
-                    }
-                    Some(VarVec::U32Vec(data)) => {
-                        df_column_names_py.push(prop_info.prop_friendly_name);
-                        all_pyobjects.push(data.to_object(py));
-                    }
+    /// Runs a Query on this demo, see Query.
+    pub fn run(&self, py: Python, query: PyRef<'_, PyQuery>) -> PyResult<PyObject> {
+        // Only DataFrames are cached so event queries always parse
+        let cache_key = match query.events.is_empty() {
+            true => self.cache_key(QueryKey::new("run").field("query", query.key())),
+            false => None,
+        };
+        if let Some(df) = self.cache_get(py, &cache_key)? {
+            return Ok(df);
+        }
+        let mut parser = self.new_parser(query.parser_inputs(&self.huf));
+        let output = match parser.parse_demo(&self.mmap) {
+            Ok(output) => output,
+            Err(DemoParserError::MemoryLimitExceeded(msg)) => return Err(PyMemoryError::new_err(msg)),
+            Err(DemoParserError::UnknownPropName(prop)) => return Err(PyValueError::new_err(format!("Unknown prop in predicate: {prop}"))),
+            Err(DemoParserError::UnknownEventColumn(column)) => return Err(PyValueError::new_err(format!("Unknown event column: {column}"))),
+            Err(e) => return Err(Exception::new_err(format!("{e}"))),
+        };
+        let out = query.output_to_py(py, output)?;
+        self.cache_put(py, &cache_key, &out);
+        Ok(out)
+    }
 
-                    Some(VarVec::Stickers(data)) => {
-                        let mut dicts = vec![];
-                        for weapon in data {
-                            let mut v = vec![];
-                            for sticker in weapon {
-                                let dict = PyDict::new_bound(py);
-                                dict.set_item("id", sticker.id.to_object(py))?;
-                                dict.set_item("name", sticker.name.to_object(py))?;
-                                dict.set_item("wear", sticker.wear.to_object(py))?;
-                                dict.set_item("x", sticker.x.to_object(py))?;
-                                dict.set_item("y", sticker.y.to_object(py))?;
-                                v.push(dict);
-                            }
-                            dicts.push(v);
-                        }
-                        df_column_names_py.push(prop_info.prop_friendly_name);
-                        all_pyobjects.push(dicts.to_object(py));
-                    }
+    /// Same as parse_ticks but without repeated values. Returns a dict of DataFrames:
+    /// "players" (player_key, steamid, name, one row per steamid and name), "player_ticks" (tick,
+    /// player_key and player props), "rules" (one row per tick) and "teams" (one row per team per tick).
+    #[pyo3(signature = (wanted_props, *, players=None, ticks=None, prop_states=None))]
+    pub fn parse_ticks_normalized(
+        &self,
+        py: Python,
+        wanted_props: Vec<String>,
+        players: Option<Vec<u64>>,
+        ticks: Option<Vec<i32>>,
+        prop_states: Option<Vec<WantedPropState>>,
+    ) -> PyResult<PyObject> {
+        let mut settings = self.tick_query_settings(&wanted_props, players, ticks, prop_states)?;
+        // Team props are per team, the teams table needs to know which team a row belongs to
+        let has_team_props = settings.wanted_player_props.iter().any(|p| p.starts_with("CCSTeam."));
+        if has_team_props && !settings.wanted_player_props.iter().any(|p| p == TEAM_NUM_PROP) {
+            settings.wanted_player_props.push(TEAM_NUM_PROP.to_string());
+            settings.real_name_to_og_name.insert(TEAM_NUM_PROP.to_string(), "team_num".to_string());
+        }
+        settings.normalize_ticks = true;
+        let mut parser = self.new_parser(settings);
+        let output = match parser.parse_demo(&self.mmap) {
+            Ok(output) => output,
+            Err(DemoParserError::MemoryLimitExceeded(msg)) => return Err(PyMemoryError::new_err(msg)),
+            Err(e) => return Err(Exception::new_err(format!("{e}"))),
+        };
+        let normalized = normalize_output(output.df, output.rules_df, output.teams_df, &output.prop_controller.prop_infos);
+        let pyarrow = py.import_bound("pyarrow")?;
+        let tables = PyDict::new_bound(py);
+        for (name, table) in [
+            ("players", &normalized.players),
+            ("player_ticks", &normalized.player_ticks),
+            ("rules", &normalized.rules),
+            ("teams", &normalized.teams),
+        ] {
+            let table = prop_columns_to_table(py, &pyarrow, &table.prop_infos, &table.df)?;
+            tables.set_item(name, table.call_method0("to_pandas")?)?;
+        }
+        Ok(tables.to_object(py))
+    }
 
-                    Some(VarVec::InputHistory(data)) => {
-                        let mut dicts = vec![];
-                        for input in data {
-                            let mut v = vec![];
-                            for sticker in input {
-                                let dict = PyDict::new_bound(py);
-                                dict.set_item("x", sticker.x.to_object(py))?;
-                                dict.set_item("y", sticker.y.to_object(py))?;
-                                dict.set_item("z", sticker.z.to_object(py))?;
-                                dict.set_item(
-                                    "render_tick_count",
-                                    sticker.render_tick_count.to_object(py),
-                                )?;
-                                dict.set_item(
-                                    "render_tick_fraction",
-                                    sticker.render_tick_fraction.to_object(py),
-                                )?;
-                                dict.set_item(
-                                    "player_tick_count",
-                                    sticker.player_tick_count.to_object(py),
-                                )?;
-                                dict.set_item(
-                                    "player_tick_fraction",
-                                    sticker.player_tick_fraction.to_object(py),
-                                )?;
-                                v.push(dict);
-                            }
-                            dicts.push(v);
-                        }
-                        df_column_names_py.push(prop_info.prop_friendly_name);
-                        all_pyobjects.push(dicts.to_object(py));
-                    }
-                    _ => {}
+    /// Wanted props as a numpy array shaped [ticks, player slots, props] for feeding models.
+    /// Returns {"data", "mask", "ticks", "steamids", "names", "props"}: mask[tick, slot] is False when
+    /// the player has no row at that tick, steamids/names belong to the slots and missing values are NaN.
+    /// There is a slot per steamid for every player of the demo (or of "players") and a tick for
+    /// every one of "ticks", also those without rows.
+    #[pyo3(signature = (wanted_props, *, players=None, ticks=None, dtype="float32"))]
+    pub fn parse_tensor(
+        &self,
+        py: Python,
+        wanted_props: Vec<String>,
+        players: Option<Vec<u64>>,
+        ticks: Option<Vec<i32>>,
+        dtype: &str,
+    ) -> PyResult<PyObject> {
+        let tensor_dtype = tensor_dtype_from_str(dtype)?;
+        let wanted_players = players.clone().unwrap_or_default();
+        let wanted_ticks = ticks.clone().unwrap_or_default();
+        let mut settings = self.tick_query_settings(&wanted_props, players, ticks, None)?;
+        // The rows are written as tensor rows while parsing, the long format df is never built
+        settings.tensor = Some(TensorSettings {
+            props: wanted_props.clone(),
+            dtype: tensor_dtype,
+        });
+        let mut parser = self.new_parser(settings);
+        let mut output = match parser.parse_demo(&self.mmap) {
+            Ok(output) => output,
+            Err(DemoParserError::MemoryLimitExceeded(msg)) => return Err(PyMemoryError::new_err(msg)),
+            Err(e @ DemoParserError::NonNumericProp(_)) => return Err(PyValueError::new_err(format!("{e}"))),
+            Err(e) => return Err(Exception::new_err(format!("{e}"))),
+        };
+        let slot_players = match wanted_players.is_empty() {
+            true => output.players.clone(),
+            false => output.players.iter().filter(|player| wanted_players.contains(&player.steamid)).cloned().collect(),
+        };
+        let tensor = to_tensor(std::mem::take(&mut output.tensor_rows), &wanted_props, &slot_players, &wanted_ticks, tensor_dtype);
+        drop(output);
+        let numpy = py.import_bound("numpy")?;
+        let shape = (tensor.ticks.len(), tensor.steamids.len(), tensor.props.len());
+        // The arrays use the buffers of the tensor, nothing is copied
+        let data = numpy
+            .call_method1("frombuffer", (Py::new(py, TensorBuffer { data: tensor.data })?, dtype))?
+            .call_method1("reshape", (shape,))?;
+        let mask = tensor.mask.into_iter().map(|x| x as u8).collect_vec();
+        let mask = numpy
+            .call_method1("frombuffer", (Py::new(py, TensorBuffer { data: mask })?, "bool"))?
+            .call_method1("reshape", ((shape.0, shape.1),))?;
+        let dict = PyDict::new_bound(py);
+        dict.set_item("data", data)?;
+        dict.set_item("mask", mask)?;
+        dict.set_item("ticks", numpy.call_method1("array", (tensor.ticks, "int32"))?)?;
+        dict.set_item("steamids", numpy.call_method1("array", (tensor.steamids, "uint64"))?)?;
+        dict.set_item("names", tensor.names)?;
+        dict.set_item("props", tensor.props)?;
+        Ok(dict.to_object(py))
+    }
+
+    /// Props of the ticks from "before" ticks before to "after" ticks after every event, with an
+    /// "event_index" column pointing at the row of the event in parse_event output.
+    /// "players" picks the players of the event by prefix ("attacker", ["user", "attacker"]),
+    /// None means every player.
+    #[pyo3(signature = (event_name, props, *, before=0, after=0, players=None))]
+    pub fn parse_event_windows(
+        &self,
+        py: Python,
+        event_name: String,
+        props: Vec<String>,
+        before: i32,
+        after: i32,
+        players: Option<&Bound<PyAny>>,
+    ) -> PyResult<PyObject> {
+        if before < 0 || after < 0 {
+            return Err(PyValueError::new_err("before and after must not be negative"));
+        }
+        let player_prefixes: Vec<String> = match players {
+            Some(players) => match players.extract::<String>() {
+                Ok(prefix) => vec![prefix],
+                Err(_) => players.extract()?,
+            },
+            None => vec![],
+        };
+        // One pass over the demo: the props are collected like event snapshots, but for every tick
+        // of the window around each event (see event_windows.rs). Always single threaded.
+        let mut settings = self.tick_query_settings(&props, None, None, None)?;
+        settings.event_snapshot_props = std::mem::take(&mut settings.wanted_player_props);
+        settings.wanted_events = vec![event_name];
+        settings.event_window = Some(EventWindowSettings {
+            player_prefixes,
+            before,
+            after,
+        });
+        let mut parser = self.new_parser(settings);
+        let output = match parser.parse_demo(&self.mmap) {
+            Ok(output) => output,
+            Err(e) => return Err(Exception::new_err(format!("{e}"))),
+        };
+        let pyarrow = py.import_bound("pyarrow")?;
+        let table = prop_columns_to_table(py, &pyarrow, &output.prop_controller.prop_infos, &output.event_snapshots)?;
+        Ok(table.call_method0("to_pandas")?.to_object(py))
+    }
+
+    /// Hit/miss statistics of the result caches. Empty if no cache is enabled.
+    pub fn cache_stats(&self, py: Python) -> PyResult<PyObject> {
+        let stats = PyDict::new_bound(py);
+        if let Some(cache) = &self.memory_cache {
+            stats.set_item("memory", cache.stats(py)?)?;
+        }
+        if let Some(cache) = &self.disk_cache {
+            stats.set_item("disk", cache.stats(py)?)?;
+        }
+        Ok(stats.to_object(py))
+    }
+}
+
+// parse_ticks output as a pandas DataFrame with the columns sorted by name
+fn ticks_to_df(py: Python, prop_infos: Vec<PropInfo>, df: &AHashMap<u32, PropColumn>) -> PyResult<PyObject> {
+    let mut all_series = vec![];
+    let mut all_pyobjects = vec![];
+    let mut df_column_names_arrow = vec![];
+    let mut df_column_names_py = vec![];
+
+    for prop_info in prop_infos {
+        if df.contains_key(&prop_info.id) {
+            match &df[&prop_info.id].data {
+                Some(VarVec::F32(data)) => {
+                    df_column_names_arrow.push(prop_info.prop_friendly_name);
+                    all_series.push(arr_to_py(Box::new(Float32Array::from(data)))?);
+                }
+                Some(VarVec::I32(data)) => {
+                    df_column_names_arrow.push(prop_info.prop_friendly_name);
+                    all_series.push(arr_to_py(Box::new(Int32Array::from(data)))?);
+                }
+                Some(VarVec::U64(data)) => {
+                    df_column_names_arrow.push(prop_info.prop_friendly_name);
+                    all_series.push(arr_to_py(Box::new(UInt64Array::from(data)))?);
+                }
+                Some(VarVec::U32(data)) => {
+                    df_column_names_arrow.push(prop_info.prop_friendly_name);
+                    all_series.push(arr_to_py(Box::new(UInt32Array::from(data)))?);
+                }
+                Some(VarVec::Bool(data)) => {
+                    df_column_names_arrow.push(prop_info.prop_friendly_name);
+                    all_series.push(arr_to_py(Box::new(BooleanArray::from(data)))?);
+                }
+                Some(VarVec::String(data)) => {
+                    df_column_names_arrow.push(prop_info.prop_friendly_name.clone());
+                    let s = Series::new(&prop_info.prop_friendly_name.clone(), data);
+                    let py_series = rust_series_to_py_series(&s)?;
+                    all_series.push(py_series);
+                }
+                Some(VarVec::StringVec(data)) => {
+                    df_column_names_py.push(prop_info.prop_friendly_name);
+                    all_pyobjects.push(data.to_object(py));
+                }
+                Some(VarVec::U64Vec(data)) => {
+                    df_column_names_py.push(prop_info.prop_friendly_name);
+                    all_pyobjects.push(data.to_object(py));
+                }
+                Some(VarVec::XYZVec(data)) => {
+                    df_column_names_py.push(prop_info.prop_friendly_name);
+                    all_pyobjects.push(data.to_object(py));
                 }
+                Some(VarVec::U32Vec(data)) => {
+                    df_column_names_py.push(prop_info.prop_friendly_name);
+                    all_pyobjects.push(data.to_object(py));
+                }
+
+                Some(VarVec::Stickers(data)) => {
+                    df_column_names_py.push(prop_info.prop_friendly_name);
+                    all_pyobjects.push(stickers_to_py(py, data)?);
+                }
+
+                Some(VarVec::InputHistory(data)) => {
+                    df_column_names_py.push(prop_info.prop_friendly_name);
+                    all_pyobjects.push(input_history_to_py(py, data)?);
+                }
+                _ => {}
             }
         }
-        Python::with_gil(|py| {
-            let polars = py.import_bound("polars")?;
-            let all_series_py = all_series.to_object(py);
-            let df = polars.call_method1("DataFrame", (all_series_py,))?;
-            df.setattr("columns", df_column_names_arrow.to_object(py))?;
-            let pandas_df = df.call_method0("to_pandas")?;
-            for (pyobj, col_name) in all_pyobjects.iter().zip(&df_column_names_py) {
-                pandas_df.call_method1("insert", (0, col_name, pyobj))?;
+    }
+    Python::with_gil(|py| {
+        let polars = py.import_bound("polars")?;
+        let all_series_py = all_series.to_object(py);
+        let df = polars.call_method1("DataFrame", (all_series_py,))?;
+        df.setattr("columns", df_column_names_arrow.to_object(py))?;
+        let pandas_df = df.call_method0("to_pandas")?;
+        for (pyobj, col_name) in all_pyobjects.iter().zip(&df_column_names_py) {
+            pandas_df.call_method1("insert", (0, col_name, pyobj))?;
+        }
+        df_column_names_arrow.extend(df_column_names_py);
+        df_column_names_arrow.sort();
+        let kwargs = vec![("axis", 1)].into_py_dict_bound(py);
+        let args = (df_column_names_arrow,);
+        pandas_df.call_method("reindex", args, Some(&kwargs))?;
+        Ok(pandas_df.to_object(py))
+    })
+}
+
+fn stickers_to_py(py: Python, data: &[Vec<Sticker>]) -> PyResult<PyObject> {
+    let mut dicts = vec![];
+    for weapon in data {
+        let mut v = vec![];
+        for sticker in weapon {
+            let dict = PyDict::new_bound(py);
+            dict.set_item("id", sticker.id.to_object(py))?;
+            dict.set_item("name", sticker.name.to_object(py))?;
+            dict.set_item("wear", sticker.wear.to_object(py))?;
+            dict.set_item("x", sticker.x.to_object(py))?;
+            dict.set_item("y", sticker.y.to_object(py))?;
+            v.push(dict);
+        }
+        dicts.push(v);
+    }
+    Ok(dicts.to_object(py))
+}
+
+fn input_history_to_py(py: Python, data: &[Vec<InputHistory>]) -> PyResult<PyObject> {
+    let mut dicts = vec![];
+    for input in data {
+        let mut v = vec![];
+        for history in input {
+            let dict = PyDict::new_bound(py);
+            dict.set_item("x", history.x.to_object(py))?;
+            dict.set_item("y", history.y.to_object(py))?;
+            dict.set_item("z", history.z.to_object(py))?;
+            dict.set_item(
+                "render_tick_count",
+                history.render_tick_count.to_object(py),
+            )?;
+            dict.set_item(
+                "render_tick_fraction",
+                history.render_tick_fraction.to_object(py),
+            )?;
+            dict.set_item(
+                "player_tick_count",
+                history.player_tick_count.to_object(py),
+            )?;
+            dict.set_item(
+                "player_tick_fraction",
+                history.player_tick_fraction.to_object(py),
+            )?;
+            v.push(dict);
+        }
+        dicts.push(v);
+    }
+    Ok(dicts.to_object(py))
+}
+
+fn variant_to_py(py: Python, value: &Variant) -> PyResult<PyObject> {
+    Ok(match value {
+        Variant::Bool(v) => v.to_object(py),
+        Variant::U32(v) => v.to_object(py),
+        Variant::I32(v) => v.to_object(py),
+        Variant::F32(v) => v.to_object(py),
+        Variant::U64(v) => v.to_object(py),
+        Variant::String(v) => v.to_object(py),
+        Variant::VecXY(v) => v.to_object(py),
+        Variant::VecXYZ(v) => v.to_object(py),
+        Variant::StringVec(v) => v.to_object(py),
+        Variant::U32Vec(v) => v.to_object(py),
+        Variant::U64Vec(v) => v.to_object(py),
+        Variant::Stickers(v) => stickers_to_py(py, std::slice::from_ref(v))?.bind(py).get_item(0)?.to_object(py),
+        Variant::InputHistory(v) => input_history_to_py(py, std::slice::from_ref(v))?.bind(py).get_item(0)?.to_object(py),
+    })
+}
+
+// Converts one parsed column into a pyarrow array. Primitive columns are handed over trough the
+// C data interface without copying, list and struct columns go trough python objects.
+fn column_to_pyarrow(
+    py: Python,
+    pyarrow: &Bound<PyModule>,
+    column: &PropColumn,
+) -> PyResult<PyObject> {
+    let from_objects = |obj: PyObject| -> PyResult<PyObject> {
+        Ok(pyarrow.call_method1("array", (obj,))?.to_object(py))
+    };
+    match &column.data {
+        Some(VarVec::F32(data)) => to_py_array(py, pyarrow, Box::new(Float32Array::from(data))),
+        Some(VarVec::I32(data)) => to_py_array(py, pyarrow, Box::new(Int32Array::from(data))),
+        Some(VarVec::U64(data)) => to_py_array(py, pyarrow, Box::new(UInt64Array::from(data))),
+        Some(VarVec::U32(data)) => to_py_array(py, pyarrow, Box::new(UInt32Array::from(data))),
+        Some(VarVec::Bool(data)) => to_py_array(py, pyarrow, Box::new(BooleanArray::from(data))),
+        Some(VarVec::String(data)) => from_objects(data.to_object(py)),
+        Some(VarVec::StringVec(data)) => from_objects(data.to_object(py)),
+        Some(VarVec::U64Vec(data)) => from_objects(data.to_object(py)),
+        Some(VarVec::U32Vec(data)) => from_objects(data.to_object(py)),
+        Some(VarVec::XYVec(data)) => from_objects(data.to_object(py)),
+        Some(VarVec::XYZVec(data)) => from_objects(data.to_object(py)),
+        Some(VarVec::Stickers(data)) => from_objects(stickers_to_py(py, data)?),
+        Some(VarVec::InputHistory(data)) => from_objects(input_history_to_py(py, data)?),
+        // Column that only got None values in this part of the demo
+        None => Ok(pyarrow.call_method1("nulls", (column.num_nones,))?.to_object(py)),
+    }
+}
+
+// Columns named and ordered like the parse_ticks DataFrame
+fn prop_columns_to_table<'py>(
+    py: Python<'py>,
+    pyarrow: &Bound<'py, PyModule>,
+    prop_infos: &[PropInfo],
+    df: &AHashMap<u32, PropColumn>,
+) -> PyResult<Bound<'py, PyAny>> {
+    let mut columns = vec![];
+    for prop_info in prop_infos {
+        if let Some(column) = df.get(&prop_info.id) {
+            columns.push((prop_info.prop_friendly_name.clone(), column_to_pyarrow(py, pyarrow, column)?));
+        }
+    }
+    columns.sort_by(|a, b| a.0.cmp(&b.0));
+    let (names, arrays): (Vec<String>, Vec<PyObject>) = columns.into_iter().unzip();
+    pyarrow
+        .getattr("Table")?
+        .call_method1("from_arrays", (arrays, names))
+}
+
+// Writes one window of parse_ticks output as an uncompressed Arrow IPC file and returns its schema.
+// Uncompressed so pyarrow can memory map it when reading.
+fn write_ipc_part(
+    py: Python,
+    pyarrow: &Bound<PyModule>,
+    output: &DemoOutput,
+    path: &str,
+) -> PyResult<PyObject> {
+    let table = prop_columns_to_table(py, pyarrow, &output.prop_controller.prop_infos, &output.df)?;
+    let kwargs = vec![("compression", "uncompressed")].into_py_dict_bound(py);
+    py.import_bound("pyarrow.feather")?
+        .call_method("write_feather", (&table, path), Some(&kwargs))?;
+    Ok(table.getattr("schema")?.to_object(py))
+}
+
+fn spill_parts_to_dataset(
+    py: Python,
+    pyarrow: &Bound<PyModule>,
+    paths: Vec<String>,
+    schemas: Vec<PyObject>,
+) -> PyResult<PyObject> {
+    // Parts that only saw None for a prop have a null column, unifying gives them the real type
+    let schema = pyarrow.call_method1("unify_schemas", (schemas,))?;
+    let kwargs = PyDict::new_bound(py);
+    kwargs.set_item("format", "arrow")?;
+    kwargs.set_item("schema", schema)?;
+    let mmap_kwargs = vec![("use_mmap", true)].into_py_dict_bound(py);
+    let filesystem = py
+        .import_bound("pyarrow.fs")?
+        .getattr("LocalFileSystem")?
+        .call((), Some(&mmap_kwargs))?;
+    kwargs.set_item("filesystem", filesystem)?;
+    let dataset = py
+        .import_bound("pyarrow.dataset")?
+        .call_method("dataset", (paths,), Some(&kwargs))?;
+    Ok(dataset.to_object(py))
+}
+
+// Removes the parts of a failed parse, the whole directory if it was a temporary one
+fn remove_spill_parts(paths: &[String], spill_dir: &str, is_temp_dir: bool) {
+    match is_temp_dir {
+        true => {
+            let _ = std::fs::remove_dir_all(spill_dir);
+        }
+        false => {
+            for path in paths {
+                let _ = std::fs::remove_file(path);
             }
-            df_column_names_arrow.extend(df_column_names_py);
-            df_column_names_arrow.sort();
-            let kwargs = vec![("axis", 1)].into_py_dict_bound(py);
-            let args = (df_column_names_arrow,);
-            pandas_df.call_method("reindex", args, Some(&kwargs))?;
-            Ok(pandas_df.to_object(py))
-        })
+        }
     }
 }
 
@@ -934,8 +1754,287 @@ pub fn arr_to_py(array: Box<dyn Array>) -> PyResult<PyObject> {
 }
 #[pyclass]
 struct DemoParser {
-    mmap: Mmap,
+    mmap: Arc<Mmap>,
     huf: Vec<(u8, u8)>,
+    parsing_mode: ParsingMode,
+    target_chunk_bytes: Option<usize>,
+    max_inflight_chunks: Option<usize>,
+    memory_limit: Option<usize>,
+    disk_cache: Option<DiskCache>,
+    memory_cache: Option<MemoryCache>,
+    // Hash of the demo contents, only computed when the cache needs it
+    demo_hash: OnceLock<u64>,
+}
+
+impl DemoParser {
+    fn new_parser<'a>(&self, settings: ParserInputs<'a>) -> Parser<'a> {
+        let mut parser = Parser::new(settings, self.parsing_mode);
+        parser.target_chunk_bytes = self.target_chunk_bytes;
+        parser.max_inflight_chunks = self.max_inflight_chunks;
+        parser.memory_limit = self.memory_limit;
+        parser
+    }
+    // player_info, skins and item drops come from messages at the end of the demo.
+    // Try to find them from the end first and only parse the whole demo if that fails.
+    fn end_of_match_data(&self, py: Python) -> PyResult<EndOfMatchData> {
+        let demo_bytes: &[u8] = &self.mmap;
+        if let Ok(Some(data)) = py.allow_threads(|| scan_end_of_match(demo_bytes)) {
+            return Ok(data);
+        }
+        let settings = ParserInputs {
+            real_name_to_og_name: AHashMap::default(),
+            wanted_players: vec![],
+            wanted_player_props: vec![],
+            wanted_other_props: vec![],
+            wanted_prop_states: AHashMap::default(),
+            wanted_events: vec![],
+            parse_ents: false,
+            wanted_ticks: vec![],
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &self.huf,
+            order_by_steamid: false,
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        };
+        let mut parser = self.new_parser(settings);
+        let output = match parser.parse_demo(&self.mmap) {
+            Ok(output) => output,
+            Err(e) => return Err(Exception::new_err(format!("{e}"))),
+        };
+        Ok(EndOfMatchData {
+            player_md: output.player_md,
+            skins: output.skins,
+            item_drops: output.item_drops,
+        })
+    }
+    fn cache_key(&self, query: QueryKey) -> Option<String> {
+        if self.disk_cache.is_none() && self.memory_cache.is_none() {
+            return None;
+        }
+        let query = query.field("version", env!("CARGO_PKG_VERSION"));
+        // The memory cache belongs to this demo so only the disk cache needs the hash
+        match &self.disk_cache {
+            Some(_) => {
+                let demo_hash = self.demo_hash.get_or_init(|| hash_bytes(&self.mmap));
+                Some(query.field("demo", format!("{:016x}", demo_hash)).finish())
+            }
+            None => Some(query.finish()),
+        }
+    }
+    fn cache_get(&self, py: Python, key: &Option<String>) -> PyResult<Option<PyObject>> {
+        let key = match key {
+            Some(key) => key,
+            None => return Ok(None),
+        };
+        if let Some(cache) = &self.memory_cache {
+            if let Some(df) = cache.get(py, key)? {
+                return Ok(Some(df.to_object(py)));
+            }
+        }
+        if let Some(table) = self.disk_cache.as_ref().and_then(|cache| cache.get(py, key)) {
+            let df = table.call_method0("to_pandas")?.to_object(py);
+            if let Some(cache) = &self.memory_cache {
+                cache.put(py, key, &df);
+            }
+            return Ok(Some(df));
+        }
+        Ok(None)
+    }
+    // Best-effort, failures are counted in cache_stats and the caller still returns df
+    fn cache_put(&self, py: Python, key: &Option<String>, df: &PyObject) {
+        let key = match key {
+            Some(key) => key,
+            None => return,
+        };
+        if let Some(cache) = &self.memory_cache {
+            cache.put(py, key, df);
+        }
+        if let Some(cache) = &self.disk_cache {
+            cache.put(py, key, df);
+        }
+    }
+    fn tick_query_settings(
+        &self,
+        wanted_props: &Vec<String>,
+        players: Option<Vec<u64>>,
+        ticks: Option<Vec<i32>>,
+        prop_states: Option<Vec<WantedPropState>>,
+    ) -> PyResult<ParserInputs> {
+        let wanted_players = players.unwrap_or_default();
+        let wanted_ticks = ticks.unwrap_or_default();
+        let wanted_prop_states = prop_states
+            .unwrap_or_default()
+            .into_iter()
+            .map(|prop| (prop.prop, prop.state.0))
+            .collect();
+
+        let real_props = rm_user_friendly_names(wanted_props);
+        let real_wanted_prop_states = rm_map_user_friendly_names(&wanted_prop_states);
+
+        let real_props = match real_props {
+            Ok(real_props) => real_props,
+            Err(e) => return Err(Exception::new_err(format!("{e}"))),
+        };
+        let real_wanted_prop_states = match real_wanted_prop_states {
+            Ok(real_wanted_prop_states) => real_wanted_prop_states,
+            Err(e) => return Err(Exception::new_err(format!("{e}"))),
+        };
+
+        let mut real_name_to_og_name = AHashMap::default();
+        for (real_name, user_friendly_name) in real_props.iter().zip(wanted_props) {
+            real_name_to_og_name.insert(real_name.clone(), user_friendly_name.clone());
+        }
+        for (real_name, user_friendly_name) in real_wanted_prop_states
+            .keys()
+            .zip(wanted_prop_states.keys())
+        {
+            real_name_to_og_name.insert(real_name.clone(), user_friendly_name.clone());
+        }
+
+        Ok(ParserInputs {
+            real_name_to_og_name,
+            wanted_players,
+            wanted_player_props: real_props,
+            wanted_other_props: vec![],
+            wanted_events: vec![],
+            wanted_prop_states: real_wanted_prop_states,
+            parse_ents: true,
+            wanted_ticks,
+            parse_projectiles: false,
+            parse_grenades: false,
+            only_header: true,
+            list_props: false,
+            only_convars: false,
+            huffman_lookup_table: &self.huf,
+            order_by_steamid: false,
+            fallback_bytes: None,
+            event_snapshot_props: vec![],
+            predicate: None,
+            every_n_ticks: None,
+            wanted_event_columns: None,
+            tick_output_mode: TickOutputMode::Full,
+            normalize_ticks: false,
+            event_window: None,
+            tensor: None,
+        })
+    }
+}
+
+fn tick_output_mode_from_str(mode: &str) -> PyResult<TickOutputMode> {
+    match mode {
+        "full" => Ok(TickOutputMode::Full),
+        "changes" => Ok(TickOutputMode::Changes),
+        "rle" => Ok(TickOutputMode::Rle),
+        _ => Err(PyValueError::new_err(format!(
+            "Unknown mode: {mode}. Expected one of: full, changes, rle"
+        ))),
+    }
+}
+
+// Demos are recorded at 64 ticks per second, same as game_time
+fn tick_step(every_n_ticks: Option<i32>, hz: Option<f64>) -> PyResult<Option<i32>> {
+    match (every_n_ticks, hz) {
+        (Some(_), Some(_)) => Err(PyValueError::new_err("Only one of every_n_ticks and hz can be set")),
+        (Some(n), None) if n < 1 => Err(PyValueError::new_err(format!("every_n_ticks must be at least 1, got: {n}"))),
+        (Some(n), None) => Ok(Some(n)),
+        (None, Some(hz)) if !(hz > 0.0 && hz <= 64.0) => Err(PyValueError::new_err(format!("hz must be in (0, 64], got: {hz}"))),
+        (None, Some(hz)) => Ok(Some((64.0 / hz).round() as i32)),
+        (None, None) => Ok(None),
+    }
+}
+
+// Prop names in the predicate can be friendly names like in wanted_props
+fn predicate_filter(predicate: Predicate, scope: &str) -> PyResult<PredicateFilter> {
+    let scope = match scope {
+        "player" => PredicateScope::Player,
+        "tick" => PredicateScope::Tick,
+        _ => {
+            return Err(PyValueError::new_err(format!(
+                "Unknown predicate_scope: {scope}. Expected one of: player, tick"
+            )))
+        }
+    };
+    let predicate = predicate.map_props(&|prop| match rm_user_friendly_names(&vec![prop]) {
+        Ok(real_names) => Ok(real_names[0].clone()),
+        Err(e) => Err(Exception::new_err(format!("{e}"))),
+    })?;
+    Ok(PredicateFilter { predicate, scope })
+}
+
+/// Owns the bytes of a tensor and hands them to numpy through the buffer protocol, so
+/// numpy.frombuffer uses them without copying. The array keeps this object alive.
+#[pyclass(module = "demoparser2", name = "_TensorBuffer")]
+struct TensorBuffer {
+    data: Vec<u8>,
+}
+
+#[pymethods]
+impl TensorBuffer {
+    unsafe fn __getbuffer__(slf: Bound<'_, Self>, view: *mut pyo3::ffi::Py_buffer, flags: std::os::raw::c_int) -> PyResult<()> {
+        if view.is_null() {
+            return Err(PyBufferError::new_err("View is null"));
+        }
+        let (buf, len) = {
+            let mut inner = slf.borrow_mut();
+            (inner.data.as_mut_ptr(), inner.data.len())
+        };
+        // Nothing on the Rust side reads data after it is handed out, so numpy may write to it
+        (*view).obj = slf.into_any().into_ptr();
+        (*view).buf = buf as *mut std::os::raw::c_void;
+        (*view).len = len as isize;
+        (*view).readonly = 0;
+        (*view).itemsize = 1;
+        (*view).format = match flags & pyo3::ffi::PyBUF_FORMAT == pyo3::ffi::PyBUF_FORMAT {
+            true => b"B\0".as_ptr() as *mut std::os::raw::c_char,
+            false => std::ptr::null_mut(),
+        };
+        (*view).ndim = 1;
+        (*view).shape = match flags & pyo3::ffi::PyBUF_ND == pyo3::ffi::PyBUF_ND {
+            true => &mut (*view).len,
+            false => std::ptr::null_mut(),
+        };
+        (*view).strides = match flags & pyo3::ffi::PyBUF_STRIDES == pyo3::ffi::PyBUF_STRIDES {
+            true => &mut (*view).itemsize,
+            false => std::ptr::null_mut(),
+        };
+        (*view).suboffsets = std::ptr::null_mut();
+        (*view).internal = std::ptr::null_mut();
+        Ok(())
+    }
+    unsafe fn __releasebuffer__(&self, _view: *mut pyo3::ffi::Py_buffer) {}
+}
+
+fn tensor_dtype_from_str(dtype: &str) -> PyResult<TensorDtype> {
+    match dtype {
+        "float32" => Ok(TensorDtype::F32),
+        "float64" => Ok(TensorDtype::F64),
+        _ => Err(PyValueError::new_err(format!(
+            "Unknown dtype: {dtype}. Expected one of: float32, float64"
+        ))),
+    }
+}
+
+fn parsing_mode_from_str(mode: &str) -> PyResult<ParsingMode> {
+    match mode {
+        "normal" => Ok(ParsingMode::Normal),
+        "pipelined" => Ok(ParsingMode::Pipelined),
+        "single_threaded" => Ok(ParsingMode::ForceSingleThreaded),
+        "multi_threaded" => Ok(ParsingMode::ForceMultiThreaded),
+        _ => Err(PyValueError::new_err(format!(
+            "Unknown parsing_mode: {mode}. Expected one of: normal, pipelined, single_threaded, multi_threaded"
+        ))),
+    }
 }
 
 pub fn series_from_multiple_events(
@@ -1265,9 +2364,188 @@ fn find_type_of_vals(pairs: &Vec<&EventField>) -> Result<Option<Variant>, DemoPa
     Ok(None)
 }
 
+#[pyclass(name = "Cursor")]
+pub struct PyCursor {
+    cursor: Cursor,
+}
+
+#[pymethods]
+impl PyCursor {
+    /// Tick the cursor is at. The state is the one after all frames of this tick.
+    #[getter]
+    fn tick(&self) -> i32 {
+        self.cursor.tick()
+    }
+
+    /// Moves to the tick. Continues from the current position when going forward, otherwise
+    /// starts again from the last fullpacket before the tick. Returns the new tick, which is the
+    /// last tick of the demo when seeking past the end.
+    fn seek(&mut self, py: Python, tick: i32) -> PyResult<i32> {
+        let cursor = &mut self.cursor;
+        match py.allow_threads(|| cursor.seek(tick)) {
+            Ok(tick) => Ok(tick),
+            Err(e) => Err(Exception::new_err(format!("{e}"))),
+        }
+    }
+
+    /// Moves n ticks forward (backward if negative). Returns the new tick.
+    #[pyo3(signature = (n=1))]
+    fn step(&mut self, py: Python, n: i32) -> PyResult<i32> {
+        let cursor = &mut self.cursor;
+        match py.allow_threads(|| cursor.step(n)) {
+            Ok(tick) => Ok(tick),
+            Err(e) => Err(Exception::new_err(format!("{e}"))),
+        }
+    }
+
+    /// DataFrame with one row per player at the current tick, same columns as parse_ticks.
+    /// props picks a subset of the wanted_props given to cursor(), None reads all of them.
+    #[pyo3(signature = (props=None))]
+    fn read(&mut self, py: Python, props: Option<Vec<String>>) -> PyResult<PyObject> {
+        let props = props.unwrap_or_default();
+        let cursor = &mut self.cursor;
+        let output = match py.allow_threads(|| cursor.read(props.clone())) {
+            Ok(output) => output,
+            Err(e) => return Err(Exception::new_err(format!("{e}"))),
+        };
+        if let Some(prop) = props
+            .iter()
+            .find(|prop| !output.prop_infos.iter().any(|info| &info.prop_friendly_name == *prop))
+        {
+            return Err(PyValueError::new_err(format!(
+                "{prop} is not one of the wanted_props of this cursor"
+            )));
+        }
+        let pyarrow = py.import_bound("pyarrow")?;
+        let table = prop_columns_to_table(py, &pyarrow, &output.prop_infos, &output.df)?;
+        Ok(table.call_method0("to_pandas")?.to_object(py))
+    }
+
+    fn __repr__(&self) -> String {
+        format!("Cursor(tick={})", self.cursor.tick())
+    }
+}
+
+#[pyclass(name = "DemoProbe", frozen, get_all)]
+struct PyDemoProbe {
+    path: String,
+    map_name: String,
+    server_name: String,
+    client_name: String,
+    demo_version_name: String,
+    network_protocol: i32,
+    build_num: i32,
+    file_size: usize,
+    playback_time: Option<f32>,
+    playback_ticks: Option<i32>,
+    playback_frames: Option<i32>,
+}
+
+#[pymethods]
+impl PyDemoProbe {
+    fn __repr__(&self) -> String {
+        format!(
+            "DemoProbe(path={:?}, map_name={:?}, build_num={}, playback_ticks={:?}, playback_time={:?})",
+            self.path, self.map_name, self.build_num, self.playback_ticks, self.playback_time
+        )
+    }
+}
+
+impl PyDemoProbe {
+    fn new(path: String, probe: DemoProbe) -> Self {
+        PyDemoProbe {
+            path,
+            map_name: probe.map_name,
+            server_name: probe.server_name,
+            client_name: probe.client_name,
+            demo_version_name: probe.demo_version_name,
+            network_protocol: probe.network_protocol,
+            build_num: probe.build_num,
+            file_size: probe.file_size,
+            playback_time: probe.playback_time,
+            playback_ticks: probe.playback_ticks,
+            playback_frames: probe.playback_frames,
+        }
+    }
+}
+
+/// Reads the header and the file info at the end of one or many demos without parsing them.
+/// A list of paths is probed in parallel and returns a list in the same order.
+#[pyfunction]
+fn probe(py: Python, path_or_paths: &Bound<PyAny>) -> PyResult<PyObject> {
+    let (paths, single) = match path_or_paths.extract::<PathBuf>() {
+        Ok(path) => (vec![path], true),
+        Err(_) => (path_or_paths.extract::<Vec<PathBuf>>()?, false),
+    };
+    let paths: Vec<String> = paths.iter().map(|p| p.to_string_lossy().to_string()).collect();
+    let results = py.allow_threads(|| probe_demo_files(&paths));
+    let mut probes = vec![];
+    for (path, result) in paths.into_iter().zip(results) {
+        match result {
+            Ok(probe) => probes.push(PyDemoProbe::new(path, probe)),
+            Err(e) => return Err(Exception::new_err(format!("{e}. File name: {path}"))),
+        }
+    }
+    match single {
+        true => Ok(probes.remove(0).into_py(py)),
+        false => Ok(probes.into_py(py)),
+    }
+}
+
+// Used by Predicate.__reduce__, pickle can't refer to static methods
+#[pyfunction]
+fn _rebuild_predicate(py: Python, constructor: &str, args: &Bound<PyTuple>) -> PyResult<PyObject> {
+    let predicate = py.get_type_bound::<PyPredicate>().call_method1(constructor, args.clone())?;
+    Ok(predicate.to_object(py))
+}
+
+/// Runs the same Query on many demos, returns a list in the same order as paths.
+/// The huffman table is built once for all of them.
+/// By default the first demo that fails raises and the other outputs are lost. With
+/// return_exceptions=True the exception is put in the list in place of that demo's output.
+#[pyfunction]
+#[pyo3(signature = (paths, query, *, parsing_mode="normal", return_exceptions=false))]
+fn run_many(py: Python, paths: Vec<PathBuf>, query: PyRef<'_, PyQuery>, parsing_mode: &str, return_exceptions: bool) -> PyResult<PyObject> {
+    let parsing_mode = parsing_mode_from_str(parsing_mode)?;
+    let huf = create_huffman_lookup_table();
+    let mut outputs = vec![];
+    for path in paths {
+        let path = path.to_string_lossy().to_string();
+        match run_query_on_path(py, &path, &query, &huf, parsing_mode) {
+            Ok(output) => outputs.push(output),
+            Err(e) if return_exceptions => outputs.push(e.value_bound(py).to_object(py)),
+            Err(e) => return Err(e),
+        }
+    }
+    Ok(outputs.to_object(py))
+}
+
+fn run_query_on_path(py: Python, path: &str, query: &PyQuery, huf: &Vec<(u8, u8)>, parsing_mode: ParsingMode) -> PyResult<PyObject> {
+    let mmap = match create_mmap(path.to_string()) {
+        Ok(mmap) => mmap,
+        Err(e) => return Err(Exception::new_err(format!("{e}. File name: {path}"))),
+    };
+    let mut parser = Parser::new(query.parser_inputs(huf), parsing_mode);
+    let output = match parser.parse_demo(&mmap) {
+        Ok(output) => output,
+        Err(DemoParserError::MemoryLimitExceeded(msg)) => return Err(PyMemoryError::new_err(msg)),
+        Err(DemoParserError::UnknownPropName(prop)) => return Err(PyValueError::new_err(format!("Unknown prop in predicate: {prop}"))),
+        Err(DemoParserError::UnknownEventColumn(column)) => return Err(PyValueError::new_err(format!("Unknown event column: {column}"))),
+        Err(e) => return Err(Exception::new_err(format!("{e}. File name: {path}"))),
+    };
+    query.output_to_py(py, output)
+}
+
 #[pymodule]
 fn demoparser2(_py: Python, m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_class::<DemoParser>()?;
     m.add_class::<WantedPropState>()?;
+    m.add_class::<PyPredicate>()?;
+    m.add_class::<PyQuery>()?;
+    m.add_class::<PyDemoProbe>()?;
+    m.add_class::<PyCursor>()?;
+    m.add_function(wrap_pyfunction!(probe, m)?)?;
+    m.add_function(wrap_pyfunction!(run_many, m)?)?;
+    m.add_function(wrap_pyfunction!(_rebuild_predicate, m)?)?;
     Ok(())
 }
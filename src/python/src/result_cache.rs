@@ -0,0 +1,370 @@
+use pyo3::prelude::*;
+use pyo3::types::PyBytes;
+use pyo3::types::PyDict;
+use std::fs;
+use std::path::Path;
+use std::path::PathBuf;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::sync::Mutex;
+use std::time::SystemTime;
+use xxhash_rust::xxh3::xxh3_64;
+
+const CACHE_KEY_METADATA: &str = "demoparser2_cache_key";
+pub const DEFAULT_CACHE_MAX_BYTES: u64 = 1 << 30;
+
+/*
+On-disk cache of query results.
+
+Every result is one uncompressed Arrow IPC file named after a hash of its key. The key is made from
+the demo content hash, the parser version and the normalized query, and is also stored in the file
+metadata so a hash collision reads as a miss instead of a wrong result.
+The file modification time is used as "last used": hits touch the file and when the directory
+grows over max_bytes the least recently used files are removed first.
+
+The cache is best-effort. Failing reads count as misses and failing writes are skipped, both are
+counted in "errors" and the caller gets its result either way. Only tables that come back as the
+same DataFrame are written, list and struct columns (inventory, stickers, ...) would come back as
+numpy arrays instead of lists so results with those are never cached.
+*/
+pub struct DiskCache {
+    dir: PathBuf,
+    max_bytes: u64,
+    hits: AtomicU64,
+    misses: AtomicU64,
+    evictions: AtomicU64,
+    errors: AtomicU64,
+}
+
+impl DiskCache {
+    pub fn new(dir: String, max_bytes: Option<u64>) -> std::io::Result<Self> {
+        fs::create_dir_all(&dir)?;
+        Ok(DiskCache {
+            dir: PathBuf::from(dir),
+            max_bytes: max_bytes.unwrap_or(DEFAULT_CACHE_MAX_BYTES),
+            hits: AtomicU64::new(0),
+            misses: AtomicU64::new(0),
+            evictions: AtomicU64::new(0),
+            errors: AtomicU64::new(0),
+        })
+    }
+
+    fn path_for(&self, key: &str) -> PathBuf {
+        self.dir.join(format!("{:016x}.arrow", hash_bytes(key.as_bytes())))
+    }
+
+    // Returns the cached pyarrow Table
+    pub fn get<'py>(&self, py: Python<'py>, key: &str) -> Option<Bound<'py, PyAny>> {
+        match self.read(py, key) {
+            Ok(table) => table,
+            Err(_) => {
+                self.errors.fetch_add(1, Ordering::Relaxed);
+                self.misses.fetch_add(1, Ordering::Relaxed);
+                None
+            }
+        }
+    }
+
+    pub fn put(&self, py: Python, key: &str, df: &PyObject) {
+        let path = self.path_for(key);
+        if self.write(py, key, df, &path).is_err() {
+            self.errors.fetch_add(1, Ordering::Relaxed);
+            let _ = fs::remove_file(path.with_extension("arrow.tmp"));
+        }
+    }
+
+    fn read<'py>(&self, py: Python<'py>, key: &str) -> PyResult<Option<Bound<'py, PyAny>>> {
+        let path = self.path_for(key);
+        if !path.exists() {
+            self.misses.fetch_add(1, Ordering::Relaxed);
+            return Ok(None);
+        }
+        let kwargs = PyDict::new_bound(py);
+        kwargs.set_item("memory_map", true)?;
+        let table = py
+            .import_bound("pyarrow.feather")?
+            .call_method("read_table", (path.to_string_lossy().to_string(),), Some(&kwargs))?;
+        let metadata = table.getattr("schema")?.getattr("metadata")?;
+        let stored_key = match metadata.is_none() {
+            true => None,
+            false => metadata
+                .call_method1("get", (PyBytes::new_bound(py, CACHE_KEY_METADATA.as_bytes()),))?
+                .extract::<Vec<u8>>()
+                .ok(),
+        };
+        if stored_key.as_deref() != Some(key.as_bytes()) {
+            self.misses.fetch_add(1, Ordering::Relaxed);
+            return Ok(None);
+        }
+        // Mark as recently used
+        if let Ok(f) = fs::File::options().append(true).open(&path) {
+            let _ = f.set_modified(SystemTime::now());
+        }
+        self.hits.fetch_add(1, Ordering::Relaxed);
+        Ok(Some(table))
+    }
+
+    fn write(&self, py: Python, key: &str, df: &PyObject, path: &Path) -> PyResult<()> {
+        let table = match df_to_table(py, df)? {
+            Some(table) => table,
+            None => return Ok(()),
+        };
+        if !round_trips_exactly(py, &table)? {
+            return Ok(());
+        }
+        // Keep the pandas metadata (index, dtypes) and add the key next to it
+        let metadata = PyDict::new_bound(py);
+        let pandas_metadata = table.getattr("schema")?.getattr("metadata")?;
+        if !pandas_metadata.is_none() {
+            metadata.call_method1("update", (pandas_metadata,))?;
+        }
+        metadata.set_item(CACHE_KEY_METADATA, key)?;
+        let table = table.call_method1("replace_schema_metadata", (metadata,))?;
+
+        // Write to a temp file and rename so readers never see half written files
+        let tmp_path = path.with_extension("arrow.tmp");
+        let kwargs = PyDict::new_bound(py);
+        kwargs.set_item("compression", "uncompressed")?;
+        py.import_bound("pyarrow.feather")?.call_method(
+            "write_feather",
+            (&table, tmp_path.to_string_lossy().to_string()),
+            Some(&kwargs),
+        )?;
+        fs::rename(&tmp_path, path)?;
+        self.evict(path)?;
+        Ok(())
+    }
+
+    fn entries(&self) -> std::io::Result<Vec<(PathBuf, u64, SystemTime)>> {
+        let mut entries = vec![];
+        for entry in fs::read_dir(&self.dir)? {
+            let entry = entry?;
+            let path = entry.path();
+            if path.extension().and_then(|e| e.to_str()) != Some("arrow") {
+                continue;
+            }
+            let md = entry.metadata()?;
+            entries.push((path, md.len(), md.modified().unwrap_or(SystemTime::UNIX_EPOCH)));
+        }
+        Ok(entries)
+    }
+
+    // Never removes keep, the file that was just written
+    fn evict(&self, keep: &Path) -> std::io::Result<()> {
+        let mut entries = self.entries()?;
+        let mut total: u64 = entries.iter().map(|e| e.1).sum();
+        if total <= self.max_bytes {
+            return Ok(());
+        }
+        // Least recently used first
+        entries.sort_by_key(|e| e.2);
+        for (path, size, _) in entries {
+            if total <= self.max_bytes {
+                break;
+            }
+            if path == keep {
+                continue;
+            }
+            if fs::remove_file(&path).is_ok() {
+                total -= size;
+                self.evictions.fetch_add(1, Ordering::Relaxed);
+            }
+        }
+        Ok(())
+    }
+
+    pub fn stats(&self, py: Python) -> PyResult<PyObject> {
+        let entries = self.entries()?;
+        let dict = PyDict::new_bound(py);
+        dict.set_item("hits", self.hits.load(Ordering::Relaxed))?;
+        dict.set_item("misses", self.misses.load(Ordering::Relaxed))?;
+        dict.set_item("evictions", self.evictions.load(Ordering::Relaxed))?;
+        dict.set_item("errors", self.errors.load(Ordering::Relaxed))?;
+        dict.set_item("entries", entries.len())?;
+        dict.set_item("bytes", entries.iter().map(|e| e.1).sum::<u64>())?;
+        dict.set_item("max_bytes", self.max_bytes)?;
+        Ok(dict.to_object(py))
+    }
+}
+
+/*
+In-memory cache of query results for one DemoParser.
+
+Results are kept as the DataFrames the parse returned, so a hit has exactly the same dtypes and
+values as a miss, and every hit gets its own copy so callers can't change each others results.
+Entries are ordered from least to most recently used and the oldest are dropped when the frames
+take more than max_bytes.
+*/
+pub struct MemoryCache {
+    max_bytes: u64,
+    state: Mutex<MemoryCacheState>,
+}
+
+#[derive(Default)]
+struct MemoryCacheState {
+    entries: Vec<(String, PyObject, u64)>,
+    bytes: u64,
+    hits: u64,
+    misses: u64,
+    evictions: u64,
+    errors: u64,
+}
+
+impl MemoryCache {
+    pub fn new(max_bytes: u64) -> Self {
+        MemoryCache {
+            max_bytes,
+            state: Mutex::new(MemoryCacheState::default()),
+        }
+    }
+
+    // Returns a copy of the cached DataFrame
+    pub fn get<'py>(&self, py: Python<'py>, key: &str) -> PyResult<Option<Bound<'py, PyAny>>> {
+        let mut state = self.state.lock().unwrap();
+        let df = match state.entries.iter().position(|e| e.0 == key) {
+            Some(idx) => {
+                // Move to most recently used
+                let entry = state.entries.remove(idx);
+                let df = entry.1.clone_ref(py).into_bound(py);
+                state.entries.push(entry);
+                state.hits += 1;
+                df
+            }
+            None => {
+                state.misses += 1;
+                return Ok(None);
+            }
+        };
+        drop(state);
+        let kwargs = PyDict::new_bound(py);
+        kwargs.set_item("deep", true)?;
+        Ok(Some(df.call_method("copy", (), Some(&kwargs))?))
+    }
+
+    // Keeps a copy of df, failures are counted and otherwise ignored
+    pub fn put(&self, py: Python, key: &str, df: &PyObject) {
+        if self.insert(py, key, df).is_err() {
+            self.state.lock().unwrap().errors += 1;
+        }
+    }
+
+    fn insert(&self, py: Python, key: &str, df: &PyObject) -> PyResult<()> {
+        let pandas = py.import_bound("pandas")?;
+        let df = df.bind(py);
+        // Only DataFrames are cached. Empty results come back as lists.
+        if !df.is_instance(&pandas.getattr("DataFrame")?)? {
+            return Ok(());
+        }
+        let kwargs = PyDict::new_bound(py);
+        kwargs.set_item("deep", true)?;
+        let nbytes: u64 = df.call_method("memory_usage", (), Some(&kwargs))?.call_method0("sum")?.extract()?;
+        // Would evict everything else and still not fit
+        if nbytes > self.max_bytes {
+            return Ok(());
+        }
+        // The caller gets df itself so the cache keeps its own copy
+        let df = df.call_method("copy", (), Some(&kwargs))?;
+        let mut state = self.state.lock().unwrap();
+        if let Some(idx) = state.entries.iter().position(|e| e.0 == key) {
+            let old = state.entries.remove(idx);
+            state.bytes -= old.2;
+        }
+        while state.bytes + nbytes > self.max_bytes && !state.entries.is_empty() {
+            let evicted = state.entries.remove(0);
+            state.bytes -= evicted.2;
+            state.evictions += 1;
+        }
+        state.entries.push((key.to_string(), df.unbind(), nbytes));
+        state.bytes += nbytes;
+        Ok(())
+    }
+
+    pub fn stats(&self, py: Python) -> PyResult<PyObject> {
+        let state = self.state.lock().unwrap();
+        let dict = PyDict::new_bound(py);
+        dict.set_item("hits", state.hits)?;
+        dict.set_item("misses", state.misses)?;
+        dict.set_item("evictions", state.evictions)?;
+        dict.set_item("errors", state.errors)?;
+        dict.set_item("entries", state.entries.len())?;
+        dict.set_item("bytes", state.bytes)?;
+        dict.set_item("max_bytes", self.max_bytes)?;
+        Ok(dict.to_object(py))
+    }
+}
+
+// Only DataFrames are cached. Empty results come back as lists.
+fn df_to_table<'py>(py: Python<'py>, df: &PyObject) -> PyResult<Option<Bound<'py, PyAny>>> {
+    let pandas = py.import_bound("pandas")?;
+    if !df.bind(py).is_instance(&pandas.getattr("DataFrame")?)? {
+        return Ok(None);
+    }
+    let pyarrow = py.import_bound("pyarrow")?;
+    Ok(Some(pyarrow.getattr("Table")?.call_method1("from_pandas", (df,))?))
+}
+
+// Nested columns don't come back as the same Python objects from to_pandas
+fn round_trips_exactly(py: Python, table: &Bound<PyAny>) -> PyResult<bool> {
+    let types = py.import_bound("pyarrow.types")?;
+    for field in table.getattr("schema")?.iter()? {
+        if types.call_method1("is_nested", (field?.getattr("type")?,))?.is_truthy()? {
+            return Ok(false);
+        }
+    }
+    Ok(true)
+}
+
+// XXH3, it reads the bytes a block of words at a time so hashing a whole demo is about as fast as
+// reading it. Disk cache file names depend on it so it has to give the same hash on every platform
+// and Rust version, which std's DefaultHasher doesn't promise but the XXH3 spec does.
+pub fn hash_bytes(bytes: &[u8]) -> u64 {
+    xxh3_64(bytes)
+}
+
+// Builds a key where the order of props, players and ticks doesn't matter
+pub struct QueryKey {
+    parts: Vec<String>,
+}
+
+impl QueryKey {
+    pub fn new(method: &str) -> Self {
+        QueryKey {
+            parts: vec![method.to_string()],
+        }
+    }
+    pub fn field<T: ToString>(mut self, name: &str, value: T) -> Self {
+        self.parts.push(format!("{}={}", name, value.to_string()));
+        self
+    }
+    pub fn set<T: ToString>(mut self, name: &str, values: &[T]) -> Self {
+        let mut values: Vec<String> = values.iter().map(|v| v.to_string()).collect();
+        values.sort();
+        values.dedup();
+        self.parts.push(format!("{}=[{}]", name, values.join(",")));
+        self
+    }
+    pub fn finish(self) -> String {
+        self.parts.join("|")
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::hash_bytes;
+    use super::QueryKey;
+
+    #[test]
+    fn test_hash_bytes_is_stable() {
+        // Reference values of XXH3-64 with the default seed
+        assert_eq!(hash_bytes(b""), 0x2d06800538d394c2);
+        assert_eq!(hash_bytes(b"a"), 0xe6c632b61e964e1f);
+    }
+
+    #[test]
+    fn test_query_key_ignores_order_and_duplicates() {
+        let a = QueryKey::new("parse_ticks").set("props", &["X", "Y", "X"]).set("ticks", &[3, 1, 2]).finish();
+        let b = QueryKey::new("parse_ticks").set("props", &["Y", "X"]).set("ticks", &[1, 2, 3]).finish();
+        assert_eq!(a, b);
+        let c = QueryKey::new("parse_ticks").set("props", &["X"]).set("ticks", &[1, 2, 3]).finish();
+        assert_ne!(a, c);
+    }
+}
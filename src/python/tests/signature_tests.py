@@ -1,9 +1,12 @@
+import pickle
+import tempfile
 import unittest
 from unittest import TestCase
 from typing import Union
 
 import pandas as pd
-from demoparser2 import DemoParser, WantedPropState
+import pyarrow.dataset as ds
+from demoparser2 import Cursor, DemoParser, DemoProbe, Predicate, Query, WantedPropState, probe, run_many
 
 demo_path = "../parser/test_demo.dem"
 
@@ -23,6 +26,261 @@ class SignatureTest(TestCase):
             self.assertIsInstance(key, str)
             self.assertIsInstance(value, str)
 
+    def test_parsing_mode_signature(self):
+        for mode in ["normal", "pipelined", "single_threaded", "multi_threaded"]:
+            parser = DemoParser(demo_path, parsing_mode=mode)
+            self.assertIsInstance(parser.parse_ticks(["X", "Y"], ticks=[10000]), pd.DataFrame)
+
+        parser = DemoParser(demo_path, target_chunk_bytes=5_000_000)
+        self.assertIsInstance(parser.parse_ticks(["X", "Y"], ticks=[10000]), pd.DataFrame)
+
+        parser = DemoParser(demo_path, max_inflight_chunks=2)
+        self.assertIsInstance(parser.parse_ticks(["X", "Y"], ticks=[10000]), pd.DataFrame)
+
+        with self.assertRaises(ValueError):
+            DemoParser(demo_path, parsing_mode="fast")
+
+        with self.assertRaises(TypeError):
+            DemoParser(demo_path, "pipelined")
+
+    def test_estimate_signature(self):
+        parser = DemoParser(demo_path)
+        estimate = parser.estimate(["X", "Y"])
+        self.assertIsInstance(estimate["rows"], int)
+        self.assertIsInstance(estimate["bytes"], int)
+        self.assertLess(parser.estimate(["X", "Y"], ticks=[10000])["rows"], estimate["rows"])
+
+        parser = DemoParser(demo_path, memory_limit=estimate["bytes"] * 2)
+        self.assertIsInstance(parser.parse_ticks(["X", "Y"]), pd.DataFrame)
+        with self.assertRaises(MemoryError):
+            DemoParser(demo_path, memory_limit=1).parse_ticks(["X", "Y"])
+
+    def test_snapshot_signature(self):
+        parser = DemoParser(demo_path)
+        snapshot = parser.snapshot(10000)
+        self.assertEqual(snapshot["tick"], 10000)
+        self.assertIsInstance(snapshot["entities"], list)
+        entity = snapshot["entities"][0]
+        self.assertIsInstance(entity["entity_id"], int)
+        self.assertIsInstance(entity["class_name"], str)
+        self.assertIsInstance(entity["props"], dict)
+        pawn_props = [e["props"] for e in snapshot["entities"] if e["class_name"] == "CCSPlayerPawn"]
+        self.assertTrue(any("CCSPlayerPawn.CCSPlayer_WeaponServices.m_hMyWeapons.0" in props for props in pawn_props))
+
+        with self.assertRaises(TypeError):
+            parser.snapshot("10000")
+
+    def test_parse_ticks_mode_signature(self):
+        parser = DemoParser(demo_path)
+        full = parser.parse_ticks(["balance", "team_num"])
+        changes = parser.parse_ticks(["balance", "team_num"], mode="changes")
+        rle = parser.parse_ticks(["balance", "team_num"], mode="rle")
+        self.assertLess(len(changes), len(full))
+        self.assertEqual(len(rle), len(changes))
+        self.assertEqual(rle["tick"].tolist(), changes["tick"].tolist())
+        self.assertTrue((rle["end_tick"] >= rle["tick"]).all())
+        self.assertNotIn("end_tick", changes.columns)
+        # Same rows as comparing each row of the full output with the player's previous row
+        values = full[["balance", "team_num"]]
+        expected = full[(full.groupby(["steamid", "name"])[["balance", "team_num"]].shift() != values).any(axis=1)]
+        self.assertEqual(changes["tick"].tolist(), expected["tick"].tolist())
+        self.assertEqual(rle["end_tick"].max(), full["tick"].max())
+
+        with self.assertRaises(ValueError):
+            parser.parse_ticks(["balance"], mode="diff")
+
+    def test_parse_ticks_predicate_signature(self):
+        parser = DemoParser(demo_path)
+        low_ct = Predicate.eq("team_num", 3) & Predicate.between("health", 1, 19)
+        players = parser.parse_ticks(["health"], predicate=low_ct)
+        self.assertTrue((players["health"] < 20).all())
+        self.assertNotIn("team_num", players.columns)
+        ticks = parser.parse_ticks(["health", "team_num"], predicate=low_ct, predicate_scope="tick")
+        self.assertEqual(set(ticks["tick"]), set(players["tick"]))
+        self.assertGreaterEqual(len(ticks), len(players))
+        filtered = parser.parse_ticks(["X"], predicate=Predicate.isin("team_num", [2, 3]) | Predicate.ne("name", "s1mple"))
+        self.assertEqual(list(filtered.columns), list(parser.parse_ticks(["X"]).columns))
+
+        with self.assertRaises(ValueError):
+            parser.parse_ticks(["health"], predicate=low_ct, predicate_scope="team")
+        with self.assertRaises(ValueError):
+            parser.parse_ticks(["health"], predicate=Predicate.lt("not_a_prop", 1))
+        with self.assertRaises(TypeError):
+            parser.parse_ticks(["health"], predicate="health < 20")
+
+    def test_query_signature(self):
+        parser = DemoParser(demo_path)
+        query = Query(["X", "health"], predicate=Predicate.lt("health", 50) & Predicate.isin("team_num", [2, 3]), every_n_ticks=16)
+        self.assertEqual(query, pickle.loads(pickle.dumps(query)))
+        self.assertEqual(hash(query), hash(Query(["X", "health"], predicate=Predicate.lt("health", 50) & Predicate.isin("team_num", [2, 3]), hz=4)))
+        df = parser.run(query)
+        expected = parser.parse_ticks(["X", "health"], predicate=Predicate.lt("health", 50) & Predicate.isin("team_num", [2, 3]), every_n_ticks=16)
+        self.assertEqual(df["tick"].tolist(), expected["tick"].tolist())
+        many = run_many([demo_path, demo_path], query)
+        self.assertEqual(len(many), 2)
+        self.assertEqual(many[0]["X"].tolist(), df["X"].tolist())
+        many = run_many([demo_path, "does_not_exist.dem"], query, return_exceptions=True)
+        self.assertEqual(many[0]["X"].tolist(), df["X"].tolist())
+        self.assertIsInstance(many[1], Exception)
+        with self.assertRaises(Exception):
+            run_many([demo_path, "does_not_exist.dem"], query)
+
+        events = parser.run(Query(["X"], events=["player_death"], columns=["user_X"]))
+        self.assertIsInstance(events, list)
+        self.assertEqual(set(events[0][1].columns), {"tick", "user_X"})
+
+        with self.assertRaises(ValueError):
+            Query()
+        with self.assertRaises(ValueError):
+            Query(["X"], every_n_ticks=16, hz=4)
+        with self.assertRaises(ValueError):
+            Query(["X"], events=["player_death"], predicate=Predicate.lt("health", 50))
+        with self.assertRaises(ValueError):
+            Query(["X"], events=["player_death"], ticks=[1000])
+        with self.assertRaises(ValueError):
+            Query(["X"], columns=["user_X"])
+        events_query = Query(["X"], events=["player_death"], columns=["user_X"])
+        self.assertEqual(events_query, pickle.loads(pickle.dumps(events_query)))
+        with self.assertRaises(TypeError):
+            parser.run(["X"])
+
+    def test_parse_ticks_every_n_ticks_signature(self):
+        parser = DemoParser(demo_path)
+        df = parser.parse_ticks(["X"], every_n_ticks=16)
+        self.assertTrue((df["tick"] % 16 == 0).all())
+        hz = parser.parse_ticks(["X"], hz=4)
+        self.assertEqual(df["tick"].tolist(), hz["tick"].tolist())
+        some = parser.parse_ticks(["X"], ticks=[16, 17, 32], every_n_ticks=16)
+        self.assertEqual(set(some["tick"]), {16, 32})
+
+        with self.assertRaises(ValueError):
+            parser.parse_ticks(["X"], every_n_ticks=16, hz=4)
+        with self.assertRaises(ValueError):
+            parser.parse_ticks(["X"], every_n_ticks=0)
+        with self.assertRaises(ValueError):
+            parser.parse_ticks(["X"], hz=128)
+
+    def test_parse_ticks_normalized_signature(self):
+        parser = DemoParser(demo_path)
+        tables = parser.parse_ticks_normalized(["health", "total_rounds_played", "team_rounds_total"], ticks=[10000, 10001])
+        self.assertEqual(set(tables), {"players", "player_ticks", "rules", "teams"})
+        for table in tables.values():
+            self.assertIsInstance(table, pd.DataFrame)
+        self.assertEqual(len(tables["rules"]), 2)
+        self.assertNotIn("total_rounds_played", tables["player_ticks"].columns)
+        self.assertIn("team_num", tables["teams"].columns)
+        self.assertFalse(tables["teams"].duplicated(["tick", "team_num"]).any())
+        self.assertFalse(tables["players"].duplicated(["steamid", "name"]).any())
+        self.assertNotIn("steamid", tables["player_ticks"].columns)
+        self.assertTrue(tables["player_ticks"]["player_key"].isin(tables["players"]["player_key"]).all())
+
+    def test_parse_event_windows_signature(self):
+        parser = DemoParser(demo_path)
+        events = parser.parse_event("player_hurt")
+        df = parser.parse_event_windows("player_hurt", ["pitch", "yaw"], before=10, players="attacker")
+        self.assertIsInstance(df, pd.DataFrame)
+        self.assertIn("event_index", df.columns)
+        self.assertTrue(df["event_index"].between(0, len(events) - 1).all())
+        first = df[df["event_index"] == 0]
+        self.assertEqual(first["tick"].max(), events.iloc[0]["tick"])
+        self.assertTrue((first["steamid"] == int(events.iloc[0]["attacker_steamid"])).all())
+        both = parser.parse_event_windows("player_hurt", ["pitch"], after=5, players=["user", "attacker"])
+        self.assertIsInstance(both, pd.DataFrame)
+
+        with self.assertRaises(ValueError):
+            parser.parse_event_windows("player_hurt", ["pitch"], before=-1)
+
+    def test_parse_tensor_signature(self):
+        parser = DemoParser(demo_path)
+        tensor = parser.parse_tensor(["X", "health", "is_alive"], ticks=[10000, 10001, 10002])
+        self.assertEqual(tensor["data"].shape, (3, len(tensor["steamids"]), 3))
+        self.assertEqual(tensor["data"].dtype, "float32")
+        self.assertEqual(tensor["mask"].shape, tensor["data"].shape[:2])
+        self.assertEqual(tensor["ticks"].tolist(), [10000, 10001, 10002])
+        self.assertEqual(tensor["props"], ["X", "health", "is_alive"])
+        self.assertEqual(parser.parse_tensor(["X"], ticks=[10000], dtype="float64")["data"].dtype, "float64")
+        # Slots are per steamid of the whole demo, ticks without rows are masked
+        late = parser.parse_tensor(["X"], ticks=[10000, 99999999])
+        self.assertEqual(late["steamids"].tolist(), tensor["steamids"].tolist())
+        self.assertEqual(len(set(late["steamids"][late["steamids"] != 0])), len(late["steamids"][late["steamids"] != 0]))
+        self.assertEqual(late["ticks"].tolist(), [10000, 99999999])
+        self.assertFalse(late["mask"][1].any())
+        self.assertTrue(late["data"].flags.writeable)
+
+        with self.assertRaises(ValueError):
+            parser.parse_tensor(["X"], dtype="int8")
+        with self.assertRaises(ValueError):
+            parser.parse_tensor(["name"], ticks=[10000])
+
+    def test_cursor_signature(self):
+        parser = DemoParser(demo_path)
+        cursor = parser.cursor(["X", "Y", "health"])
+        self.assertIsInstance(cursor, Cursor)
+        self.assertEqual(cursor.tick, 0)
+        self.assertEqual(cursor.seek(10000), 10000)
+        self.assertEqual(cursor.step(), 10001)
+        self.assertEqual(cursor.step(n=-1), 10000)
+        df = cursor.read()
+        self.assertIsInstance(df, pd.DataFrame)
+        self.assertEqual(df.columns.tolist(), sorted(["X", "Y", "health", "name", "steamid", "tick"]))
+        self.assertEqual(cursor.read(["X"]).columns.tolist(), ["X", "name", "steamid", "tick"])
+
+        with self.assertRaises(ValueError):
+            cursor.read(["Z"])
+
+    def test_parse_ticks_to_dataset_signature(self):
+        parser = DemoParser(demo_path, max_inflight_chunks=4)
+        wanted_ticks = list(range(10000, 10100))
+        df = parser.parse_ticks(["X", "Y", "name"], ticks=wanted_ticks)
+        with tempfile.TemporaryDirectory() as spill_dir:
+            dataset = parser.parse_ticks_to_dataset(["X", "Y", "name"], ticks=wanted_ticks, spill_dir=spill_dir)
+            self.assertIsInstance(dataset, ds.Dataset)
+            table = dataset.to_table()
+            self.assertEqual(table.num_rows, len(df))
+            self.assertEqual(sorted(table.column_names), sorted(df.columns))
+        with self.assertRaises(TypeError):
+            parser.parse_ticks_to_dataset(["X"], spill_dir=5)
+
+    def test_cache_signature(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            parser = DemoParser(demo_path, cache_dir=cache_dir)
+            df = parser.parse_ticks(["X", "Y", "health", "is_alive", "last_place_name"], ticks=[10000, 10001])
+            cached = parser.parse_ticks(["X", "Y", "health", "is_alive", "last_place_name"], ticks=[10001, 10000])
+            pd.testing.assert_frame_equal(df, cached)
+            self.assertTrue(df.dtypes.equals(cached.dtypes))
+            # Cache is shared between instances through the directory
+            parser = DemoParser(demo_path, cache_dir=cache_dir, cache_max_bytes=10_000_000)
+            pd.testing.assert_frame_equal(parser.parse_event("player_death"), parser.parse_event("player_death"))
+            stats = parser.cache_stats()["disk"]
+            self.assertEqual(stats["hits"], 1)
+            self.assertEqual(stats["misses"], 1)
+            self.assertEqual(stats["entries"], 2)
+            self.assertEqual(stats["errors"], 0)
+            # List columns don't survive the trip through Arrow so they are never written
+            inventory = parser.parse_ticks(["inventory"], ticks=[10000])
+            pd.testing.assert_frame_equal(inventory, parser.parse_ticks(["inventory"], ticks=[10000]))
+            self.assertEqual(parser.cache_stats()["disk"]["entries"], 2)
+        self.assertEqual(DemoParser(demo_path).cache_stats(), {})
+
+    def test_memory_cache_signature(self):
+        parser = DemoParser(demo_path, memory_cache_bytes=100_000_000)
+        df = parser.parse_event("player_death", player=["X"])
+        df["X"] = 0
+        cached = parser.parse_event("player_death", player=["X"])
+        self.assertNotEqual(list(cached["X"]), list(df["X"]))
+        stats = parser.cache_stats()
+        self.assertEqual(list(stats.keys()), ["memory"])
+        self.assertEqual(stats["memory"]["hits"], 1)
+        self.assertEqual(stats["memory"]["entries"], 1)
+        self.assertGreater(stats["memory"]["bytes"], 0)
+        # A hit is the same DataFrame as a miss, list columns included
+        ticks = parser.parse_ticks(["X", "is_alive", "last_place_name", "inventory"], ticks=[10000])
+        cached = parser.parse_ticks(["X", "is_alive", "last_place_name", "inventory"], ticks=[10000])
+        self.assertTrue(ticks.dtypes.equals(cached.dtypes))
+        pd.testing.assert_frame_equal(ticks, cached)
+        self.assertEqual(type(ticks["inventory"].iloc[0]), type(cached["inventory"].iloc[0]))
+        self.assertEqual(parser.cache_stats()["memory"]["hits"], 2)
+
     def test_list_game_events_signature(self):
         parser = DemoParser(demo_path)
         game_events = parser.list_game_events()
@@ -89,6 +347,25 @@ class SignatureTest(TestCase):
         with self.assertRaises(TypeError):
             parser.parse_event(5)
 
+    def test_parse_event_columns_signature(self):
+        parser = DemoParser(demo_path)
+        columns = ["attacker_steamid", "user_X", "weapon"]
+        event = parser.parse_event("player_death", player=["X", "Y"], columns=columns)
+        self.assertEqual(set(event.columns), {"tick", *columns})
+        full = parser.parse_event("player_death", player=["X", "Y"])
+        self.assertEqual(event["user_X"].tolist(), full["user_X"].tolist())
+        for _, df in parser.parse_events(["player_death", "round_end"], columns=["winner", "weapon"]):
+            self.assertTrue(set(df.columns).issubset({"tick", "winner", "weapon"}))
+        self.assertEqual(list(parser.parse_event("player_death", columns=[]).columns), ["tick"])
+
+        with self.assertRaises(ValueError):
+            parser.parse_event("player_death", columns=["weapon", "not_a_column"])
+        with self.assertRaises(ValueError):
+            parser.parse_events(["player_death"], columns=["not_a_column"])
+
+        with self.assertRaises(TypeError):
+            parser.parse_event("player_death", columns=5)
+
     def test_parse_events_signature(self):
         parser = DemoParser(demo_path)
 
@@ -127,6 +404,20 @@ class SignatureTest(TestCase):
         with self.assertRaises(TypeError):
             parser.parse_events(5)
 
+    def test_parse_events_snapshot_props_signature(self):
+        parser = DemoParser(demo_path)
+        events, snapshots = parser.parse_events(["player_death", "round_end"], snapshot_props=["health", "team_num"])
+        self.assertIsInstance(snapshots, pd.DataFrame)
+        self.assertTrue({"event_index", "health", "team_num", "tick", "steamid"}.issubset(snapshots.columns))
+        event_indicies = set()
+        for name, df in events:
+            self.assertIn("event_index", df.columns)
+            self.assertNotIn("user_health", df.columns)
+            event_indicies.update(df["event_index"])
+        self.assertTrue(set(snapshots["event_index"]).issubset(event_indicies))
+        # Without snapshot_props the output stays a list of events
+        self.assertIsInstance(parser.parse_events(["player_death"]), list)
+
     def test_parse_voice_signature(self):
         parser = DemoParser(demo_path)
         voice = parser.parse_voice()
@@ -177,6 +468,25 @@ class SignatureTest(TestCase):
                 ["X", "Y"], prop_states=[{"prop": "is_alive", "state": True}]
             )
 
+    def test_probe_signature(self):
+        result = probe(demo_path)
+        self.assertIsInstance(result, DemoProbe)
+        self.assertEqual(result.map_name, DemoParser(demo_path).parse_header()["map_name"])
+        self.assertIsInstance(result.build_num, int)
+        self.assertIsInstance(result.playback_ticks, int)
+        self.assertIsInstance(result.playback_time, float)
+
+        results = probe([demo_path, demo_path])
+        self.assertIsInstance(results, list)
+        self.assertEqual([r.path for r in results], [demo_path, demo_path])
+
+        with self.assertRaises(AttributeError):
+            result.map_name = "de_dust2"
+        with self.assertRaises(Exception):
+            probe("does_not_exist.dem")
+        with self.assertRaises(TypeError):
+            probe(5)
+
     def test_list_updated_fields(self):
         parser = DemoParser(demo_path)
 
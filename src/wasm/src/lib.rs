@@ -2,6 +2,7 @@ use parser::first_pass::parser_settings::rm_user_friendly_names;
 use parser::first_pass::parser_settings::FirstPassParser;
 use parser::first_pass::parser_settings::ParserInputs;
 use parser::parse_demo::Parser;
+use parser::parse_demo::TickOutputMode;
 use parser::parse_demo::ParsingMode::ForceSingleThreaded;
 use parser::second_pass::parser_settings::create_huffman_lookup_table;
 use parser::second_pass::variants::soa_to_aos;
@@ -60,6 +61,14 @@ pub fn parseEvent(
         order_by_steamid: false,
         wanted_prop_states: HashMap::default().into(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
         parse_grenades: false,
     };
     let mut parser = Parser::new(settings, ForceSingleThreaded);
@@ -125,6 +134,14 @@ pub fn parseEvents(
         order_by_steamid: false,
         wanted_prop_states: HashMap::default().into(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
         parse_grenades: false,
     };
     let mut parser = Parser::new(settings, ForceSingleThreaded);
@@ -158,6 +175,14 @@ pub fn listGameEvents(fileBytes: Vec<u8>) -> Result<JsValue, JsError> {
         order_by_steamid: false,
         wanted_prop_states: HashMap::default().into(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
         parse_grenades: false,
     };
     let mut parser = Parser::new(settings, ForceSingleThreaded);
@@ -191,6 +216,14 @@ pub fn listUpdatedFields(fileBytes: Vec<u8>) -> Result<JsValue, JsError> {
         order_by_steamid: false,
         wanted_prop_states: HashMap::default().into(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
         parse_grenades: false,
     };
     let mut parser = Parser::new(settings, ForceSingleThreaded);
@@ -254,6 +287,14 @@ pub fn parseTicks(
         order_by_steamid: false,
         wanted_prop_states: HashMap::default().into(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
         parse_grenades: false,
     };
     let mut parser = Parser::new(settings, ForceSingleThreaded);
@@ -329,6 +370,14 @@ pub fn parseGrenades(
         order_by_steamid: false,
         wanted_prop_states: HashMap::default().into(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
         parse_grenades: grenades,
     };
     let mut parser = Parser::new(settings, ForceSingleThreaded);
@@ -371,6 +420,14 @@ pub fn parseHeader(file: Vec<u8>) -> Result<JsValue, JsError> {
         order_by_steamid: false,
         wanted_prop_states: HashMap::default().into(),
         fallback_bytes: None,
+        event_snapshot_props: vec![],
+        predicate: None,
+        every_n_ticks: None,
+        wanted_event_columns: None,
+        tick_output_mode: TickOutputMode::Full,
+        normalize_ticks: false,
+        event_window: None,
+        tensor: None,
         parse_grenades: false,
     };
     let mut parser = FirstPassParser::new(&settings);